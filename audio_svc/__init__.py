@@ -1,8 +1,12 @@
 """Audio analysis microservice scaffolding."""
 
+from .scheduling import AnalysisScheduler, ClassQuota, SchedulerSaturatedError
 from .server import AudioAnalysisService, build_grpc_server
 
 __all__ = [
+  "AnalysisScheduler",
   "AudioAnalysisService",
+  "ClassQuota",
+  "SchedulerSaturatedError",
   "build_grpc_server",
 ]
@@ -0,0 +1,148 @@
+"""Content-addressed storage for intermediate pipeline artifacts.
+
+A stage's cache key is derived from its name, its declared version and the
+keys of its inputs, so an entry can only be reused by a stage that would have
+computed the same value from the same audio. Keys never need invalidating:
+changing a stage's version or its upstream inputs simply produces new keys,
+and stale entries can be deleted at any time.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional, Protocol, Union
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Pruning goes this far below the cap so it does not run on every put.
+_PRUNE_TO = 0.9
+# Temporary files older than this were left by a writer that died.
+_STALE_SCRATCH_SECONDS = 3600
+
+
+class ArtifactCache(Protocol):
+  def get(self, key: str) -> Any:
+    """Return the stored artifact; raise ``KeyError`` on a miss."""
+    ...
+
+  def put(self, key: str, value: Any) -> None: ...
+
+
+def content_key(*chunks: Union[bytes, bytearray, memoryview, str]) -> str:
+  """Hex digest identifying a source by content, e.g. the fetched audio bytes."""
+  digest = hashlib.blake2b(digest_size=20)
+  for chunk in chunks:
+    data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+    digest.update(len(data).to_bytes(8, "little"))
+    digest.update(data)
+  return digest.hexdigest()
+
+
+class DirectoryArtifactCache:
+  """:class:`ArtifactCache` storing one binary pickle per artifact on disk.
+
+  Pickle protocol 5 writes NumPy arrays as their raw buffers, so onset
+  envelopes, chroma and frame curves cost little more than their data. Files
+  are written to a temporary name and renamed into place, which keeps the
+  cache safe to share between threads and catalog worker processes. Only
+  point this at a directory the service owns: entries are unpickled.
+
+  Reads refresh an entry's modification time. Once the files written pass
+  ``max_bytes`` (``None`` for no limit), :meth:`prune` deletes the least
+  recently used entries. Each process tracks the size from its own writes
+  and rescans the directory when pruning, so shared caches converge on the
+  cap.
+  """
+
+  def __init__(self, root: Union[str, Path], *, max_bytes: Optional[int] = 10 << 30) -> None:
+    self._root = Path(root)
+    self._root.mkdir(parents=True, exist_ok=True)
+    self._max_bytes = max_bytes
+    self._lock = threading.Lock()
+    self._size: Optional[int] = None
+
+  @property
+  def root(self) -> Path:
+    return self._root
+
+  def _path(self, key: str) -> Path:
+    return self._root / key[:2] / f"{key}.pkl"
+
+  def get(self, key: str) -> Any:
+    path = self._path(key)
+    try:
+      with path.open("rb") as handle:
+        value = pickle.load(handle)
+    except FileNotFoundError:
+      raise KeyError(key) from None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+      LOGGER.warning("Discarding unreadable artifact %s", path, exc_info=True)
+      path.unlink(missing_ok=True)
+      raise KeyError(key) from None
+    try:
+      os.utime(path)
+    except FileNotFoundError:
+      pass  # Pruned by another process meanwhile.
+    return value
+
+  def put(self, key: str, value: Any) -> None:
+    path = self._path(key)
+    path.parent.mkdir(exist_ok=True)
+    scratch = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+      with scratch.open("wb") as handle:
+        pickle.dump(value, handle, protocol=5)
+        size = handle.tell()
+      os.replace(scratch, path)
+    except BaseException:
+      scratch.unlink(missing_ok=True)
+      raise
+    if self._max_bytes is None:
+      return
+    with self._lock:
+      if self._size is not None:
+        self._size += size
+        if self._size <= self._max_bytes:
+          return
+    # Over the cap, or the first write of this process: measure the directory.
+    self.prune()
+
+  def prune(self, max_bytes: Optional[int] = None) -> int:
+    """Delete least recently used entries to fit ``max_bytes``; return bytes freed.
+
+    Defaults to the cache's own cap. Also removes temporary files left by
+    writers that died mid-write.
+    """
+    limit = self._max_bytes if max_bytes is None else max_bytes
+    stale_before = time.time() - _STALE_SCRATCH_SECONDS
+    entries = []
+    for path in self._root.glob("*/*"):
+      try:
+        stat = path.stat()
+      except FileNotFoundError:
+        continue
+      if path.suffix == ".pkl":
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+      elif path.suffix == ".tmp" and stat.st_mtime < stale_before:
+        path.unlink(missing_ok=True)
+    remaining = sum(size for _, size, _ in entries)
+    freed = 0
+    if limit is not None and remaining > limit:
+      target = int(limit * _PRUNE_TO)
+      for _, size, path in sorted(entries):
+        if remaining <= target:
+          break
+        path.unlink(missing_ok=True)
+        remaining -= size
+        freed += size
+      LOGGER.info("Pruned %d bytes of artifacts from %s", freed, self._root)
+    with self._lock:
+      self._size = remaining
+    return freed
@@ -0,0 +1 @@
+"""Micro-benchmarks runnable with ``python -m audio_svc.benchmarks.<name>``."""
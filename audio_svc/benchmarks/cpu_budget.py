@@ -0,0 +1,140 @@
+"""Analysis throughput and latency with and without a CPU budget.
+
+``python -m audio_svc.benchmarks.cpu_budget`` submits a burst of ``--requests``
+analyses of synthetic tracks to a handler pool, the way gRPC would, under
+three configurations:
+
+* ``unmanaged``: the old defaults, 4 handler threads and native thread pools
+  left at one thread per core.
+* ``throughput`` and ``latency``: the detected :class:`~audio_svc.cpu_budget.CpuBudget`
+  in each mode, with each request's stage workers sized from it.
+
+Latency is measured from submission, so it includes time spent queued behind
+earlier requests, as a client would see it. Native thread oversubscription
+only shows on hosts with several cores. On a single core what remains is
+handler threads interleaving their requests, which delays all of them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from concurrent import futures
+from typing import Optional, Sequence
+
+import numpy as np
+
+from ..cpu_budget import BudgetMode, CpuBudget, available_cpus, limit_native_threads
+from ..proto import audio_analysis_pb2 as messages
+from ..server import AudioAnalysisService
+
+_SAMPLE_RATE = 22050
+
+
+def _synthetic_track(seed: int, seconds: float) -> np.ndarray:
+  rng = np.random.default_rng(seed)
+  note = np.arange(int(0.25 * _SAMPLE_RATE)) / _SAMPLE_RATE
+  notes = [
+    np.sin(2 * np.pi * freq * note) * np.hanning(note.size)
+    for freq in rng.uniform(110, 1500, int(seconds * 4))
+  ]
+  return (0.3 * np.concatenate(notes)).astype(np.float32)
+
+
+def _run_burst(
+  service: AudioAnalysisService,
+  *,
+  requests: int,
+  concurrency: int,
+) -> tuple[float, list[float]]:
+  latencies: list[float] = []
+
+  def analyse(index: int, submitted: float) -> None:
+    service.AnalyzeTrack(messages.AnalyzeTrackRequest(audio_url=f"memory://{index}"))  # noqa: N802
+    latencies.append(time.perf_counter() - submitted)
+
+  started = time.perf_counter()
+  with futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+    for future in [pool.submit(analyse, index, time.perf_counter()) for index in range(requests)]:
+      future.result()
+  return time.perf_counter() - started, latencies
+
+
+def run(
+  *,
+  requests: int = 16,
+  track_seconds: float = 20.0,
+  unmanaged_workers: int = 4,
+) -> list[dict[str, float]]:
+  tracks = [_synthetic_track(seed, track_seconds) for seed in range(requests)]
+
+  def service(stage_workers: int) -> AudioAnalysisService:
+    return AudioAnalysisService(
+      audio_loader=lambda url: (tracks[int(url.rsplit("/", 1)[-1])], _SAMPLE_RATE),
+      stage_workers=stage_workers,
+    )
+
+  # Warm librosa's lazy imports and numba's compilation outside the timings.
+  _run_burst(service(1), requests=1, concurrency=1)
+
+  cpus = available_cpus()
+  # label, concurrent requests, native threads, stage workers per request
+  configurations = [("unmanaged", unmanaged_workers, cpus, 1)]
+  for mode in BudgetMode:
+    budget = CpuBudget(cpus, mode)
+    share = budget.threads_per_request()
+    configurations.append((mode.value, budget.request_concurrency, share, share))
+
+  rows = []
+  for label, concurrency, native_threads, stage_workers in configurations:
+    limit_native_threads(native_threads)
+    wall, latencies = _run_burst(service(stage_workers), requests=requests, concurrency=concurrency)
+    rows.append(
+      {
+        "label": label,
+        "concurrency": concurrency,
+        "native_threads": native_threads,
+        "wall_s": wall,
+        "tracks_per_min": requests / wall * 60.0,
+        "p50_s": float(np.percentile(latencies, 50)),
+        "p95_s": float(np.percentile(latencies, 95)),
+      }
+    )
+  return rows
+
+
+def _format(rows: Sequence[dict[str, float]], cpus: int) -> str:
+  lines = [
+    f"available cores: {cpus}",
+    f"{'config':>11} {'concurrent':>10} {'threads':>8} {'wall s':>8} {'tracks/min':>11} {'p50 s':>7} {'p95 s':>7}",
+  ]
+  for row in rows:
+    lines.append(
+      f"{row['label']:>11} {row['concurrency']:>10d} {row['native_threads']:>8d} {row['wall_s']:>8.2f}"
+      f" {row['tracks_per_min']:>11.1f} {row['p50_s']:>7.2f} {row['p95_s']:>7.2f}"
+    )
+  return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--requests", type=int, default=16, help="analyses submitted at once")
+  parser.add_argument("--seconds", type=float, default=20.0, help="length of each synthetic track")
+  parser.add_argument(
+    "--unmanaged-workers",
+    type=int,
+    default=4,
+    help="handler threads of the unmanaged baseline (the old build_grpc_server default)",
+  )
+  args = parser.parse_args(argv)
+  rows = run(
+    requests=args.requests,
+    track_seconds=args.seconds,
+    unmanaged_workers=args.unmanaged_workers,
+  )
+  print(_format(rows, available_cpus()))
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
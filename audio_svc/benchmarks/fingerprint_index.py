@@ -0,0 +1,142 @@
+"""Fingerprint index build and lookup cost against catalog size.
+
+``python -m audio_svc.benchmarks.fingerprint_index`` fills a
+:class:`~audio_svc.fingerprint.FingerprintIndex` with synthetic tracks of
+``--hashes`` random hashes each (real 20 s previews give roughly 250-300) and
+times lookups of near-duplicates and of unknown audio. A near-duplicate keeps
+``--overlap`` of an indexed track's hashes shifted by a few seconds, and adds
+the same number of unrelated hashes, which is harsher than a typical
+re-encode.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+from ..fingerprint import FRAME_SECONDS, Fingerprint, FingerprintIndex
+
+_HASH_SPACE = 1 << 24
+_WINDOW_FRAMES = 625
+
+
+def _random_fingerprint(rng: np.random.Generator, hashes: int) -> Fingerprint:
+  return Fingerprint(
+    rng.integers(0, _HASH_SPACE, hashes, dtype=np.uint32),
+    np.sort(rng.integers(0, _WINDOW_FRAMES, hashes)).astype(np.uint16),
+  )
+
+
+def _near_duplicate(
+  rng: np.random.Generator,
+  original: Fingerprint,
+  *,
+  overlap: float,
+  shift_frames: int,
+) -> Fingerprint:
+  kept = rng.random(len(original)) < overlap
+  kept &= original.offsets >= shift_frames
+  noise = _random_fingerprint(rng, int(kept.sum()))
+  return Fingerprint(
+    np.concatenate((original.hashes[kept], noise.hashes)),
+    np.concatenate(((original.offsets[kept] - shift_frames).astype(np.uint16), noise.offsets)),
+  )
+
+
+def _percentile_ms(samples: Sequence[float], q: float) -> float:
+  return float(np.percentile(samples, q)) * 1e3
+
+
+def run(
+  track_counts: Sequence[int],
+  *,
+  hashes: int = 280,
+  overlap: float = 0.3,
+  queries: int = 200,
+  seed: int = 0,
+) -> list[dict[str, float]]:
+  rng = np.random.default_rng(seed)
+  rows = []
+  index = FingerprintIndex()
+  originals: list[Fingerprint] = []
+  for count in sorted(track_counts):
+    added = max(0, count - len(index))
+    started = time.perf_counter()
+    while len(index) < count:
+      fingerprint = _random_fingerprint(rng, hashes)
+      originals.append(fingerprint)
+      index.add(f"track-{len(index)}", fingerprint)
+    build = time.perf_counter() - started
+
+    hit_latency, miss_latency, correct = [], [], 0
+    for _ in range(queries):
+      track = int(rng.integers(0, len(originals)))
+      shift = int(rng.integers(0, 5 / FRAME_SECONDS))
+      query = _near_duplicate(rng, originals[track], overlap=overlap, shift_frames=shift)
+      started = time.perf_counter()
+      match = index.lookup(query)
+      hit_latency.append(time.perf_counter() - started)
+      correct += match is not None and match.source == f"track-{track}"
+
+      query = _random_fingerprint(rng, hashes)
+      started = time.perf_counter()
+      match = index.lookup(query)
+      miss_latency.append(time.perf_counter() - started)
+      if match is not None:
+        raise AssertionError(f"unknown audio matched {match.source}")
+
+    rows.append(
+      {
+        "tracks": len(index),
+        "postings": index.postings,
+        "index_mb": index.postings * 10 / 1e6,
+        "insert_us": build / max(1, added) * 1e6,
+        "hit_p50_ms": _percentile_ms(hit_latency, 50),
+        "hit_p99_ms": _percentile_ms(hit_latency, 99),
+        "miss_p50_ms": _percentile_ms(miss_latency, 50),
+        "recall": correct / queries,
+      }
+    )
+  return rows
+
+
+def _format(rows: Sequence[dict[str, float]]) -> str:
+  lines = [
+    f"{'tracks':>8} {'postings':>11} {'MB':>7} {'insert us':>10}"
+    f" {'hit p50 ms':>11} {'hit p99 ms':>11} {'miss p50 ms':>12} {'recall':>7}"
+  ]
+  for row in rows:
+    lines.append(
+      f"{row['tracks']:>8d} {row['postings']:>11d} {row['index_mb']:>7.0f} {row['insert_us']:>10.1f}"
+      f" {row['hit_p50_ms']:>11.2f} {row['hit_p99_ms']:>11.2f} {row['miss_p50_ms']:>12.2f}"
+      f" {row['recall']:>7.2f}"
+    )
+  return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument(
+    "--tracks",
+    type=int,
+    nargs="+",
+    default=[10_000, 100_000, 300_000],
+    help="catalog sizes to measure; the index grows between them",
+  )
+  parser.add_argument("--hashes", type=int, default=280, help="hashes per synthetic track")
+  parser.add_argument("--overlap", type=float, default=0.3, help="share of hashes a duplicate keeps")
+  parser.add_argument("--queries", type=int, default=200)
+  args = parser.parse_args(argv)
+  print(
+    _format(
+      run(args.tracks, hashes=args.hashes, overlap=args.overlap, queries=args.queries)
+    )
+  )
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
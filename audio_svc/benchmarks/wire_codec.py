@@ -0,0 +1,125 @@
+"""Encode/decode cost of ``AnalyzeTrackResponse`` against response size.
+
+``python -m audio_svc.benchmarks.wire_codec`` builds responses whose timeline
+covers tracks of increasing length (at the service's 512-sample hop, 44.1 kHz
+gives ~86 frames per second) and times the wire codec in both directions. The
+``per-element`` column encodes the same packed fields one ``struct.pack`` per
+value, which is what a naive serializer over Python lists costs.
+"""
+
+from __future__ import annotations
+
+import argparse
+import struct
+import time
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from ..proto import audio_analysis_pb2 as messages
+from ..proto import wire
+
+_FRAME_RATE_HZ = 44100 / 512
+
+
+def build_response(track_seconds: float, *, seed: int = 0) -> messages.AnalyzeTrackResponse:
+  rng = np.random.default_rng(seed)
+  frames = int(track_seconds * _FRAME_RATE_HZ)
+  beats = np.arange(0.0, track_seconds, 0.5)
+  return messages.AnalyzeTrackResponse(
+    summary=messages.AnalysisSummary(
+      bpm=120.0,
+      energy=0.4,
+      beat_position=messages.BeatPosition.ON_BEAT,
+      spectral_centroid=1800.0,
+      key=messages.KeyEstimate(tonic="A", mode="minor", confidence=0.8, chord_progression=["A:i"] * 3),
+    ),
+    sections=[
+      messages.SectionBreakdown(label=label, start_sec=i * 45.0, end_sec=(i + 1) * 45.0, average_energy=0.3)
+      for i, label in enumerate(("intro", "verse", "chorus"))
+    ],
+    timeline=messages.AnalysisTimeline(
+      frame_rate_hz=_FRAME_RATE_HZ,
+      beat_times=beats,
+      energy_envelope=rng.random(frames, dtype=np.float32),
+      spectral_centroid=(rng.random(frames, dtype=np.float32) * 4000.0),
+    ),
+  )
+
+
+def _encode_per_element(response: messages.AnalyzeTrackResponse) -> bytes:
+  timeline = response.timeline
+  chunks = [wire.encode(response.summary)]
+  for section in response.sections:
+    chunks.append(wire.encode(section))
+  for number, fmt, values in (
+    (2, "<d", timeline.beat_times),
+    (3, "<f", timeline.energy_envelope),
+    (4, "<f", timeline.spectral_centroid),
+  ):
+    body = b"".join(struct.pack(fmt, value) for value in values.tolist())
+    chunks.append(wire._length_delimited(number, body))
+  return b"".join(chunks)
+
+
+def _best_of(fn: Callable[[], object], repeats: int) -> float:
+  best = float("inf")
+  for _ in range(repeats):
+    started = time.perf_counter()
+    fn()
+    best = min(best, time.perf_counter() - started)
+  return best
+
+
+def run(track_seconds: Sequence[float], *, repeats: int = 20) -> list[dict[str, float]]:
+  rows = []
+  for seconds in track_seconds:
+    response = build_response(seconds)
+    payload = response.SerializeToString()
+    if messages.AnalyzeTrackResponse.FromString(payload) != response:
+      raise AssertionError("wire round trip changed the response")
+    encode = _best_of(response.SerializeToString, repeats)
+    decode = _best_of(lambda: messages.AnalyzeTrackResponse.FromString(payload), repeats)
+    naive = _best_of(lambda: _encode_per_element(response), max(1, repeats // 4))
+    rows.append(
+      {
+        "track_seconds": seconds,
+        "bytes": len(payload),
+        "encode_us": encode * 1e6,
+        "decode_us": decode * 1e6,
+        "encode_mb_s": len(payload) / encode / 1e6,
+        "per_element_encode_us": naive * 1e6,
+      }
+    )
+  return rows
+
+
+def _format(rows: Sequence[dict[str, float]]) -> str:
+  lines = [
+    f"{'track s':>8} {'bytes':>10} {'encode us':>10} {'decode us':>10} {'enc MB/s':>9} {'per-element us':>15}"
+  ]
+  for row in rows:
+    lines.append(
+      f"{row['track_seconds']:>8.0f} {row['bytes']:>10d} {row['encode_us']:>10.1f}"
+      f" {row['decode_us']:>10.1f} {row['encode_mb_s']:>9.0f} {row['per_element_encode_us']:>15.1f}"
+    )
+  return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument(
+    "--seconds",
+    type=float,
+    nargs="+",
+    default=[0, 30, 180, 600, 3600],
+    help="track lengths whose timelines are encoded",
+  )
+  parser.add_argument("--repeats", type=int, default=20)
+  args = parser.parse_args(argv)
+  print(_format(run(args.seconds, repeats=args.repeats)))
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
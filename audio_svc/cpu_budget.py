@@ -0,0 +1,221 @@
+"""CPU budget shared by request concurrency and native thread pools.
+
+Every analysis runs NumPy/SciPy code whose BLAS (OpenBLAS, MKL) and OpenMP
+pools default to one thread per visible core. With several
+requests in flight the process ends up with cores x requests runnable threads,
+and throughput and tail latency both degrade. :class:`CpuBudget` counts the
+cores the process may actually use (CPU affinity and cgroup v1/v2 quotas,
+which ``os.cpu_count()`` ignores) and splits them between concurrent requests
+and the native threads each request may use:
+
+* ``throughput``: one request per core, one native thread per request.
+* ``latency``: one request at a time, all cores to its native thread pools.
+
+Limits are applied through the libraries' environment variables, which cover
+pools created later and child processes, and through ``threadpoolctl`` for
+BLAS libraries that are already loaded. An already loaded OpenMP runtime is
+different: ``omp_set_num_threads`` only sets the calling thread's team size,
+so the thread pools that run analysis code call :func:`inherit_native_limits`
+as their initializer. numba sizes its pool once, when it is first imported,
+and its ``set_num_threads`` is per thread too, so an already imported numba
+keeps its size; librosa's numba kernels are not parallel. Applying a budget
+changes process-wide state, so it belongs in process entry points rather than
+library code.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+try:
+  import threadpoolctl
+except ModuleNotFoundError:  # pragma: no cover - exercised via tests
+  threadpoolctl = None  # type: ignore[assignment]
+
+
+LOGGER = logging.getLogger(__name__)
+
+_CGROUP_ROOT = Path("/sys/fs/cgroup")
+_PROC_CGROUP = Path("/proc/self/cgroup")
+
+# Read by OpenMP, the BLAS builds NumPy/SciPy ship with, and numba when their
+# thread pools are first created.
+THREAD_ENV_VARS = (
+  "OMP_NUM_THREADS",
+  "OPENBLAS_NUM_THREADS",
+  "MKL_NUM_THREADS",
+  "BLIS_NUM_THREADS",
+  "VECLIB_MAXIMUM_THREADS",
+  "NUMEXPR_NUM_THREADS",
+  "NUMBA_NUM_THREADS",
+)
+
+# Set by limit_native_threads() for inherit_native_limits().
+_native_threads: Optional[int] = None
+
+
+class BudgetMode(Enum):
+  THROUGHPUT = "throughput"
+  LATENCY = "latency"
+
+
+def _affinity_cpus() -> int:
+  if hasattr(os, "sched_getaffinity"):
+    return len(os.sched_getaffinity(0))
+  return os.cpu_count() or 1
+
+
+def _cgroup_paths(proc_cgroup: Path) -> Dict[str, str]:
+  """Map each cgroup controller (``""`` for v2) to this process's cgroup path."""
+  try:
+    lines = proc_cgroup.read_text(encoding="utf-8").splitlines()
+  except OSError:
+    return {}
+  paths: Dict[str, str] = {}
+  for line in lines:
+    parts = line.split(":", 2)
+    if len(parts) != 3:
+      continue
+    _, controllers, path = parts
+    for controller in controllers.split(",") if controllers else ("",):
+      paths[controller] = path
+  return paths
+
+
+def _ancestors(base: Path, path: str) -> Iterator[Path]:
+  """``base/path`` and its parents up to ``base``; limits apply at every level."""
+  current = base.joinpath(*[part for part in path.split("/") if part])
+  while True:
+    yield current
+    if current == base:
+      return
+    current = current.parent
+
+
+def _read(path: Path) -> Optional[str]:
+  try:
+    return path.read_text(encoding="utf-8").strip()
+  except OSError:
+    return None
+
+
+def cgroup_cpu_limit(
+  cgroup_root: Union[str, Path] = _CGROUP_ROOT,
+  proc_cgroup: Union[str, Path] = _PROC_CGROUP,
+) -> Optional[float]:
+  """CPUs granted by the tightest cgroup CFS quota, or ``None`` when unlimited."""
+  root = Path(cgroup_root)
+  paths = _cgroup_paths(Path(proc_cgroup))
+  limits: List[float] = []
+
+  # cgroup v2: "<quota> <period>" or "max <period>" in cpu.max.
+  v2_base = root / "unified" if (root / "unified" / "cgroup.controllers").exists() else root
+  for directory in _ancestors(v2_base, paths.get("", "/")):
+    fields = (_read(directory / "cpu.max") or "").split()
+    if len(fields) == 2 and fields[0] != "max":
+      limits.append(int(fields[0]) / int(fields[1]))
+
+  # cgroup v1: cpu.cfs_quota_us is -1 when unlimited. Inside a container the
+  # listed path often does not exist because the container's own cgroup is
+  # mounted at the hierarchy root, which the walk up still reaches.
+  v1_path = paths.get("cpu", "/")
+  for mount in ("cpu", "cpu,cpuacct", "cpuacct,cpu"):
+    base = root / mount
+    if not base.is_dir():
+      continue
+    for directory in _ancestors(base, v1_path):
+      quota = _read(directory / "cpu.cfs_quota_us")
+      period = _read(directory / "cpu.cfs_period_us")
+      if quota and period and int(quota) > 0 and int(period) > 0:
+        limits.append(int(quota) / int(period))
+    break
+  return min(limits) if limits else None
+
+
+def available_cpus(
+  cgroup_root: Union[str, Path] = _CGROUP_ROOT,
+  proc_cgroup: Union[str, Path] = _PROC_CGROUP,
+) -> int:
+  """Cores this process can keep busy without being throttled."""
+  cpus = _affinity_cpus()
+  quota = cgroup_cpu_limit(cgroup_root, proc_cgroup)
+  if quota is not None:
+    # A fractional quota is rounded down: a thread for the remainder would
+    # only get the process throttled.
+    cpus = min(cpus, max(1, math.floor(quota)))
+  return max(1, cpus)
+
+
+def limit_native_threads(threads: int) -> None:
+  """Cap native thread pools of this process and its children.
+
+  Loaded BLAS pools are capped process-wide, a loaded OpenMP runtime only for
+  the calling thread (see :func:`inherit_native_limits`).
+  """
+  global _native_threads
+  if threads < 1:
+    raise ValueError("threads must be at least 1")
+  os.environ.update({name: str(threads) for name in THREAD_ENV_VARS})
+  _native_threads = threads
+  if threadpoolctl is not None:
+    threadpoolctl.threadpool_limits(limits=threads)
+  else:  # pragma: no cover - threadpoolctl ships with librosa's dependencies
+    LOGGER.warning("threadpoolctl is not installed; already loaded BLAS pools keep their size")
+
+
+def inherit_native_limits() -> None:
+  """Apply the process's OpenMP limit to the calling thread.
+
+  Meant as a thread pool ``initializer``. Does nothing unless
+  :func:`limit_native_threads` was called, so library code may always pass it.
+  """
+  if _native_threads is not None and threadpoolctl is not None:
+    threadpoolctl.threadpool_limits(limits=_native_threads, user_api="openmp")
+
+
+@dataclass(frozen=True, slots=True)
+class CpuBudget:
+  """Cores available to the service and how they are split between requests."""
+
+  cpus: int
+  mode: BudgetMode = BudgetMode.THROUGHPUT
+
+  def __post_init__(self) -> None:
+    if self.cpus < 1:
+      raise ValueError("cpus must be at least 1")
+    object.__setattr__(self, "mode", BudgetMode(self.mode))
+
+  @classmethod
+  def detect(cls, mode: Union[BudgetMode, str] = BudgetMode.THROUGHPUT) -> "CpuBudget":
+    return cls(available_cpus(), BudgetMode(mode))
+
+  @property
+  def request_concurrency(self) -> int:
+    """Analyses to run at once."""
+    return self.cpus if self.mode == BudgetMode.THROUGHPUT else 1
+
+  def threads_per_request(self, concurrency: Optional[int] = None) -> int:
+    """Cores each of ``concurrency`` simultaneous analyses may use.
+
+    This caps both the native thread pools and the analysis's stage workers.
+    """
+    return max(1, self.cpus // (concurrency or self.request_concurrency))
+
+  def apply(self, concurrency: Optional[int] = None) -> int:
+    """Limit native thread pools for ``concurrency`` analyses; returns the per-request share."""
+    threads = self.threads_per_request(concurrency)
+    limit_native_threads(threads)
+    LOGGER.info(
+      "CPU budget: %d cores, %s mode, %d concurrent analyses with %d native threads each",
+      self.cpus,
+      self.mode.value,
+      concurrency or self.request_concurrency,
+      threads,
+    )
+    return threads
@@ -0,0 +1,466 @@
+"""Acoustic fingerprints for recognising the same recording behind new URLs.
+
+The same song reaches the service through re-uploads and re-encodes whose
+bytes (and URLs) differ, so neither URL nor content-hash caching catches
+them. A fingerprint is computed from a cheap, low-rate decode of the start of
+the track: the strongest spectral peaks are paired into ``(f1, f2, dt)``
+hashes, each tagged with the frame of its anchor peak. Peak positions survive
+re-encoding, resampling and gain changes, and a constant difference between
+matched anchor frames reveals how far one copy is shifted against the other.
+
+:class:`FingerprintIndex` keeps the hashes of analysed tracks in an in-memory
+inverted index built from sorted NumPy arrays. Lookups are a few binary
+searches and one vectorised vote, so they stay in the millisecond range at
+hundreds of thousands of tracks. The index persists as a compacted snapshot
+plus an append-only journal of tracks added since.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import io
+import logging
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+try:
+  import librosa
+  from scipy import ndimage
+except ModuleNotFoundError:  # pragma: no cover - exercised via tests
+  librosa = None  # type: ignore[assignment]
+  ndimage = None  # type: ignore[assignment]
+
+
+LOGGER = logging.getLogger(__name__)
+
+SAMPLE_RATE = 8000
+# Only the start of the track is decoded and fingerprinted.
+WINDOW_SECONDS = 20.0
+_N_FFT = 1024
+_HOP = 256
+FRAME_SECONDS = _HOP / SAMPLE_RATE
+
+_PEAK_NEIGHBOURHOOD = (31, 15)  # frequency bins x frames
+_PEAK_FLOOR_DB = -60.0
+_PEAKS_PER_SECOND = 5
+_FAN_OUT = 3
+_MAX_DT = 63  # frames; 6 bits of the hash
+_FREQ_BINS = 512  # 9 bits per peak frequency; the Nyquist bin is dropped
+
+# Source name length, hash count and CRC-32 of the record's body.
+_JOURNAL_HEADER = struct.Struct("<III")
+
+
+@dataclass(frozen=True, slots=True)
+class Fingerprint:
+  hashes: np.ndarray  # uint32
+  offsets: np.ndarray  # uint16 anchor frame of each hash
+
+  def __len__(self) -> int:
+    return int(self.hashes.size)
+
+
+@dataclass(frozen=True, slots=True)
+class FingerprintMatch:
+  source: str
+  # Add to a time in the matched track's analysis to get the same moment in
+  # the queried audio.
+  offset_seconds: float
+  matches: int
+  score: float
+
+
+def _require_librosa() -> None:
+  if librosa is None or ndimage is None:
+    raise RuntimeError("librosa and scipy must be installed to compute fingerprints.")
+
+
+def decode_preview(payload: bytes) -> np.ndarray:
+  """Decode only the fingerprint window, resampled to :data:`SAMPLE_RATE`."""
+  _require_librosa()
+  y, _ = librosa.load(io.BytesIO(payload), sr=SAMPLE_RATE, mono=True, duration=WINDOW_SECONDS)
+  return y
+
+
+def preview_signal(y: np.ndarray, sr: int) -> np.ndarray:
+  """Fingerprint window of an already decoded signal."""
+  _require_librosa()
+  head = y[: int(WINDOW_SECONDS * sr)]
+  if sr == SAMPLE_RATE:
+    return head
+  return librosa.resample(head, orig_sr=sr, target_sr=SAMPLE_RATE)
+
+
+def compute_fingerprint(preview: np.ndarray) -> Fingerprint:
+  """Pair the strongest spectral peaks of a :data:`SAMPLE_RATE` signal into hashes."""
+  _require_librosa()
+  empty = Fingerprint(np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint16))
+  if preview.size < _N_FFT:
+    return empty
+  spectrum = np.abs(librosa.stft(preview, n_fft=_N_FFT, hop_length=_HOP))[:_FREQ_BINS]
+  if not spectrum.any():
+    return empty
+  level = librosa.amplitude_to_db(spectrum, ref=np.max)
+  is_peak = (ndimage.maximum_filter(level, size=_PEAK_NEIGHBOURHOOD) == level) & (
+    level > _PEAK_FLOOR_DB
+  )
+  freqs, frames = np.nonzero(is_peak)
+  strength = level[freqs, frames]
+
+  # Keep the strongest few peaks of every second so quiet passages still
+  # contribute and the hash count stays proportional to duration.
+  block = frames // max(1, int(round(1.0 / FRAME_SECONDS)))
+  order = np.lexsort((-strength, block))
+  block = block[order]
+  starts = np.r_[0, np.flatnonzero(np.diff(block)) + 1]
+  rank = np.arange(block.size) - np.repeat(starts, np.diff(np.r_[starts, block.size]))
+  keep = order[rank < _PEAKS_PER_SECOND]
+  by_time = keep[np.lexsort((freqs[keep], frames[keep]))]
+  freqs, frames = freqs[by_time].astype(np.uint32), frames[by_time]
+
+  hashes: List[np.ndarray] = []
+  offsets: List[np.ndarray] = []
+  for step in range(1, _FAN_OUT + 1):
+    dt = frames[step:] - frames[:-step]
+    pair = (dt >= 1) & (dt <= _MAX_DT)
+    anchor = np.flatnonzero(pair)
+    hashes.append(
+      (freqs[anchor] << 15) | (freqs[anchor + step] << 6) | dt[anchor].astype(np.uint32)
+    )
+    offsets.append(frames[anchor])
+  return Fingerprint(
+    np.concatenate(hashes).astype(np.uint32),
+    np.concatenate(offsets).astype(np.uint16),
+  )
+
+
+class _Segment:
+  """Postings sorted by hash, searched with ``np.searchsorted``."""
+
+  __slots__ = ("hashes", "tracks", "offsets")
+
+  def __init__(self, hashes: np.ndarray, tracks: np.ndarray, offsets: np.ndarray) -> None:
+    order = np.argsort(hashes, kind="stable")
+    self.hashes = hashes[order]
+    self.tracks = tracks[order]
+    self.offsets = offsets[order]
+
+  @classmethod
+  def empty(cls) -> "_Segment":
+    return cls(
+      np.zeros(0, dtype=np.uint32),
+      np.zeros(0, dtype=np.uint32),
+      np.zeros(0, dtype=np.uint16),
+    )
+
+  def __len__(self) -> int:
+    return int(self.hashes.size)
+
+  def merged(self, other: "_Segment") -> "_Segment":
+    # Linear-time merge of two sorted segments.
+    positions = np.searchsorted(self.hashes, other.hashes, side="right")
+    merged = _Segment.__new__(_Segment)
+    merged.hashes = np.insert(self.hashes, positions, other.hashes)
+    merged.tracks = np.insert(self.tracks, positions, other.tracks)
+    merged.offsets = np.insert(self.offsets, positions, other.offsets)
+    return merged
+
+  def votes(self, query: Fingerprint, max_postings: int) -> tuple[np.ndarray, np.ndarray]:
+    """Track id and anchor-frame difference of every posting the query hits."""
+    left = np.searchsorted(self.hashes, query.hashes, side="left")
+    counts = np.searchsorted(self.hashes, query.hashes, side="right") - left
+    # Hashes shared by very many tracks (silence, test tones) carry no signal.
+    hit = (counts > 0) & (counts <= max_postings)
+    left, counts = left[hit], counts[hit]
+    total = int(counts.sum())
+    if total == 0:
+      return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32)
+    run_starts = np.cumsum(counts) - counts
+    positions = np.repeat(left - run_starts, counts) + np.arange(total)
+    deltas = self.offsets[positions].astype(np.int32) - np.repeat(
+      query.offsets[hit].astype(np.int32),
+      counts,
+    )
+    return self.tracks[positions], deltas
+
+
+class FingerprintIndex:
+  """In-memory inverted index from fingerprint hashes to analysed tracks.
+
+  Postings live in a few hash-sorted segments of geometrically growing size:
+  each new track becomes a small segment, and neighbouring segments are
+  merged once the newer one is at least half the size of the older. Inserts
+  therefore cost amortised O(log n) copies per posting, and a lookup searches
+  O(log n) segments. Each posting costs 10 bytes, so a track with a few
+  hundred hashes needs a few KB.
+
+  With a ``directory`` the index is loaded from ``index.npz`` plus
+  ``journal.bin``. Every :meth:`add` is appended to the journal, and once the
+  journal outgrows ``max_journal_bytes`` it is folded into a new snapshot, as
+  :meth:`compact` does. Several processes may share a directory: file access
+  is serialised by an exclusive lock on ``index.lock``, compaction first
+  merges whatever other processes have written, and :meth:`add` and
+  :meth:`lookup` pick up tracks other processes added since the last read.
+  A torn record left by a crash is cut off the journal when it is next read.
+  """
+
+  def __init__(
+    self,
+    directory: Optional[Union[str, Path]] = None,
+    *,
+    min_matches: int = 12,
+    min_score: float = 0.05,
+    max_postings: int = 2000,
+    max_journal_bytes: int = 64 << 20,
+  ) -> None:
+    self._directory = None if directory is None else Path(directory)
+    self._min_matches = min_matches
+    self._min_score = min_score
+    self._max_postings = max_postings
+    self._max_journal_bytes = max_journal_bytes
+    self._lock = threading.Lock()
+    self._sources: List[str] = []
+    self._source_ids: Dict[str, int] = {}
+    self._segments: tuple[_Segment, ...] = ()
+    # How much of the files on disk is already in memory.
+    self._snapshot_seen: Optional[tuple[int, int, int]] = None
+    self._journal_position = 0
+    if self._directory is not None:
+      self._directory.mkdir(parents=True, exist_ok=True)
+      with self._file_lock():
+        self._read_disk()
+
+  def __len__(self) -> int:
+    return len(self._sources)
+
+  def __contains__(self, source: object) -> bool:
+    return source in self._source_ids
+
+  @property
+  def postings(self) -> int:
+    return sum(len(segment) for segment in self._segments)
+
+  def add(self, source: str, fingerprint: Fingerprint) -> bool:
+    """Index ``source``; returns ``False`` if it was already indexed or empty."""
+    if not len(fingerprint):
+      return False
+    with self._lock:
+      if self._directory is None:
+        if source in self._source_ids:
+          return False
+        self._insert(source, fingerprint)
+        return True
+      with self._file_lock():
+        self._read_disk()
+        if source in self._source_ids:
+          return False
+        self._insert(source, fingerprint)
+        self._journal_position = self._append_journal(source, fingerprint)
+        if self._journal_position > self._max_journal_bytes:
+          self._compact_locked()
+    return True
+
+  def lookup(self, fingerprint: Fingerprint) -> Optional[FingerprintMatch]:
+    """Best indexed track sharing enough time-aligned hashes, if any."""
+    if not len(fingerprint):
+      return None
+    if self._directory is not None and self._disk_changed():
+      with self._lock, self._file_lock():
+        self._read_disk()
+    # Segments are immutable and replaced wholesale, so a snapshot of the
+    # tuple is safe to search without holding the lock.
+    segments, sources = self._segments, self._sources
+    tracks: List[np.ndarray] = []
+    deltas: List[np.ndarray] = []
+    for segment in segments:
+      segment_tracks, segment_deltas = segment.votes(fingerprint, self._max_postings)
+      tracks.append(segment_tracks)
+      deltas.append(segment_deltas)
+    if not tracks:
+      return None
+    track_ids = np.concatenate(tracks).astype(np.int64)
+    if not track_ids.size:
+      return None
+    # One vote per (track, alignment); the true copy piles up on one delta.
+    keys = (track_ids << 17) | (np.concatenate(deltas).astype(np.int64) + (1 << 16))
+    unique, counts = np.unique(keys, return_counts=True)
+    best = int(np.argmax(counts))
+    matches = int(counts[best])
+    score = matches / len(fingerprint)
+    if matches < self._min_matches or score < self._min_score:
+      return None
+    track = int(unique[best] >> 17)
+    delta = int(unique[best] & ((1 << 17) - 1)) - (1 << 16)
+    return FingerprintMatch(
+      source=sources[track],
+      offset_seconds=-delta * FRAME_SECONDS,
+      matches=matches,
+      score=round(score, 3),
+    )
+
+  def compact(self) -> None:
+    """Write a snapshot of the whole index and truncate the journal.
+
+    Tracks other processes added to the snapshot or journal are merged in
+    first, so the new snapshot covers everything on disk.
+    """
+    if self._directory is None:
+      raise RuntimeError("compact() needs an index directory")
+    with self._lock, self._file_lock():
+      self._compact_locked()
+
+  def _compact_locked(self) -> None:
+    self._read_disk()
+    merged = _Segment.empty()
+    for segment in self._segments:
+      merged = merged.merged(segment)
+    self._segments = (merged,)
+    snapshot = self._directory / "index.npz"
+    scratch = self._directory / f"index.{os.getpid()}.tmp.npz"
+    np.savez(
+      scratch,
+      hashes=merged.hashes,
+      tracks=merged.tracks,
+      offsets=merged.offsets,
+      sources=np.frombuffer("\n".join(self._sources).encode("utf-8"), dtype=np.uint8),
+    )
+    os.replace(scratch, snapshot)
+    (self._directory / "journal.bin").write_bytes(b"")
+    self._snapshot_seen = _file_identity(snapshot)
+    self._journal_position = 0
+
+  def _disk_changed(self) -> bool:
+    """Whether another process compacted or appended since the last read."""
+    journal = _file_identity(self._directory / "journal.bin")
+    return _file_identity(self._directory / "index.npz") != self._snapshot_seen or (
+      journal is not None and journal[2] != self._journal_position
+    )
+
+  def _register(self, source: str) -> int:
+    track = len(self._sources)
+    self._sources.append(source)
+    self._source_ids[source] = track
+    return track
+
+  def _publish(self, segment: _Segment) -> None:
+    # Sources are registered before postings that refer to them are published.
+    segments = [*self._segments, segment]
+    while len(segments) > 1 and 2 * len(segments[-1]) >= len(segments[-2]):
+      newest = segments.pop()
+      segments[-1] = segments[-1].merged(newest)
+    self._segments = tuple(segments)
+
+  def _insert(self, source: str, fingerprint: Fingerprint) -> None:
+    track = self._register(source)
+    self._publish(
+      _Segment(
+        fingerprint.hashes,
+        np.full(len(fingerprint), track, dtype=np.uint32),
+        fingerprint.offsets,
+      )
+    )
+
+  @contextmanager
+  def _file_lock(self) -> Iterator[None]:
+    with (self._directory / "index.lock").open("a") as handle:
+      fcntl.flock(handle, fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        fcntl.flock(handle, fcntl.LOCK_UN)
+
+  def _append_journal(self, source: str, fingerprint: Fingerprint) -> int:
+    """Append one record; returns the journal's new size."""
+    encoded = source.encode("utf-8")
+    body = b"".join(
+      (
+        encoded,
+        fingerprint.hashes.astype("<u4").tobytes(),
+        fingerprint.offsets.astype("<u2").tobytes(),
+      )
+    )
+    with (self._directory / "journal.bin").open("ab") as handle:
+      handle.write(_JOURNAL_HEADER.pack(len(encoded), len(fingerprint), zlib.crc32(body)) + body)
+      return handle.tell()
+
+  def _read_disk(self) -> None:
+    """Merge tracks from the snapshot and journal that are not in memory yet.
+
+    Called with the file lock held.
+    """
+    snapshot = self._directory / "index.npz"
+    snapshot_id = _file_identity(snapshot)
+    if snapshot_id != self._snapshot_seen:
+      # A new snapshot means the journal was emptied when it was written.
+      self._snapshot_seen = snapshot_id
+      self._journal_position = 0
+    else:
+      snapshot_id = None
+    if snapshot_id is not None:
+      with np.load(snapshot) as data:
+        hashes, tracks, offsets = data["hashes"], data["tracks"], data["offsets"]
+        names = data["sources"].tobytes().decode("utf-8")
+      disk_sources = names.split("\n") if names else []
+      remap = np.full(len(disk_sources), -1, dtype=np.int64)
+      for disk_track, source in enumerate(disk_sources):
+        if source not in self._source_ids:
+          remap[disk_track] = self._register(source)
+      if not self._segments and np.array_equal(remap, np.arange(len(disk_sources))):
+        # Fresh load: the snapshot is already one sorted segment.
+        segment = _Segment.__new__(_Segment)
+        segment.hashes, segment.tracks, segment.offsets = hashes, tracks, offsets
+        self._segments = (segment,)
+      elif (remap >= 0).any():
+        new_tracks = remap[tracks]
+        keep = new_tracks >= 0
+        self._publish(_Segment(hashes[keep], new_tracks[keep].astype(np.uint32), offsets[keep]))
+
+    journal = self._directory / "journal.bin"
+    if not journal.exists():
+      return
+    with journal.open("rb") as handle:
+      handle.seek(self._journal_position)
+      payload = handle.read()
+    position = 0
+    while position < len(payload):
+      end = -1
+      if position + _JOURNAL_HEADER.size <= len(payload):
+        name_length, count, checksum = _JOURNAL_HEADER.unpack_from(payload, position)
+        start = position + _JOURNAL_HEADER.size
+        end = start + name_length + count * 6
+      if end < 0 or end > len(payload) or zlib.crc32(payload[start:end]) != checksum:
+        # Left by a writer that crashed mid-record. Records appended later
+        # would sit behind it and be unreadable, so cut it off.
+        torn_at = self._journal_position + position
+        LOGGER.warning("Truncating torn fingerprint journal record at byte %d", torn_at)
+        os.truncate(journal, torn_at)
+        break
+      source = payload[start : start + name_length].decode("utf-8")
+      hashes_at = start + name_length
+      fingerprint = Fingerprint(
+        np.frombuffer(payload, dtype="<u4", count=count, offset=hashes_at).astype(np.uint32),
+        np.frombuffer(payload, dtype="<u2", count=count, offset=hashes_at + count * 4).astype(
+          np.uint16
+        ),
+      )
+      if source not in self._source_ids:
+        self._insert(source, fingerprint)
+      position = end
+    self._journal_position += position
+
+
+def _file_identity(path: Path) -> Optional[tuple[int, int, int]]:
+  """Inode, modification time and size of ``path``, or ``None`` if missing."""
+  try:
+    stat = os.stat(path)
+  except FileNotFoundError:
+    return None
+  return stat.st_ino, stat.st_mtime_ns, stat.st_size
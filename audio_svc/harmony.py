@@ -0,0 +1,217 @@
+"""Time-varying key and chord tracking over beat-synchronous chroma.
+
+Every candidate (24 keys or 24 major/minor triads) is scored against every
+beat in a single matrix product, then a Viterbi pass with a sticky transition
+model smooths the frame-wise winners into a path. Both steps are linear in
+the number of beats, so cost stays proportional to track length.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+
+NOTE_NAMES: tuple[str, ...] = (
+  "C",
+  "C#",
+  "D",
+  "D#",
+  "E",
+  "F",
+  "F#",
+  "G",
+  "G#",
+  "A",
+  "A#",
+  "B",
+)
+
+_ROMAN_DEGREES: tuple[str, ...] = (
+  "I",
+  "bII",
+  "II",
+  "bIII",
+  "III",
+  "IV",
+  "#IV",
+  "V",
+  "bVI",
+  "VI",
+  "bVII",
+  "VII",
+)
+
+KRUMHANSL_MAJOR = np.array(
+  [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88],
+  dtype=np.float32,
+)
+KRUMHANSL_MINOR = np.array(
+  [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17],
+  dtype=np.float32,
+)
+
+# Frames without a detectable beat grid are grouped into blocks of this size
+# (~0.5 s at the default 22.05 kHz / 512-sample hop).
+_FALLBACK_BLOCK_FRAMES = 22
+# Beats averaged on either side of a beat before key scoring.
+_KEY_WINDOW_BEATS = 16
+_KEY_SELF_TRANSITION = 0.98
+_KEY_TEMPERATURE = 0.02
+_CHORD_SELF_TRANSITION = 0.8
+_CHORD_TEMPERATURE = 0.1
+
+
+def _rotations(template: np.ndarray) -> np.ndarray:
+  """12x12 matrix whose row ``k`` is ``template`` transposed to tonic ``k``."""
+  index = (np.arange(12)[None, :] - np.arange(12)[:, None]) % 12
+  return template[index]
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+  norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+  return matrix / np.where(norms > 0, norms, 1.0)
+
+
+# Row order for both banks: 12 major candidates (C..B) followed by 12 minor.
+KEY_PROFILES = _unit_rows(np.vstack([_rotations(KRUMHANSL_MAJOR), _rotations(KRUMHANSL_MINOR)]))
+_MAJOR_TRIAD = np.zeros(12, dtype=np.float32)
+_MAJOR_TRIAD[[0, 4, 7]] = 1.0
+_MINOR_TRIAD = np.zeros(12, dtype=np.float32)
+_MINOR_TRIAD[[0, 3, 7]] = 1.0
+CHORD_TEMPLATES = _unit_rows(np.vstack([_rotations(_MAJOR_TRIAD), _rotations(_MINOR_TRIAD)]))
+
+
+def candidate_root(index: int) -> int:
+  return index % 12
+
+
+def candidate_is_minor(index: int) -> bool:
+  return index >= 12
+
+
+def key_name(index: int) -> tuple[str, str]:
+  return NOTE_NAMES[candidate_root(index)], ("minor" if candidate_is_minor(index) else "major")
+
+
+def roman_label(chord_index: int, key_index: int) -> str:
+  """Label a chord relative to a key in the ``"<tonic>:<numeral>"`` form."""
+  tonic = candidate_root(key_index)
+  degree = _ROMAN_DEGREES[(candidate_root(chord_index) - tonic) % 12]
+  if candidate_is_minor(chord_index):
+    degree = degree.lower()
+  return f"{NOTE_NAMES[tonic]}:{degree}"
+
+
+def template_scores(templates: np.ndarray, chroma: np.ndarray) -> np.ndarray:
+  """Cosine similarity of every template row against every chroma column."""
+  norms = np.linalg.norm(chroma, axis=0, keepdims=True)
+  return templates @ (chroma / np.where(norms > 0, norms, 1.0))
+
+
+def viterbi(log_emissions: np.ndarray, self_transition: float) -> np.ndarray:
+  """Most likely state path under a uniform "stay or jump" transition model.
+
+  With every off-diagonal transition equally likely, the best predecessor of
+  a state is either itself or the overall best state, so each step is O(K)
+  rather than O(K^2).
+  """
+  states, frames = log_emissions.shape
+  if frames == 0:
+    return np.zeros(0, dtype=np.intp)
+  log_stay = np.log(self_transition)
+  log_jump = np.log((1.0 - self_transition) / (states - 1))
+  backpointers = np.empty((frames, states), dtype=np.intp)
+  delta = log_emissions[:, 0] - np.log(states)
+  for frame in range(1, frames):
+    best_prev = int(np.argmax(delta))
+    stay = delta + log_stay
+    jump = delta[best_prev] + log_jump
+    take_jump = jump > stay
+    backpointers[frame] = np.where(take_jump, best_prev, np.arange(states))
+    delta = np.where(take_jump, jump, stay) + log_emissions[:, frame]
+
+  path = np.empty(frames, dtype=np.intp)
+  path[-1] = int(np.argmax(delta))
+  for frame in range(frames - 1, 0, -1):
+    path[frame - 1] = backpointers[frame, path[frame]]
+  return path
+
+
+def beat_sync(chroma: np.ndarray, beat_frames: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+  """Average chroma between beat boundaries.
+
+  Returns the synchronised chroma (12 x segments) and the segment boundaries in
+  frames (segments + 1 entries, starting at 0 and ending at the last frame).
+  """
+  total = chroma.shape[1]
+  if total == 0:
+    return np.zeros((chroma.shape[0], 0), dtype=chroma.dtype), np.zeros(1, dtype=np.intp)
+  if beat_frames.size >= 2:
+    inner = np.unique(np.clip(beat_frames.astype(np.intp), 1, max(total - 1, 1)))
+  else:
+    inner = np.arange(_FALLBACK_BLOCK_FRAMES, total, _FALLBACK_BLOCK_FRAMES, dtype=np.intp)
+  boundaries = np.concatenate(([0], inner[inner < total], [total])).astype(np.intp)
+  sums = np.add.reduceat(chroma, boundaries[:-1], axis=1)
+  widths = np.diff(boundaries).astype(chroma.dtype)
+  return sums / np.where(widths > 0, widths, 1.0), boundaries
+
+
+def _windowed(chroma: np.ndarray, radius: int) -> np.ndarray:
+  """Centred moving average along time via cumulative sums."""
+  segments = chroma.shape[1]
+  padded = np.concatenate((np.zeros((12, 1), dtype=chroma.dtype), np.cumsum(chroma, axis=1)), axis=1)
+  starts = np.clip(np.arange(segments) - radius, 0, segments)
+  ends = np.clip(np.arange(segments) + radius + 1, 0, segments)
+  return (padded[:, ends] - padded[:, starts]) / (ends - starts)
+
+
+@dataclass(frozen=True, slots=True)
+class HarmonyTimeline:
+  """Per-segment key and chord paths with their time boundaries in seconds."""
+
+  boundaries_sec: np.ndarray
+  key_path: np.ndarray
+  chord_path: np.ndarray
+  global_key_scores: np.ndarray
+
+  def span(self, start_sec: float, end_sec: float) -> slice:
+    """Segments whose midpoint falls in ``[start_sec, end_sec)``."""
+    midpoints = (self.boundaries_sec[:-1] + self.boundaries_sec[1:]) / 2.0
+    first = int(np.searchsorted(midpoints, start_sec, side="left"))
+    last = int(np.searchsorted(midpoints, end_sec, side="left"))
+    return slice(first, last)
+
+
+def track_harmony(
+  chroma: np.ndarray,
+  beat_frames: np.ndarray,
+  frame_seconds: float,
+) -> HarmonyTimeline:
+  synced, boundaries = beat_sync(chroma, beat_frames)
+  key_scores = template_scores(KEY_PROFILES, _windowed(synced, _KEY_WINDOW_BEATS // 2))
+  chord_scores = template_scores(CHORD_TEMPLATES, synced)
+  return HarmonyTimeline(
+    boundaries_sec=boundaries * frame_seconds,
+    key_path=viterbi(key_scores / _KEY_TEMPERATURE, _KEY_SELF_TRANSITION),
+    chord_path=viterbi(chord_scores / _CHORD_TEMPERATURE, _CHORD_SELF_TRANSITION),
+    global_key_scores=template_scores(KEY_PROFILES, np.mean(chroma, axis=1, keepdims=True))[:, 0],
+  )
+
+
+def collapse(path: Sequence[int]) -> list[int]:
+  """Drop consecutive repeats so a path reads as a progression."""
+  values = np.asarray(path)
+  if values.size == 0:
+    return []
+  keep = np.concatenate(([True], values[1:] != values[:-1]))
+  return values[keep].tolist()
+
+
+def dominant(path: np.ndarray) -> tuple[int, float]:
+  """Most frequent state in ``path`` and the share of segments it covers."""
+  counts = np.bincount(path, minlength=24)
+  winner = int(np.argmax(counts))
+  return winner, float(counts[winner] / max(path.size, 1))
@@ -0,0 +1,414 @@
+"""Asynchronous analysis jobs backed by a durable queue.
+
+``SubmitAnalysis`` records a job and returns at once; :class:`AnalysisWorker`
+threads or processes pull jobs from the queue independently of any client
+connection, run them through ``AudioAnalysisService.AnalyzeTrack`` (so the
+result lands in the result store) and mark them finished. Clients poll
+``GetAnalysisStatus`` or hold a ``WatchAnalysis`` stream, and can reconnect
+at any time without losing work.
+
+:class:`SqliteJobQueue` is the local, file-backed queue and is safe to share
+between processes on one host. Production deployments plug a broker-backed
+implementation of :class:`JobQueue` in its place (ADR-0002).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, List, Optional, Protocol, Union
+
+from .cpu_budget import inherit_native_limits
+from .proto import audio_analysis_pb2 as messages
+
+if TYPE_CHECKING:  # pragma: no cover - import cycle guard
+  from .server import AudioAnalysisService
+
+
+LOGGER = logging.getLogger(__name__)
+
+JobStatus = messages.AnalysisJobStatus
+
+_ACTIVE = (JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.SUCCEEDED)
+
+
+def _rank(priority: messages.AnalysisPriority) -> int:
+  """Claim order: interactive (and unspecified) jobs before background ones."""
+  return 1 if priority == messages.AnalysisPriority.BACKGROUND else 0
+
+
+@dataclass(frozen=True, slots=True)
+class Job:
+  job_id: str
+  request: messages.AnalyzeTrackRequest
+  version: str
+  status: JobStatus
+  attempts: int = 0
+  error: str = ""
+  # Incremented on every state change; watchers wait for it to move.
+  revision: int = 0
+
+  @property
+  def finished(self) -> bool:
+    return self.status in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+
+class JobQueue(Protocol):
+  def submit(
+    self,
+    request: messages.AnalyzeTrackRequest,
+    version: str,
+    *,
+    result_stored: bool = False,
+  ) -> Job:
+    """Enqueue ``request``, or return the live job already covering its source.
+
+    ``result_stored`` says whether the result store already holds a result
+    that answers ``request``: a queued job is then finished without running,
+    and a finished job without one is queued again for ``request``.
+    """
+    ...
+
+  def get(self, job_id: str) -> Optional[Job]: ...
+
+  def claim(self, worker_id: str, *, lease_seconds: float) -> Optional[Job]:
+    """Take the next runnable job, or ``None`` when the queue is idle."""
+    ...
+
+  def complete(self, job_id: str, worker_id: str) -> bool:
+    """Mark the job finished; ``False`` when ``worker_id`` no longer holds it."""
+    ...
+
+  def fail(self, job_id: str, worker_id: str, error: str) -> Optional[Job]:
+    """Record a failed attempt; the job is re-queued until its retries run out.
+
+    Returns ``None`` without recording anything when ``worker_id`` no longer
+    holds the job, e.g. because its lease expired and another worker claimed it.
+    """
+    ...
+
+  def wait_for_update(self, job_id: str, revision: int, *, timeout: float) -> Optional[Job]:
+    """Block until the job's revision differs from ``revision`` or ``timeout`` passes."""
+    ...
+
+
+class SqliteJobQueue:
+  """:class:`JobQueue` persisted in SQLite, shareable across local processes.
+
+  A claimed job holds a lease. If its worker dies, the job becomes claimable
+  again once the lease expires, and every claim counts as an attempt.
+  """
+
+  def __init__(
+    self,
+    path: Union[str, Path],
+    *,
+    max_attempts: int = 3,
+    poll_interval: float = 0.5,
+  ) -> None:
+    if max_attempts < 1:
+      raise ValueError("max_attempts must be at least 1")
+    self._max_attempts = max_attempts
+    self._poll_interval = poll_interval
+    self._lock = threading.Lock()
+    self._changed = threading.Condition()
+    # Autocommit mode; multi-statement updates take the write lock up front
+    # with BEGIN IMMEDIATE so concurrent workers never claim the same job.
+    self._connection = sqlite3.connect(
+      str(path),
+      timeout=30.0,
+      isolation_level=None,
+      check_same_thread=False,
+    )
+    with self._lock:
+      self._connection.execute("PRAGMA journal_mode=WAL")
+      self._connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+          job_id TEXT PRIMARY KEY,
+          source TEXT NOT NULL,
+          version TEXT NOT NULL,
+          request BLOB NOT NULL,
+          rank INTEGER NOT NULL,
+          status INTEGER NOT NULL,
+          attempts INTEGER NOT NULL DEFAULT 0,
+          error TEXT NOT NULL DEFAULT '',
+          worker TEXT,
+          lease_expires REAL,
+          revision INTEGER NOT NULL DEFAULT 0,
+          created_at REAL NOT NULL
+        )
+        """
+      )
+      self._connection.execute(
+        "CREATE INDEX IF NOT EXISTS analysis_jobs_runnable"
+        " ON analysis_jobs (status, rank, created_at)"
+      )
+      self._connection.execute(
+        "CREATE INDEX IF NOT EXISTS analysis_jobs_source ON analysis_jobs (source, version)"
+      )
+
+  @contextmanager
+  def _transaction(self) -> Iterator[sqlite3.Connection]:
+    with self._lock:
+      self._connection.execute("BEGIN IMMEDIATE")
+      try:
+        yield self._connection
+      except BaseException:
+        self._connection.execute("ROLLBACK")
+        raise
+      self._connection.execute("COMMIT")
+    with self._changed:
+      self._changed.notify_all()
+
+  _COLUMNS = "job_id, request, version, status, attempts, error, revision"
+
+  @staticmethod
+  def _job(row: tuple) -> Job:
+    job_id, request, version, status, attempts, error, revision = row
+    return Job(
+      job_id=job_id,
+      request=messages.AnalyzeTrackRequest.FromString(request),
+      version=version,
+      status=JobStatus(status),
+      attempts=attempts,
+      error=error,
+      revision=revision,
+    )
+
+  def submit(
+    self,
+    request: messages.AnalyzeTrackRequest,
+    version: str,
+    *,
+    result_stored: bool = False,
+  ) -> Job:
+    rank = _rank(request.priority)
+    with self._transaction() as db:
+      row = db.execute(
+        f"SELECT {self._COLUMNS}, rank FROM analysis_jobs"
+        " WHERE source = ? AND version = ? AND status IN (?, ?, ?)"
+        " ORDER BY created_at DESC LIMIT 1",
+        (request.audio_url, version, *map(int, _ACTIVE)),
+      ).fetchone()
+      if row is not None:
+        existing = self._job(row[:-1])
+        if existing.status == JobStatus.SUCCEEDED and not result_stored:
+          # The result was evicted or lost since the job finished, or does
+          # not cover this request; run the job again for this request.
+          db.execute(
+            "UPDATE analysis_jobs SET request = ?, status = ?, rank = ?, attempts = 0, error = '',"
+            " worker = NULL, lease_expires = NULL, revision = revision + 1 WHERE job_id = ?",
+            (request.SerializeToString(), int(JobStatus.QUEUED), rank, existing.job_id),
+          )
+          return replace(
+            existing,
+            request=request,
+            status=JobStatus.QUEUED,
+            attempts=0,
+            error="",
+            revision=existing.revision + 1,
+          )
+        if existing.status == JobStatus.QUEUED and result_stored:
+          db.execute(
+            "UPDATE analysis_jobs SET status = ?, revision = revision + 1 WHERE job_id = ?",
+            (int(JobStatus.SUCCEEDED), existing.job_id),
+          )
+          return replace(existing, status=JobStatus.SUCCEEDED, revision=existing.revision + 1)
+        if existing.status == JobStatus.QUEUED and rank < row[-1]:
+          # An interactive submit promotes a queued background job.
+          db.execute(
+            "UPDATE analysis_jobs SET rank = ?, revision = revision + 1 WHERE job_id = ?",
+            (rank, existing.job_id),
+          )
+        return existing
+
+      job_id = uuid.uuid4().hex
+      status = JobStatus.SUCCEEDED if result_stored else JobStatus.QUEUED
+      db.execute(
+        "INSERT INTO analysis_jobs (job_id, source, version, request, rank, status, created_at)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+          job_id,
+          request.audio_url,
+          version,
+          request.SerializeToString(),
+          rank,
+          int(status),
+          time.time(),
+        ),
+      )
+    return Job(job_id=job_id, request=request, version=version, status=status)
+
+  def get(self, job_id: str) -> Optional[Job]:
+    with self._lock:
+      row = self._connection.execute(
+        f"SELECT {self._COLUMNS} FROM analysis_jobs WHERE job_id = ?",
+        (job_id,),
+      ).fetchone()
+    return None if row is None else self._job(row)
+
+  def claim(self, worker_id: str, *, lease_seconds: float) -> Optional[Job]:
+    now = time.time()
+    with self._transaction() as db:
+      db.execute(
+        "UPDATE analysis_jobs SET status = ?, error = ?, revision = revision + 1"
+        " WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+        (
+          int(JobStatus.FAILED),
+          "worker lease expired on every attempt",
+          int(JobStatus.RUNNING),
+          now,
+          self._max_attempts,
+        ),
+      )
+      row = db.execute(
+        f"SELECT {self._COLUMNS} FROM analysis_jobs"
+        " WHERE status = ? OR (status = ? AND lease_expires < ?)"
+        " ORDER BY rank, created_at LIMIT 1",
+        (int(JobStatus.QUEUED), int(JobStatus.RUNNING), now),
+      ).fetchone()
+      if row is None:
+        return None
+      db.execute(
+        "UPDATE analysis_jobs SET status = ?, worker = ?, lease_expires = ?,"
+        " attempts = attempts + 1, revision = revision + 1 WHERE job_id = ?",
+        (int(JobStatus.RUNNING), worker_id, now + lease_seconds, row[0]),
+      )
+    job = self._job(row)
+    return Job(
+      job_id=job.job_id,
+      request=job.request,
+      version=job.version,
+      status=JobStatus.RUNNING,
+      attempts=job.attempts + 1,
+      error=job.error,
+      revision=job.revision + 1,
+    )
+
+  # Only the worker holding the job may finish it. Once its lease expires and
+  # another worker claims the job, the late worker's outcome is discarded.
+  _HELD_BY = "job_id = ? AND worker = ? AND status = ?"
+
+  def complete(self, job_id: str, worker_id: str) -> bool:
+    with self._transaction() as db:
+      updated = db.execute(
+        "UPDATE analysis_jobs SET status = ?, error = '', lease_expires = NULL,"
+        f" revision = revision + 1 WHERE {self._HELD_BY}",
+        (int(JobStatus.SUCCEEDED), job_id, worker_id, int(JobStatus.RUNNING)),
+      ).rowcount
+    return updated == 1
+
+  def fail(self, job_id: str, worker_id: str, error: str) -> Optional[Job]:
+    with self._transaction() as db:
+      updated = db.execute(
+        "UPDATE analysis_jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+        f" error = ?, lease_expires = NULL, revision = revision + 1 WHERE {self._HELD_BY}",
+        (
+          self._max_attempts,
+          int(JobStatus.FAILED),
+          int(JobStatus.QUEUED),
+          error,
+          job_id,
+          worker_id,
+          int(JobStatus.RUNNING),
+        ),
+      ).rowcount
+      if updated != 1:
+        return None
+      row = db.execute(
+        f"SELECT {self._COLUMNS} FROM analysis_jobs WHERE job_id = ?",
+        (job_id,),
+      ).fetchone()
+    return self._job(row)
+
+  def wait_for_update(self, job_id: str, revision: int, *, timeout: float) -> Optional[Job]:
+    # Writers in this process wake waiters immediately; changes made by other
+    # processes are picked up by polling.
+    deadline = time.monotonic() + timeout
+    while True:
+      job = self.get(job_id)
+      remaining = deadline - time.monotonic()
+      if job is None or job.revision != revision or remaining <= 0:
+        return job
+      with self._changed:
+        self._changed.wait(min(remaining, self._poll_interval))
+
+  def close(self) -> None:
+    with self._lock:
+      self._connection.close()
+
+
+class AnalysisWorker:
+  """Pulls jobs from a :class:`JobQueue` and analyses them into the result store."""
+
+  def __init__(
+    self,
+    service: "AudioAnalysisService",
+    queue: JobQueue,
+    *,
+    worker_id: Optional[str] = None,
+    lease_seconds: float = 600.0,
+    poll_interval: float = 1.0,
+  ) -> None:
+    if service.result_store is None:
+      raise ValueError("AnalysisWorker needs a service with a result_store")
+    self._service = service
+    self._queue = queue
+    self._worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    self._lease_seconds = lease_seconds
+    self._poll_interval = poll_interval
+    self._stop = threading.Event()
+    self._threads: List[threading.Thread] = []
+
+  def run_once(self) -> bool:
+    """Process one job; return ``False`` when there was nothing to claim."""
+    job = self._queue.claim(self._worker_id, lease_seconds=self._lease_seconds)
+    if job is None:
+      return False
+    try:
+      self._service.AnalyzeTrack(job.request)  # noqa: N802
+    except Exception as exc:  # noqa: BLE001 - failures are recorded on the job
+      updated = self._queue.fail(job.job_id, self._worker_id, f"{type(exc).__name__}: {exc}")
+      if updated is None:
+        LOGGER.warning("Analysis job %s failed after its lease was lost: %s", job.job_id, exc)
+      else:
+        LOGGER.warning(
+          "Analysis job %s failed (attempt %d, now %s): %s",
+          job.job_id,
+          updated.attempts,
+          updated.status.name,
+          exc,
+        )
+    else:
+      if not self._queue.complete(job.job_id, self._worker_id):
+        LOGGER.warning("Analysis job %s finished after its lease was lost to another worker", job.job_id)
+    return True
+
+  def run(self) -> None:
+    """Process jobs until :meth:`stop` is called."""
+    inherit_native_limits()
+    while not self._stop.is_set():
+      if not self.run_once():
+        self._stop.wait(self._poll_interval)
+
+  def start(self, threads: int = 1) -> None:
+    for index in range(threads):
+      thread = threading.Thread(target=self.run, name=f"audio-job-worker-{index}", daemon=True)
+      thread.start()
+      self._threads.append(thread)
+
+  def stop(self, timeout: Optional[float] = None) -> None:
+    """Stop claiming jobs and wait for in-flight ones to finish."""
+    self._stop.set()
+    for thread in self._threads:
+      thread.join(timeout)
+    self._threads.clear()
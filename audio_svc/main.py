@@ -1,6 +1,448 @@
-def main():
-    print("Hello from audio-svc!")
+"""Command-line entry points for audio-svc.
+
+``python -m audio_svc.main precompute MANIFEST --store results.sqlite3``
+pre-analyses a known catalog before traffic hits. The manifest lists one URL
+or local file per line (blank lines and ``#`` comments are ignored). Results
+land in the same result store the gRPC service reads, and every finished
+track is checkpointed so a killed run resumes where it stopped. With
+``--artifacts DIR`` intermediate stage outputs are kept too, so re-analysing
+the catalog after a release only recomputes the stages that changed.
+
+``python -m audio_svc.main worker --queue jobs.sqlite3 --store results.sqlite3``
+runs analysis workers for jobs submitted through ``SubmitAnalysis``. With
+``--fingerprints DIR`` they keep an acoustic fingerprint index there and
+answer re-uploads of already analysed recordings from the result store.
+
+``python -m audio_svc.main serve --port 50051`` runs the gRPC service with
+the CPU budget applied to its native thread pools. ``--store``, ``--queue``,
+``--artifacts`` and ``--fingerprints`` enable the same features as for
+``worker``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent import futures
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, TextIO, Tuple, Union
+
+from .artifact_cache import DirectoryArtifactCache
+from .cpu_budget import BudgetMode, CpuBudget, limit_native_threads
+from .fingerprint import FingerprintIndex
+from .jobs import AnalysisWorker, SqliteJobQueue
+from .proto import audio_analysis_pb2 as messages
+from .result_store import ResultStore, SqliteResultStore
+from .scheduling import AnalysisScheduler
+from .server import ANALYSIS_VERSION, AudioAnalysisService, build_grpc_server
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class TrackOutcome:
+  source: str
+  response: Optional[messages.AnalyzeTrackResponse]
+  audio_seconds: float = 0.0
+  cpu_seconds: float = 0.0
+  error: Optional[str] = None
+
+
+@dataclass(slots=True)
+class CatalogReport:
+  analysed: int = 0
+  skipped: int = 0
+  failed: int = 0
+  wall_seconds: float = 0.0
+  audio_seconds: float = 0.0
+  cpu_seconds: float = 0.0
+
+  @property
+  def tracks_per_minute(self) -> float:
+    return self.analysed / (self.wall_seconds / 60.0) if self.wall_seconds > 0 else 0.0
+
+  @property
+  def audio_seconds_per_cpu_second(self) -> float:
+    return self.audio_seconds / self.cpu_seconds if self.cpu_seconds > 0 else 0.0
+
+
+def read_manifest(lines: Iterable[str]) -> List[str]:
+  """Return de-duplicated sources; local paths are normalised to file:// URIs."""
+  sources: List[str] = []
+  seen: Set[str] = set()
+  for raw in lines:
+    entry = raw.strip()
+    if not entry or entry.startswith("#"):
+      continue
+    if "://" not in entry:
+      entry = Path(entry).expanduser().resolve().as_uri()
+    if entry not in seen:
+      seen.add(entry)
+      sources.append(entry)
+  return sources
+
+
+class CatalogProgress:
+  """Append-only JSON-lines checkpoint of processed manifest entries.
+
+  Entries are keyed by source and ``ANALYSIS_VERSION``, so a checkpoint
+  written before a release does not skip tracks the release must re-analyse.
+  """
+
+  def __init__(self, path: Union[str, Path]) -> None:
+    self._path = Path(path)
+    self.completed: Set[Tuple[str, str]] = set()
+    if self._path.exists():
+      with self._path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+          try:
+            record = json.loads(line)
+          except json.JSONDecodeError:
+            # A run killed mid-write leaves a truncated final line.
+            continue
+          if record.get("status") == "done" and "version" in record:
+            self.completed.add((record["source"], record["version"]))
+    self._handle: TextIO = self._path.open("a", encoding="utf-8")
+
+  def record(self, outcome: TrackOutcome) -> None:
+    entry = {
+      "source": outcome.source,
+      "version": ANALYSIS_VERSION,
+      "status": "failed" if outcome.error else "done",
+      "audio_sec": round(outcome.audio_seconds, 3),
+      "cpu_sec": round(outcome.cpu_seconds, 3),
+    }
+    if outcome.error:
+      entry["error"] = outcome.error
+    else:
+      self.completed.add((outcome.source, ANALYSIS_VERSION))
+    self._handle.write(json.dumps(entry) + "\n")
+    self._handle.flush()
+    os.fsync(self._handle.fileno())
+
+  def close(self) -> None:
+    self._handle.close()
+
+
+class _CatalogWorker:
+  """Per-process analyser that meters analysed audio duration and CPU time."""
+
+  def __init__(self, artifact_dir: Optional[str] = None, stage_workers: int = 1) -> None:
+    self._service = AudioAnalysisService(
+      stage_workers=stage_workers,
+      artifact_cache=None if artifact_dir is None else DirectoryArtifactCache(artifact_dir),
+    )
+
+  def analyse(self, source: str) -> TrackOutcome:
+    cpu_start = time.process_time()
+    try:
+      response = self._service.AnalyzeTrack(messages.AnalyzeTrackRequest(audio_url=source))
+    except Exception as exc:  # noqa: BLE001 - one bad track must not abort the run
+      return TrackOutcome(
+        source=source,
+        response=None,
+        cpu_seconds=time.process_time() - cpu_start,
+        error=f"{type(exc).__name__}: {exc}",
+      )
+    return TrackOutcome(
+      source=source,
+      response=response,
+      # Sections partition the whole track, so the last one ends at its duration.
+      audio_seconds=response.sections[-1].end_sec if response.sections else 0.0,
+      cpu_seconds=time.process_time() - cpu_start,
+    )
+
+
+_WORKER: Optional[_CatalogWorker] = None
+
+
+def _init_worker(artifact_dir: Optional[str], native_threads: int) -> None:
+  global _WORKER
+  limit_native_threads(native_threads)
+  _WORKER = _CatalogWorker(artifact_dir, stage_workers=native_threads)
+
+
+def _analyse_in_worker(source: str) -> TrackOutcome:
+  assert _WORKER is not None, "worker process was not initialised"
+  return _WORKER.analyse(source)
+
+
+def _run_pool(
+  sources: Sequence[str],
+  workers: int,
+  artifact_dir: Optional[str],
+  native_threads: int,
+) -> Iterator[TrackOutcome]:
+  if workers <= 1:
+    worker = _CatalogWorker(artifact_dir, stage_workers=native_threads)
+    for source in sources:
+      yield worker.analyse(source)
+    return
+
+  context = multiprocessing.get_context("spawn")
+  with futures.ProcessPoolExecutor(
+    max_workers=workers,
+    mp_context=context,
+    initializer=_init_worker,
+    initargs=(artifact_dir, native_threads),
+  ) as executor:
+    pending: Set[futures.Future[TrackOutcome]] = set()
+    queue = iter(sources)
+    # Keep the pool busy without materialising a future per manifest entry.
+    for source in queue:
+      pending.add(executor.submit(_analyse_in_worker, source))
+      if len(pending) >= workers * 2:
+        break
+    while pending:
+      done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+      for future in done:
+        yield future.result()
+        next_source = next(queue, None)
+        if next_source is not None:
+          pending.add(executor.submit(_analyse_in_worker, next_source))
+
+
+def precompute_catalog(
+  sources: Sequence[str],
+  store: ResultStore,
+  progress: CatalogProgress,
+  *,
+  workers: int = 1,
+  artifact_dir: Optional[Union[str, Path]] = None,
+  cpu_budget: Optional[CpuBudget] = None,
+) -> CatalogReport:
+  """Analyse every source not yet checkpointed or stored, writing results to ``store``.
+
+  ``artifact_dir`` enables the stage artifact cache shared by all workers.
+  The ``cpu_budget`` (detected when not given) is split evenly between the
+  workers, each of which caps its native thread pools and stage workers at
+  its share. With ``workers=1`` the analysis runs in this process, whose
+  native thread pools are only capped if the caller applied the budget.
+  """
+  report = CatalogReport()
+  todo: List[str] = []
+  for source in sources:
+    if (source, ANALYSIS_VERSION) in progress.completed or store.get(source, ANALYSIS_VERSION) is not None:
+      report.skipped += 1
+    else:
+      todo.append(source)
+
+  started = time.perf_counter()
+  artifacts = None if artifact_dir is None else str(artifact_dir)
+  native_threads = (cpu_budget or CpuBudget.detect()).threads_per_request(workers)
+  outcomes = _run_pool(todo, workers, artifacts, native_threads)
+  for index, outcome in enumerate(outcomes, start=1):
+    if outcome.response is not None:
+      store.put(outcome.source, ANALYSIS_VERSION, outcome.response)
+      report.analysed += 1
+      report.audio_seconds += outcome.audio_seconds
+      report.cpu_seconds += outcome.cpu_seconds
+      LOGGER.info("[%d/%d] analysed %s", index, len(todo), outcome.source)
+    else:
+      report.failed += 1
+      LOGGER.warning("[%d/%d] failed %s: %s", index, len(todo), outcome.source, outcome.error)
+    progress.record(outcome)
+  report.wall_seconds = time.perf_counter() - started
+  return report
+
+
+def _format_report(report: CatalogReport) -> str:
+  return "\n".join(
+    (
+      f"analysed: {report.analysed}  skipped: {report.skipped}  failed: {report.failed}",
+      f"wall time: {report.wall_seconds:.1f}s",
+      f"throughput: {report.tracks_per_minute:.2f} tracks/min",
+      f"efficiency: {report.audio_seconds_per_cpu_second:.2f} audio-seconds per CPU-second",
+    )
+  )
+
+
+def _precompute_command(args: argparse.Namespace) -> int:
+  with open(args.manifest, "r", encoding="utf-8") as handle:
+    sources = read_manifest(handle)
+
+  budget = CpuBudget.detect(args.cpu_mode)
+  workers = args.workers or budget.request_concurrency
+  budget.apply(workers)
+  store = SqliteResultStore(args.store)
+  progress = CatalogProgress(args.checkpoint or f"{args.store}.progress.jsonl")
+  try:
+    report = precompute_catalog(
+      sources,
+      store,
+      progress,
+      workers=workers,
+      artifact_dir=args.artifacts,
+      cpu_budget=budget,
+    )
+  except KeyboardInterrupt:
+    LOGGER.warning("Interrupted; rerun the same command to resume.")
+    return 130
+  finally:
+    progress.close()
+    store.close()
+
+  print(_format_report(report))
+  return 1 if report.failed else 0
+
+
+def _worker_command(args: argparse.Namespace) -> int:
+  budget = CpuBudget.detect(args.cpu_mode)
+  concurrency = args.concurrency or budget.request_concurrency
+  budget.apply(concurrency)
+  store = SqliteResultStore(args.store)
+  queue = SqliteJobQueue(args.queue)
+  fingerprints = None if args.fingerprints is None else FingerprintIndex(args.fingerprints)
+  service = AudioAnalysisService(
+    result_store=store,
+    stage_workers=budget.threads_per_request(concurrency),
+    artifact_cache=None if args.artifacts is None else DirectoryArtifactCache(args.artifacts),
+    fingerprint_index=fingerprints,
+  )
+  worker = AnalysisWorker(service, queue)
+  worker.start(threads=concurrency)
+  LOGGER.info("Processing analysis jobs from %s with %d threads", args.queue, concurrency)
+  try:
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    LOGGER.warning("Stopping; waiting for in-flight jobs to finish.")
+  finally:
+    worker.stop()
+    if fingerprints is not None:
+      fingerprints.compact()
+    queue.close()
+    store.close()
+  return 0
+
+
+def _serve_command(args: argparse.Namespace) -> int:
+  budget = CpuBudget.detect(args.cpu_mode)
+  concurrency = args.concurrency or budget.request_concurrency
+  store = None if args.store is None else SqliteResultStore(args.store)
+  queue = None if args.queue is None else SqliteJobQueue(args.queue)
+  fingerprints = None if args.fingerprints is None else FingerprintIndex(args.fingerprints)
+  service = AudioAnalysisService(
+    scheduler=AnalysisScheduler(capacity=concurrency),
+    result_store=store,
+    stage_workers=budget.threads_per_request(concurrency),
+    artifact_cache=None if args.artifacts is None else DirectoryArtifactCache(args.artifacts),
+    job_queue=queue,
+    fingerprint_index=fingerprints,
+  )
+  server = build_grpc_server(
+    service,
+    max_workers=concurrency,
+    port=args.port,
+    cpu_budget=budget,
+    apply_cpu_budget=True,
+  )
+  server.start()
+  LOGGER.info("Serving audio analysis on port %d with %d concurrent analyses", args.port, concurrency)
+  try:
+    server.wait_for_termination()
+  except KeyboardInterrupt:
+    LOGGER.warning("Stopping; waiting for in-flight calls to finish.")
+    server.stop(grace=30).wait()
+  finally:
+    if fingerprints is not None:
+      fingerprints.compact()
+    if queue is not None:
+      queue.close()
+    if store is not None:
+      store.close()
+  return 0
+
+
+def _add_cpu_mode_argument(parser: argparse.ArgumentParser) -> None:
+  parser.add_argument(
+    "--cpu-mode",
+    choices=[mode.value for mode in BudgetMode],
+    default=BudgetMode.THROUGHPUT.value,
+    help="throughput: one analysis per core, each single-threaded; "
+    "latency: one analysis at a time using every core (default: throughput)",
+  )
+
+
+def _build_parser() -> argparse.ArgumentParser:
+  parser = argparse.ArgumentParser(prog="audio_svc", description=__doc__.splitlines()[0])
+  subcommands = parser.add_subparsers(dest="command", required=True)
+
+  precompute = subcommands.add_parser(
+    "precompute",
+    help="pre-analyse a catalog manifest into the result store",
+  )
+  precompute.add_argument("manifest", help="file listing one audio URL or local path per line")
+  precompute.add_argument("--store", required=True, help="SQLite result store path")
+  precompute.add_argument(
+    "--workers",
+    type=int,
+    help="analysis worker processes (default: from the CPU budget; 1 runs in-process)",
+  )
+  precompute.add_argument(
+    "--checkpoint",
+    help="progress checkpoint path (default: <store>.progress.jsonl)",
+  )
+  precompute.add_argument(
+    "--artifacts",
+    help="directory caching intermediate stage outputs across runs and releases",
+  )
+  _add_cpu_mode_argument(precompute)
+  precompute.set_defaults(handler=_precompute_command)
+
+  worker = subcommands.add_parser(
+    "worker",
+    help="run analysis workers for jobs submitted via SubmitAnalysis",
+  )
+  worker.add_argument("--queue", required=True, help="SQLite job queue path")
+  worker.add_argument("--store", required=True, help="SQLite result store path")
+  worker.add_argument(
+    "--concurrency",
+    type=int,
+    help="jobs analysed at the same time (default: from the CPU budget)",
+  )
+  worker.add_argument("--artifacts", help="directory caching intermediate stage outputs")
+  worker.add_argument(
+    "--fingerprints",
+    help="directory holding the acoustic fingerprint index used to reuse duplicate analyses",
+  )
+  _add_cpu_mode_argument(worker)
+  worker.set_defaults(handler=_worker_command)
+
+  serve = subcommands.add_parser(
+    "serve",
+    help="run the gRPC analysis service with the CPU budget applied",
+  )
+  serve.add_argument("--port", type=int, default=50051, help="port to listen on (default: 50051)")
+  serve.add_argument(
+    "--concurrency",
+    type=int,
+    help="analyses run at the same time (default: from the CPU budget)",
+  )
+  serve.add_argument("--store", help="SQLite result store path")
+  serve.add_argument("--queue", help="SQLite job queue path; enables the job RPCs (needs --store)")
+  serve.add_argument("--artifacts", help="directory caching intermediate stage outputs")
+  serve.add_argument(
+    "--fingerprints",
+    help="directory holding the acoustic fingerprint index (needs --store)",
+  )
+  _add_cpu_mode_argument(serve)
+  serve.set_defaults(handler=_serve_command)
+  return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+  logging.basicConfig(level=logging.INFO, format="%(message)s")
+  args = _build_parser().parse_args(argv)
+  return args.handler(args)
 
 
 if __name__ == "__main__":
-    main()
+  sys.exit(main())
@@ -0,0 +1,194 @@
+"""Dependency graph of analysis stages.
+
+Each stage names the artifacts it consumes and produces one artifact under
+its own name. The graph runs stages in dependency order, either one after
+another on the calling thread or, given an executor, with every stage whose
+inputs are ready running concurrently. The heavy stages are NumPy/FFT, BLAS
+and resampling work that releases the GIL, so a thread pool lets e.g. the
+chroma CQT overlap onset detection and beat tracking on a multi-core host.
+
+Given an :class:`~audio_svc.artifact_cache.ArtifactCache`, the graph also
+memoizes stage outputs. Every stage declares a version; its cache key hashes
+its name, version and the keys of its inputs, down to content keys supplied
+for the sources. Only the stages needed for the requested outputs whose keys
+are not yet cached run, so bumping one stage's version recomputes that stage
+and its dependents while everything upstream is read back from the cache.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from concurrent import futures
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Set
+
+from .artifact_cache import ArtifactCache, content_key
+
+
+LOGGER = logging.getLogger(__name__)
+
+StageObserver = Callable[[str, float], None]
+
+
+@dataclass(frozen=True, slots=True)
+class Stage:
+  name: str
+  inputs: tuple[str, ...]
+  compute: Callable[..., Any]
+  # Bump when a change to ``compute`` alters its output.
+  version: str = "1"
+  # Large or trivially cheap artifacts (decoded audio, spectrograms) are
+  # recomputed on demand rather than written to the artifact cache.
+  persist: bool = True
+
+
+class StageGraph:
+  """Validated, topologically ordered set of :class:`Stage` definitions."""
+
+  def __init__(self, stages: Sequence[Stage], *, sources: Sequence[str] = ()) -> None:
+    by_name: Dict[str, Stage] = {}
+    for stage in stages:
+      if stage.name in by_name or stage.name in sources:
+        raise ValueError(f"duplicate stage or source name: {stage.name}")
+      by_name[stage.name] = stage
+
+    ordered: List[Stage] = []
+    resolved: Set[str] = set(sources)
+    pending = list(stages)
+    while pending:
+      ready = [stage for stage in pending if set(stage.inputs) <= resolved]
+      if not ready:
+        unresolved = {name for stage in pending for name in stage.inputs} - resolved
+        raise ValueError(f"stage inputs cannot be resolved: {sorted(unresolved)}")
+      for stage in ready:
+        ordered.append(stage)
+        resolved.add(stage.name)
+        pending.remove(stage)
+
+    self._sources = tuple(sources)
+    self._stages = tuple(ordered)
+    self._by_name = by_name
+    consumed = {name for stage in stages for name in stage.inputs}
+    self._sinks = tuple(stage.name for stage in ordered if stage.name not in consumed)
+
+  @property
+  def stages(self) -> tuple[Stage, ...]:
+    return self._stages
+
+  def keys(self, source_keys: Mapping[str, str]) -> Dict[str, Optional[str]]:
+    """Cache key of every source and stage; ``None`` where a source has no key."""
+    keys: Dict[str, Optional[str]] = {name: source_keys.get(name) for name in self._sources}
+    for stage in self._stages:
+      input_keys = [keys[name] for name in stage.inputs]
+      keys[stage.name] = (
+        None
+        if any(key is None for key in input_keys)
+        else content_key(stage.name, stage.version, *input_keys)  # type: ignore[arg-type]
+      )
+    return keys
+
+  def run(
+    self,
+    sources: Mapping[str, Any],
+    *,
+    executor: Optional[futures.Executor] = None,
+    checkpoint: Callable[[], None] = lambda: None,
+    observer: Optional[StageObserver] = None,
+    outputs: Optional[Sequence[str]] = None,
+    cache: Optional[ArtifactCache] = None,
+    source_keys: Optional[Mapping[str, str]] = None,
+  ) -> Dict[str, Any]:
+    """Compute ``outputs`` (default: every final stage); return the artifacts used.
+
+    ``checkpoint`` is called on the calling thread after a stage finishes,
+    when no other stage is in flight and at least one is still to run, which
+    is where a scheduler may pause the request between stages without its
+    executor threads still using CPU.
+    ``observer`` receives each computed stage's name and wall time; stages are
+    only timed when one is given. With a ``cache``, persisted stages whose key
+    is derivable from ``source_keys`` are read from and written to it.
+    """
+    missing = set(self._sources) - set(sources)
+    if missing:
+      raise ValueError(f"missing pipeline sources: {sorted(missing)}")
+    unknown = set(outputs or ()) - set(self._by_name)
+    if unknown:
+      raise ValueError(f"unknown pipeline outputs: {sorted(unknown)}")
+    artifacts: Dict[str, Any] = dict(sources)
+    keys = self.keys(source_keys or {}) if cache is not None else {}
+    todo = self._plan(
+      artifacts,
+      outputs if outputs is not None else self._sinks,
+      cache,
+      keys,
+    )
+
+    def compute(stage: Stage, *args: Any) -> Any:
+      if observer is None:
+        value = stage.compute(*args)
+      else:
+        started = time.perf_counter()
+        try:
+          value = stage.compute(*args)
+        finally:
+          observer(stage.name, time.perf_counter() - started)
+      key = keys.get(stage.name)
+      if cache is not None and stage.persist and key is not None:
+        try:
+          cache.put(key, value)
+        except OSError:
+          LOGGER.warning("Could not cache artifact %s", stage.name, exc_info=True)
+      return value
+
+    if executor is None:
+      for position, stage in enumerate(todo, start=1):
+        artifacts[stage.name] = compute(stage, *(artifacts[name] for name in stage.inputs))
+        if position < len(todo):
+          checkpoint()
+      return artifacts
+
+    waiting = list(todo)
+    running: Dict[futures.Future[Any], Stage] = {}
+    try:
+      while waiting or running:
+        for stage in [stage for stage in waiting if all(name in artifacts for name in stage.inputs)]:
+          waiting.remove(stage)
+          args = [artifacts[name] for name in stage.inputs]
+          running[executor.submit(compute, stage, *args)] = stage
+        done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+        for future in done:
+          stage = running.pop(future)
+          artifacts[stage.name] = future.result()
+        if waiting and not running:
+          checkpoint()
+    finally:
+      for future in running:
+        future.cancel()
+    return artifacts
+
+  def _plan(
+    self,
+    artifacts: Dict[str, Any],
+    outputs: Sequence[str],
+    cache: Optional[ArtifactCache],
+    keys: Mapping[str, Optional[str]],
+  ) -> List[Stage]:
+    """Load cached artifacts into ``artifacts``; return the stages left to run."""
+    required: Set[str] = set()
+    pending = list(outputs)
+    while pending:
+      name = pending.pop()
+      if name in artifacts or name in required:
+        continue
+      stage = self._by_name[name]
+      key = keys.get(name)
+      if cache is not None and stage.persist and key is not None:
+        try:
+          artifacts[name] = cache.get(key)
+          continue
+        except KeyError:
+          pass
+      required.add(name)
+      pending.extend(stage.inputs)
+    return [stage for stage in self._stages if stage.name in required]
@@ -0,0 +1,157 @@
+"""Opt-in profiling of individual analysis requests.
+
+A request is captured when its caller asks for it (``x-analysis-profile``
+metadata) or when it is picked by the server-side sampling rate. A capture
+records a cProfile dump, per-stage wall times and the peak memory traced by
+``tracemalloc`` while the request ran, and writes them to a bounded directory
+tagged with the request's ``session_id``. Services without a profiler pay
+nothing; services with one only pay for the requests they capture.
+
+Before Python 3.12 cProfile only sees the thread it was enabled on. From 3.12
+it is built on the interpreter-wide ``sys.monitoring``, so a capture also
+includes whatever other requests ran while it was active. The summary
+records which applies in ``profiled_threads``.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+
+LOGGER = logging.getLogger(__name__)
+
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+# Stems written by _write(); pruning leaves any other file alone.
+_CAPTURE_STEM = re.compile(r"\d{8}T\d{6}-\d{9}-[A-Za-z0-9_.-]{0,64}")
+
+# cProfile hooks every thread of the interpreter from Python 3.12 on.
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class ProfileCapture:
+  """Collects profile data for one request; written out by :meth:`finish`."""
+
+  def __init__(self, profiler: "RequestProfiler", session_id: str) -> None:
+    self._profiler = profiler
+    self.session_id = session_id
+    self.stage_seconds: Dict[str, float] = {}
+    self._profile = cProfile.Profile()
+    self._started_tracing = False
+    self._wall_start = 0.0
+    self._cpu_start = 0.0
+    self._memory_baseline = 0
+
+  def start(self) -> None:
+    if not tracemalloc.is_tracing():
+      tracemalloc.start()
+      self._started_tracing = True
+    tracemalloc.reset_peak()
+    self._memory_baseline = tracemalloc.get_traced_memory()[0]
+    self._wall_start = time.perf_counter()
+    self._cpu_start = time.process_time()
+    self._profile.enable()
+
+  def record_stage(self, name: str, seconds: float) -> None:
+    self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+
+  def finish(self, *, error: Optional[BaseException] = None) -> Path:
+    self._profile.disable()
+    wall = time.perf_counter() - self._wall_start
+    cpu = time.process_time() - self._cpu_start
+    peak = tracemalloc.get_traced_memory()[1]
+    if self._started_tracing:
+      tracemalloc.stop()
+    try:
+      return self._profiler._write(
+        self,
+        summary={
+          "session_id": self.session_id,
+          "captured_at": time.time(),
+          "wall_seconds": round(wall, 6),
+          "cpu_seconds": round(cpu, 6),
+          "peak_traced_memory_bytes": max(0, peak - self._memory_baseline),
+          "profiled_threads": "all" if PROFILES_ALL_THREADS else "request",
+          "stage_seconds": {name: round(value, 6) for name, value in self.stage_seconds.items()},
+          "error": None if error is None else f"{type(error).__name__}: {error}",
+        },
+        profile=self._profile,
+      )
+    finally:
+      self._profiler._release()
+
+
+class RequestProfiler:
+  """Decides which requests to profile and owns the bounded capture directory.
+
+  cProfile and tracemalloc are process-wide, so at most one capture runs at a
+  time; requests arriving while a capture is active run unprofiled.
+  """
+
+  def __init__(
+    self,
+    directory: Union[str, Path],
+    *,
+    sample_rate: float = 0.0,
+    max_captures: int = 50,
+  ) -> None:
+    if not 0.0 <= sample_rate <= 1.0:
+      raise ValueError("sample_rate must be between 0.0 and 1.0")
+    if max_captures < 1:
+      raise ValueError("max_captures must be at least 1")
+    self._directory = Path(directory)
+    self._directory.mkdir(parents=True, exist_ok=True)
+    self._sample_rate = sample_rate
+    self._max_captures = max_captures
+    self._active = threading.Lock()
+
+  @property
+  def directory(self) -> Path:
+    return self._directory
+
+  def begin(self, session_id: Optional[str], *, requested: bool = False) -> Optional[ProfileCapture]:
+    """Start a capture if requested or sampled, else return ``None``."""
+    if not requested and (self._sample_rate == 0.0 or random.random() >= self._sample_rate):
+      return None
+    if not self._active.acquire(blocking=False):
+      LOGGER.info("Skipping profile capture; another capture is in progress")
+      return None
+    capture = ProfileCapture(self, session_id or "anonymous")
+    try:
+      capture.start()
+    except BaseException:
+      self._active.release()
+      raise
+    return capture
+
+  def _release(self) -> None:
+    self._active.release()
+
+  def _write(self, capture: ProfileCapture, *, summary: dict, profile: cProfile.Profile) -> Path:
+    session = _UNSAFE_FILENAME_CHARS.sub("_", capture.session_id)[:64]
+    now_ns = time.time_ns()
+    timestamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now_ns // 1_000_000_000))
+    stem = f"{timestamp}-{now_ns % 1_000_000_000:09d}-{session}"
+    summary_path = self._directory / f"{stem}.json"
+    profile.dump_stats(str(self._directory / f"{stem}.pstats"))
+    summary_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    self._prune()
+    LOGGER.info("Wrote profile capture", extra={"path": str(summary_path)})
+    return summary_path
+
+  def _prune(self) -> None:
+    stems: List[str] = sorted(
+      path.stem for path in self._directory.glob("*.json") if _CAPTURE_STEM.fullmatch(path.stem)
+    )
+    for stem in stems[: max(0, len(stems) - self._max_captures)]:
+      for suffix in (".json", ".pstats"):
+        (self._directory / f"{stem}{suffix}").unlink(missing_ok=True)
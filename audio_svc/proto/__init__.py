@@ -1,17 +1,27 @@
 from .audio_analysis_pb2 import (
+  AnalysisJob,
+  AnalysisJobStatus,
+  AnalysisPriority,
   AnalyzeTrackRequest,
   AnalyzeTrackResponse,
   AnalysisSummary,
+  AnalysisTimeline,
   BeatPosition,
+  GetAnalysisStatusRequest,
   KeyEstimate,
   SectionBreakdown,
 )
 
 __all__ = [
+  "AnalysisJob",
+  "AnalysisJobStatus",
+  "AnalysisPriority",
   "AnalyzeTrackRequest",
   "AnalyzeTrackResponse",
   "AnalysisSummary",
+  "AnalysisTimeline",
   "BeatPosition",
+  "GetAnalysisStatusRequest",
   "KeyEstimate",
   "SectionBreakdown",
 ]
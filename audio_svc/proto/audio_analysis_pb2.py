@@ -1,15 +1,25 @@
-"""Lightweight dataclass mirrors of audio_analysis.proto structures.
-
-These placeholders unblock service scaffolding without requiring the
-google.protobuf runtime. Once `grpcio-tools` is available in the toolchain,
-replace this module with generated code.
+"""Dataclass mirrors of audio_analysis.proto structures.
+
+The mirrors avoid a hard dependency on the google.protobuf runtime while
+staying wire-compatible with it: every message declares its proto fields in
+``_wire_fields`` and inherits ``SerializeToString``/``FromString`` from
+:class:`~audio_svc.proto.wire.WireMessage`. Keep the field tables in sync with
+``proto/audio_analysis.proto`` when the contract changes;
+``tests/unit/audio_svc/test_wire.py`` checks them against protoc-generated
+classes wherever protoc and the protobuf runtime are installed. Once
+`grpcio-tools` is available in the toolchain, replace this module with
+generated code.
 """
 
 from __future__ import annotations
 
 from dataclasses import dataclass, field
 from enum import IntEnum
-from typing import List, Optional
+from typing import ClassVar, List, Optional
+
+import numpy as np
+
+from .wire import FieldSpec, Kind, WireMessage
 
 
 class BeatPosition(IntEnum):
@@ -20,38 +30,154 @@ class BeatPosition(IntEnum):
   OFF_BEAT = 2
 
 
+class AnalysisPriority(IntEnum):
+  """Scheduling class for an analysis request; unspecified means interactive."""
+
+  ANALYSIS_PRIORITY_UNSPECIFIED = 0
+  INTERACTIVE = 1
+  BACKGROUND = 2
+
+
+def _empty_doubles() -> np.ndarray:
+  return np.zeros(0, dtype=np.float64)
+
+
+def _empty_floats() -> np.ndarray:
+  return np.zeros(0, dtype=np.float32)
+
+
 @dataclass(slots=True)
-class KeyEstimate:
+class KeyEstimate(WireMessage):
   tonic: str = ""
   mode: str = ""
   confidence: float = 0.0
   chord_progression: List[str] = field(default_factory=list)
 
+  _wire_fields: ClassVar[tuple[FieldSpec, ...]] = (
+    FieldSpec(1, "tonic", Kind.STRING),
+    FieldSpec(2, "mode", Kind.STRING),
+    FieldSpec(3, "confidence", Kind.DOUBLE),
+    FieldSpec(4, "chord_progression", Kind.STRING, repeated=True),
+  )
+
 
 @dataclass(slots=True)
-class AnalysisSummary:
+class AnalysisSummary(WireMessage):
   bpm: float = 0.0
   energy: float = 0.0
   beat_position: BeatPosition = BeatPosition.BEAT_POSITION_UNSPECIFIED
   spectral_centroid: float = 0.0
   key: KeyEstimate = field(default_factory=KeyEstimate)
 
+  _wire_fields: ClassVar[tuple[FieldSpec, ...]] = (
+    FieldSpec(1, "bpm", Kind.DOUBLE),
+    FieldSpec(2, "energy", Kind.DOUBLE),
+    FieldSpec(3, "beat_position", Kind.ENUM, type=BeatPosition),
+    FieldSpec(4, "spectral_centroid", Kind.DOUBLE),
+    FieldSpec(5, "key", Kind.MESSAGE, type=KeyEstimate),
+  )
+
 
 @dataclass(slots=True)
-class SectionBreakdown:
+class SectionBreakdown(WireMessage):
   label: str = ""
   start_sec: float = 0.0
   end_sec: float = 0.0
   average_energy: float = 0.0
+  key: KeyEstimate = field(default_factory=KeyEstimate)
+
+  _wire_fields: ClassVar[tuple[FieldSpec, ...]] = (
+    FieldSpec(1, "label", Kind.STRING),
+    FieldSpec(2, "start_sec", Kind.DOUBLE),
+    FieldSpec(3, "end_sec", Kind.DOUBLE),
+    FieldSpec(4, "average_energy", Kind.DOUBLE),
+    FieldSpec(5, "key", Kind.MESSAGE, type=KeyEstimate),
+  )
+
+
+@dataclass(slots=True, eq=False)
+class AnalysisTimeline(WireMessage):
+  """Frame-level curves; arrays stay NumPy so encoding is a buffer copy."""
+
+  frame_rate_hz: float = 0.0
+  beat_times: np.ndarray = field(default_factory=_empty_doubles)
+  energy_envelope: np.ndarray = field(default_factory=_empty_floats)
+  spectral_centroid: np.ndarray = field(default_factory=_empty_floats)
+
+  _wire_fields: ClassVar[tuple[FieldSpec, ...]] = (
+    FieldSpec(1, "frame_rate_hz", Kind.DOUBLE),
+    FieldSpec(2, "beat_times", Kind.DOUBLE, repeated=True),
+    FieldSpec(3, "energy_envelope", Kind.FLOAT, repeated=True),
+    FieldSpec(4, "spectral_centroid", Kind.FLOAT, repeated=True),
+  )
+
+  def __eq__(self, other: object) -> bool:
+    if not isinstance(other, AnalysisTimeline):
+      return NotImplemented
+    return self.frame_rate_hz == other.frame_rate_hz and all(
+      np.array_equal(getattr(self, name), getattr(other, name))
+      for name in ("beat_times", "energy_envelope", "spectral_centroid")
+    )
 
 
 @dataclass(slots=True)
-class AnalyzeTrackRequest:
+class AnalyzeTrackRequest(WireMessage):
   audio_url: str = ""
   session_id: Optional[str] = None
+  priority: AnalysisPriority = AnalysisPriority.ANALYSIS_PRIORITY_UNSPECIFIED
+  include_timeline: bool = False
+
+  _wire_fields: ClassVar[tuple[FieldSpec, ...]] = (
+    FieldSpec(1, "audio_url", Kind.STRING),
+    FieldSpec(2, "session_id", Kind.STRING),
+    FieldSpec(3, "priority", Kind.ENUM, type=AnalysisPriority),
+    FieldSpec(4, "include_timeline", Kind.BOOL),
+  )
 
 
 @dataclass(slots=True)
-class AnalyzeTrackResponse:
+class AnalyzeTrackResponse(WireMessage):
   summary: AnalysisSummary = field(default_factory=AnalysisSummary)
   sections: List[SectionBreakdown] = field(default_factory=list)
+  # Only set when the request asked for it with ``include_timeline``.
+  timeline: Optional[AnalysisTimeline] = None
+
+  _wire_fields: ClassVar[tuple[FieldSpec, ...]] = (
+    FieldSpec(1, "summary", Kind.MESSAGE, type=AnalysisSummary),
+    FieldSpec(2, "sections", Kind.MESSAGE, repeated=True, type=SectionBreakdown),
+    FieldSpec(3, "timeline", Kind.MESSAGE, type=AnalysisTimeline),
+  )
+
+
+class AnalysisJobStatus(IntEnum):
+  """Lifecycle of an asynchronously submitted analysis."""
+
+  ANALYSIS_JOB_STATUS_UNSPECIFIED = 0
+  QUEUED = 1
+  RUNNING = 2
+  SUCCEEDED = 3
+  FAILED = 4
+
+
+@dataclass(slots=True)
+class AnalysisJob(WireMessage):
+  job_id: str = ""
+  status: AnalysisJobStatus = AnalysisJobStatus.ANALYSIS_JOB_STATUS_UNSPECIFIED
+  audio_url: str = ""
+  result: Optional[AnalyzeTrackResponse] = None
+  error: str = ""
+
+  _wire_fields: ClassVar[tuple[FieldSpec, ...]] = (
+    FieldSpec(1, "job_id", Kind.STRING),
+    FieldSpec(2, "status", Kind.ENUM, type=AnalysisJobStatus),
+    FieldSpec(3, "audio_url", Kind.STRING),
+    FieldSpec(4, "result", Kind.MESSAGE, type=AnalyzeTrackResponse),
+    FieldSpec(5, "error", Kind.STRING),
+  )
+
+
+@dataclass(slots=True)
+class GetAnalysisStatusRequest(WireMessage):
+  job_id: str = ""
+
+  _wire_fields: ClassVar[tuple[FieldSpec, ...]] = (FieldSpec(1, "job_id", Kind.STRING),)
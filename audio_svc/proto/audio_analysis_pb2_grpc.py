@@ -8,6 +8,13 @@ from __future__ import annotations
 
 from typing import Any
 
+from .audio_analysis_pb2 import (
+  AnalysisJob,
+  AnalyzeTrackRequest,
+  AnalyzeTrackResponse,
+  GetAnalysisStatusRequest,
+)
+
 try:
   import grpc
 except ModuleNotFoundError:  # pragma: no cover - exercised via unit tests
@@ -23,18 +30,52 @@ class AudioAnalysisServiceServicer:
   def AnalyzeTrack(self, request, context: Any | None = None):  # noqa: N802
     raise NotImplementedError("AnalyzeTrack must be implemented by subclasses.")
 
+  def SubmitAnalysis(self, request, context: Any | None = None):  # noqa: N802
+    raise NotImplementedError("SubmitAnalysis must be implemented by subclasses.")
+
+  def GetAnalysisStatus(self, request, context: Any | None = None):  # noqa: N802
+    raise NotImplementedError("GetAnalysisStatus must be implemented by subclasses.")
+
+  def WatchAnalysis(self, request, context: Any | None = None):  # noqa: N802
+    raise NotImplementedError("WatchAnalysis must be implemented by subclasses.")
+
 
 def add_AudioAnalysisServiceServicer_to_server(  # noqa: N802
   servicer: AudioAnalysisServiceServicer,
   server: Any,
 ) -> None:
-  """Register the service implementation with a grpc.Server instance."""
+  """Register the service implementation with a grpc.Server instance.
+
+  Servicers may provide ``serialize_response`` to observe response encoding;
+  otherwise the message's own ``SerializeToString`` is used.
+  """
   if grpc is None:
     raise RuntimeError("grpcio is required to register AudioAnalysisService.")
 
   rpc_method_handlers = {
     "AnalyzeTrack": grpc.unary_unary_rpc_method_handler(
       servicer.AnalyzeTrack,
+      request_deserializer=AnalyzeTrackRequest.FromString,
+      response_serializer=getattr(
+        servicer,
+        "serialize_response",
+        AnalyzeTrackResponse.SerializeToString,
+      ),
+    ),
+    "SubmitAnalysis": grpc.unary_unary_rpc_method_handler(
+      servicer.SubmitAnalysis,
+      request_deserializer=AnalyzeTrackRequest.FromString,
+      response_serializer=AnalysisJob.SerializeToString,
+    ),
+    "GetAnalysisStatus": grpc.unary_unary_rpc_method_handler(
+      servicer.GetAnalysisStatus,
+      request_deserializer=GetAnalysisStatusRequest.FromString,
+      response_serializer=AnalysisJob.SerializeToString,
+    ),
+    "WatchAnalysis": grpc.unary_stream_rpc_method_handler(
+      servicer.WatchAnalysis,
+      request_deserializer=GetAnalysisStatusRequest.FromString,
+      response_serializer=AnalysisJob.SerializeToString,
     ),
   }
   generic_handler = grpc.method_handlers_generic_handler(
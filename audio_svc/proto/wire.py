@@ -0,0 +1,296 @@
+"""Proto3 binary encoding for the dataclass message mirrors.
+
+Each mirror declares its fields as :class:`FieldSpec` entries matching
+``proto/audio_analysis.proto``; the functions here turn those into standard
+protobuf wire bytes and back, so payloads are interchangeable with
+protoc-generated code (e.g. the TypeScript client). Repeated numeric fields
+are written packed, and NumPy arrays are copied as one contiguous
+little-endian buffer instead of element by element.
+"""
+
+from __future__ import annotations
+
+import functools
+import math
+import struct
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Optional, Sequence, Type, TypeVar
+
+import numpy as np
+
+
+class Kind(IntEnum):
+  DOUBLE = 1
+  FLOAT = 2
+  STRING = 3
+  ENUM = 4
+  MESSAGE = 5
+  BOOL = 6
+
+
+_WIRE_VARINT = 0
+_WIRE_FIXED64 = 1
+_WIRE_LENGTH = 2
+_WIRE_FIXED32 = 5
+
+_PACKED_DTYPES = {Kind.DOUBLE: np.dtype("<f8"), Kind.FLOAT: np.dtype("<f4")}
+_DOUBLE = struct.Struct("<d")
+_FLOAT = struct.Struct("<f")
+
+
+@dataclass(frozen=True, slots=True)
+class FieldSpec:
+  number: int
+  name: str
+  kind: Kind
+  repeated: bool = False
+  # Message class for MESSAGE fields, IntEnum class for ENUM fields.
+  type: Optional[type] = None
+
+
+class WireError(ValueError):
+  """Raised when a payload is not valid protobuf for the target message."""
+
+
+M = TypeVar("M")
+
+
+def _varint(value: int) -> bytes:
+  if 0 <= value < 0x80:
+    return _SMALL_VARINTS[value]
+  if value < 0:
+    value += 1 << 64
+  out = bytearray()
+  while value > 0x7F:
+    out.append((value & 0x7F) | 0x80)
+    value >>= 7
+  out.append(value)
+  return bytes(out)
+
+
+_SMALL_VARINTS = tuple(bytes((value,)) for value in range(0x80))
+
+
+@functools.lru_cache(maxsize=None)
+def _tag(number: int, wire_type: int) -> bytes:
+  return _varint((number << 3) | wire_type)
+
+
+def _length_delimited(number: int, payload: bytes) -> bytes:
+  return _tag(number, _WIRE_LENGTH) + _varint(len(payload)) + payload
+
+
+def encode(message: Any) -> bytes:
+  """Serialize a mirror instance; proto3 default values are omitted."""
+  chunks: list[bytes] = []
+  for spec in message._wire_fields:
+    value = getattr(message, spec.name)
+    if value is None:
+      continue
+    if spec.repeated:
+      _encode_repeated(chunks, spec, value)
+    else:
+      _encode_single(chunks, spec, value)
+  return b"".join(chunks)
+
+
+def _encode_single(chunks: list[bytes], spec: FieldSpec, value: Any) -> None:
+  if spec.kind == Kind.MESSAGE:
+    chunks.append(_length_delimited(spec.number, encode(value)))
+  elif spec.kind == Kind.STRING:
+    if value:
+      chunks.append(_length_delimited(spec.number, value.encode("utf-8")))
+  elif spec.kind == Kind.ENUM:
+    if int(value):
+      chunks.append(_tag(spec.number, _WIRE_VARINT) + _varint(int(value)))
+  elif spec.kind == Kind.BOOL:
+    if value:
+      chunks.append(_tag(spec.number, _WIRE_VARINT) + b"\x01")
+  elif spec.kind == Kind.DOUBLE:
+    if _present(value):
+      chunks.append(_tag(spec.number, _WIRE_FIXED64) + _DOUBLE.pack(value))
+  elif spec.kind == Kind.FLOAT:
+    if _present(value):
+      chunks.append(_tag(spec.number, _WIRE_FIXED32) + _FLOAT.pack(value))
+
+
+def _present(value: float) -> bool:
+  """Like protobuf, only +0.0 is the default: -0.0 is still written."""
+  return bool(value) or math.copysign(1.0, value) < 0
+
+
+def _encode_repeated(chunks: list[bytes], spec: FieldSpec, values: Sequence[Any]) -> None:
+  if spec.kind in _PACKED_DTYPES:
+    packed = np.ascontiguousarray(values, dtype=_PACKED_DTYPES[spec.kind])
+    if packed.size:
+      chunks.append(_length_delimited(spec.number, packed.tobytes()))
+  elif spec.kind == Kind.ENUM:
+    if len(values):
+      chunks.append(_length_delimited(spec.number, b"".join(_varint(int(v)) for v in values)))
+  else:
+    for value in values:
+      if spec.kind == Kind.MESSAGE:
+        chunks.append(_length_delimited(spec.number, encode(value)))
+      else:
+        chunks.append(_length_delimited(spec.number, value.encode("utf-8")))
+
+
+def _read_varint(data: memoryview, pos: int) -> tuple[int, int]:
+  result = 0
+  shift = 0
+  while True:
+    if pos >= len(data):
+      raise WireError("truncated varint")
+    byte = data[pos]
+    pos += 1
+    result |= (byte & 0x7F) << shift
+    if not byte & 0x80:
+      return result, pos
+    shift += 7
+    if shift >= 64:
+      raise WireError("varint too long")
+
+
+def _skip(data: memoryview, pos: int, wire_type: int) -> int:
+  if wire_type == _WIRE_VARINT:
+    return _read_varint(data, pos)[1]
+  if wire_type == _WIRE_FIXED64:
+    return pos + 8
+  if wire_type == _WIRE_FIXED32:
+    return pos + 4
+  if wire_type == _WIRE_LENGTH:
+    length, pos = _read_varint(data, pos)
+    return pos + length
+  raise WireError(f"unsupported wire type {wire_type}")
+
+
+def _signed(value: int) -> int:
+  return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _enum_value(spec: FieldSpec, raw: int) -> Any:
+  value = _signed(raw)
+  try:
+    return spec.type(value)  # type: ignore[misc]
+  except ValueError:
+    # proto3 enums are open: keep unknown values as plain ints.
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def _fields_by_number(cls: type) -> dict[int, FieldSpec]:
+  return {spec.number: spec for spec in cls._wire_fields}  # type: ignore[attr-defined]
+
+
+def decode(cls: Type[M], payload: bytes | bytearray | memoryview) -> M:
+  """Parse wire bytes into a new ``cls`` instance, skipping unknown fields."""
+  data = memoryview(payload).cast("B")
+  by_number = _fields_by_number(cls)
+  values: dict[str, Any] = {}
+  pos = 0
+  end = len(data)
+  while pos < end:
+    key, pos = _read_varint(data, pos)
+    number, wire_type = key >> 3, key & 0x07
+    spec = by_number.get(number)
+    if spec is None:
+      pos = _skip(data, pos, wire_type)
+      continue
+
+    if wire_type == _WIRE_LENGTH:
+      length, pos = _read_varint(data, pos)
+      chunk = data[pos : pos + length]
+      if len(chunk) != length:
+        raise WireError(f"truncated field {spec.name}")
+      pos += length
+      if spec.kind == Kind.MESSAGE:
+        item: Any = decode(spec.type, chunk)  # type: ignore[arg-type]
+      elif spec.kind == Kind.STRING:
+        try:
+          item = bytes(chunk).decode("utf-8")
+        except UnicodeDecodeError as exc:
+          raise WireError(f"field {spec.name} is not valid UTF-8") from exc
+      elif spec.repeated and spec.kind in _PACKED_DTYPES:
+        dtype = _PACKED_DTYPES[spec.kind]
+        if length % dtype.itemsize:
+          raise WireError(f"packed field {spec.name} has a partial element")
+        item = np.frombuffer(chunk, dtype=dtype).copy()
+      elif spec.repeated and spec.kind == Kind.ENUM:
+        packed_enums = []
+        inner = 0
+        while inner < len(chunk):
+          raw, inner = _read_varint(chunk, inner)
+          packed_enums.append(_enum_value(spec, raw))
+        item = packed_enums
+      else:
+        raise WireError(f"unexpected length-delimited value for {spec.name}")
+    elif wire_type == _WIRE_VARINT and spec.kind == Kind.ENUM:
+      raw, pos = _read_varint(data, pos)
+      item = _enum_value(spec, raw)
+    elif wire_type == _WIRE_VARINT and spec.kind == Kind.BOOL:
+      raw, pos = _read_varint(data, pos)
+      item = bool(raw)
+    elif wire_type == _WIRE_FIXED64 and spec.kind == Kind.DOUBLE:
+      if pos + 8 > end:
+        raise WireError(f"truncated field {spec.name}")
+      item = _DOUBLE.unpack_from(data, pos)[0]
+      pos += 8
+    elif wire_type == _WIRE_FIXED32 and spec.kind == Kind.FLOAT:
+      if pos + 4 > end:
+        raise WireError(f"truncated field {spec.name}")
+      item = _FLOAT.unpack_from(data, pos)[0]
+      pos += 4
+    else:
+      raise WireError(f"wire type {wire_type} does not match field {spec.name}")
+
+    if not spec.repeated:
+      if spec.kind == Kind.MESSAGE and spec.name in values:
+        values[spec.name] = _merge(values[spec.name], item)
+      else:
+        values[spec.name] = item
+    elif spec.kind in _PACKED_DTYPES:
+      chunk_values = np.atleast_1d(np.asarray(item, dtype=_PACKED_DTYPES[spec.kind]))
+      previous = values.get(spec.name)
+      values[spec.name] = chunk_values if previous is None else np.concatenate((previous, chunk_values))
+    elif isinstance(item, list):
+      values.setdefault(spec.name, []).extend(item)
+    else:
+      values.setdefault(spec.name, []).append(item)
+
+  if pos != end:
+    raise WireError("payload ends inside a field")
+  return cls(**values)
+
+
+def _merge(existing: Any, update: Any) -> Any:
+  """Protobuf merge semantics for a singular message field seen twice."""
+  merged = {}
+  for spec in existing._wire_fields:
+    old = getattr(existing, spec.name)
+    new = getattr(update, spec.name)
+    if spec.repeated:
+      if spec.kind in _PACKED_DTYPES:
+        merged[spec.name] = np.concatenate((np.asarray(old), np.asarray(new)))
+      else:
+        merged[spec.name] = [*old, *new]
+    elif spec.kind == Kind.MESSAGE:
+      merged[spec.name] = _merge(old, new)
+    else:
+      merged[spec.name] = new if new else old
+  return type(existing)(**merged)
+
+
+class WireMessage:
+  """Mixin giving mirrors the ``SerializeToString``/``FromString`` protobuf API."""
+
+  __slots__ = ()
+  _wire_fields: tuple[FieldSpec, ...] = ()
+
+  def SerializeToString(self) -> bytes:  # noqa: N802
+    return encode(self)
+
+  @classmethod
+  def FromString(cls: Type[M], payload: bytes) -> M:  # noqa: N802
+    return decode(cls, payload)
+
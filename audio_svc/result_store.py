@@ -0,0 +1,68 @@
+"""Persistent store for completed track analyses.
+
+Results are keyed by the audio source and the analysis version that produced
+them, so a deploy that changes the pipeline naturally misses old entries
+instead of serving stale features. Payloads are stored as protobuf wire
+bytes, the same encoding served to clients.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Protocol, Union
+
+from .proto import audio_analysis_pb2 as messages
+
+
+class ResultStore(Protocol):
+  def get(self, source: str, version: str) -> Optional[messages.AnalyzeTrackResponse]: ...
+
+  def put(self, source: str, version: str, response: messages.AnalyzeTrackResponse) -> None: ...
+
+
+class SqliteResultStore:
+  """SQLite-backed :class:`ResultStore` safe to share between threads."""
+
+  def __init__(self, path: Union[str, Path]) -> None:
+    self._path = str(path)
+    self._lock = threading.Lock()
+    self._connection = sqlite3.connect(self._path, check_same_thread=False)
+    with self._lock, self._connection:
+      self._connection.execute("PRAGMA journal_mode=WAL")
+      self._connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS analysis_results (
+          source TEXT NOT NULL,
+          version TEXT NOT NULL,
+          payload BLOB NOT NULL,
+          created_at REAL NOT NULL,
+          PRIMARY KEY (source, version)
+        )
+        """
+      )
+
+  def get(self, source: str, version: str) -> Optional[messages.AnalyzeTrackResponse]:
+    with self._lock:
+      row = self._connection.execute(
+        "SELECT payload FROM analysis_results WHERE source = ? AND version = ?",
+        (source, version),
+      ).fetchone()
+    if row is None:
+      return None
+    return messages.AnalyzeTrackResponse.FromString(row[0])
+
+  def put(self, source: str, version: str, response: messages.AnalyzeTrackResponse) -> None:
+    payload = response.SerializeToString()
+    with self._lock, self._connection:
+      self._connection.execute(
+        "INSERT OR REPLACE INTO analysis_results (source, version, payload, created_at)"
+        " VALUES (?, ?, ?, ?)",
+        (source, version, payload, time.time()),
+      )
+
+  def close(self) -> None:
+    with self._lock:
+      self._connection.close()
@@ -0,0 +1,208 @@
+"""Priority-aware admission control for analysis requests.
+
+gRPC hands every call to a single FIFO thread pool, so a bulk catalog warmup
+can occupy every worker while a player waits on the play screen. The
+scheduler sits between the handler threads and the analysis pipeline: each
+request is admitted under a priority class with its own concurrency quota,
+and background work yields its slot at stage boundaries whenever interactive
+requests are waiting.
+"""
+
+from __future__ import annotations
+
+import collections
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Deque, Dict, Mapping, Optional
+
+from .proto import audio_analysis_pb2 as messages
+
+
+LOGGER = logging.getLogger(__name__)
+
+AnalysisPriority = messages.AnalysisPriority
+
+_PRIORITY_CLASSES: tuple[AnalysisPriority, ...] = (
+  AnalysisPriority.INTERACTIVE,
+  AnalysisPriority.BACKGROUND,
+)
+
+_PRIORITY_NAMES: dict[str, AnalysisPriority] = {
+  "interactive": AnalysisPriority.INTERACTIVE,
+  "background": AnalysisPriority.BACKGROUND,
+}
+
+
+class SchedulerSaturatedError(RuntimeError):
+  """Raised when a priority class queue is full and the request is shed."""
+
+
+@dataclass(frozen=True, slots=True)
+class ClassQuota:
+  """Concurrency and queue limits for a single priority class."""
+
+  max_concurrent: int
+  max_queued: int = 32
+
+
+@dataclass(frozen=True, slots=True)
+class SchedulerSnapshot:
+  running: Mapping[str, int]
+  queued: Mapping[str, int]
+  preemptions: int
+
+
+def priority_from_name(value: Optional[str]) -> AnalysisPriority:
+  """Map a metadata value such as ``"background"`` onto a priority class."""
+  if not value:
+    return AnalysisPriority.INTERACTIVE
+  try:
+    return _PRIORITY_NAMES[value.strip().lower()]
+  except KeyError as exc:
+    raise ValueError(f"unknown analysis priority: {value!r}") from exc
+
+
+def _normalise(priority: AnalysisPriority) -> AnalysisPriority:
+  if priority == AnalysisPriority.ANALYSIS_PRIORITY_UNSPECIFIED:
+    return AnalysisPriority.INTERACTIVE
+  return AnalysisPriority(priority)
+
+
+class AdmissionSlot:
+  """Handle for an admitted request; released when the context exits."""
+
+  __slots__ = ("_scheduler", "priority", "_held")
+
+  def __init__(self, scheduler: "AnalysisScheduler", priority: AnalysisPriority) -> None:
+    self._scheduler = scheduler
+    self.priority = priority
+    self._held = False
+
+  def __enter__(self) -> "AdmissionSlot":
+    self._scheduler._acquire(self, front=False)
+    return self
+
+  def __exit__(self, *exc_info: object) -> None:
+    if self._held:
+      self._scheduler._release(self)
+
+  def checkpoint(self) -> None:
+    """Stage boundary: background work yields if interactive work is waiting."""
+    self._scheduler._checkpoint(self)
+
+
+class AnalysisScheduler:
+  """Admit analyses by priority class within a shared compute capacity.
+
+  Interactive requests may use every slot; background requests are capped by
+  their own quota (by default leaving one slot of headroom) and only start when
+  no interactive request is queued. Within a class admission is FIFO.
+  """
+
+  def __init__(
+    self,
+    capacity: int,
+    quotas: Optional[Mapping[AnalysisPriority, ClassQuota]] = None,
+  ) -> None:
+    if capacity < 1:
+      raise ValueError("scheduler capacity must be at least 1")
+    self._capacity = capacity
+    defaults = {
+      AnalysisPriority.INTERACTIVE: ClassQuota(max_concurrent=capacity),
+      AnalysisPriority.BACKGROUND: ClassQuota(max_concurrent=max(1, capacity - 1)),
+    }
+    defaults.update(quotas or {})
+    self._quotas: Dict[AnalysisPriority, ClassQuota] = defaults
+    self._running: Dict[AnalysisPriority, int] = {cls: 0 for cls in _PRIORITY_CLASSES}
+    self._waiting: Dict[AnalysisPriority, Deque[AdmissionSlot]] = {
+      cls: collections.deque() for cls in _PRIORITY_CLASSES
+    }
+    self._preemptions = 0
+    self._condition = threading.Condition()
+
+  @property
+  def capacity(self) -> int:
+    return self._capacity
+
+  @property
+  def handler_threads(self) -> int:
+    """Thread count needed so queued requests park here, not in gRPC's FIFO."""
+    return self._capacity + sum(quota.max_queued for quota in self._quotas.values())
+
+  def admit(self, priority: AnalysisPriority) -> AdmissionSlot:
+    return AdmissionSlot(self, _normalise(priority))
+
+  def queue_depth(self) -> Dict[str, int]:
+    with self._condition:
+      return {cls.name.lower(): len(self._waiting[cls]) for cls in _PRIORITY_CLASSES}
+
+  def snapshot(self) -> SchedulerSnapshot:
+    with self._condition:
+      return SchedulerSnapshot(
+        running={cls.name.lower(): self._running[cls] for cls in _PRIORITY_CLASSES},
+        queued={cls.name.lower(): len(self._waiting[cls]) for cls in _PRIORITY_CLASSES},
+        preemptions=self._preemptions,
+      )
+
+  def _can_start(self, slot: AdmissionSlot) -> bool:
+    cls = slot.priority
+    queue = self._waiting[cls]
+    if not queue or queue[0] is not slot:
+      return False
+    if sum(self._running.values()) >= self._capacity:
+      return False
+    if self._running[cls] >= self._quotas[cls].max_concurrent:
+      return False
+    if cls != AnalysisPriority.INTERACTIVE and self._waiting[AnalysisPriority.INTERACTIVE]:
+      return False
+    return True
+
+  def _acquire(self, slot: AdmissionSlot, *, front: bool) -> None:
+    with self._condition:
+      queue = self._waiting[slot.priority]
+      if front:
+        queue.appendleft(slot)
+      else:
+        queue.append(slot)
+        # ``max_queued`` bounds requests that would wait, not ones that can
+        # start right away.
+        if not self._can_start(slot) and len(queue) > self._quotas[slot.priority].max_queued:
+          queue.pop()
+          raise SchedulerSaturatedError(
+            f"{slot.priority.name.lower()} analysis queue is full ({len(queue)} waiting)"
+          )
+      LOGGER.debug(
+        "Analysis queued",
+        extra={"priority": slot.priority.name.lower(), "queue_depth": len(queue)},
+      )
+      try:
+        self._condition.wait_for(lambda: self._can_start(slot))
+      except BaseException:
+        queue.remove(slot)
+        self._condition.notify_all()
+        raise
+      queue.popleft()
+      self._running[slot.priority] += 1
+      slot._held = True
+      self._condition.notify_all()
+
+  def _release(self, slot: AdmissionSlot) -> None:
+    with self._condition:
+      self._running[slot.priority] -= 1
+      slot._held = False
+      self._condition.notify_all()
+
+  def _checkpoint(self, slot: AdmissionSlot) -> None:
+    if slot.priority == AnalysisPriority.INTERACTIVE:
+      return
+    with self._condition:
+      interactive_blocked = bool(self._waiting[AnalysisPriority.INTERACTIVE]) and (
+        sum(self._running.values()) >= self._capacity
+      )
+      if not interactive_blocked:
+        return
+      self._preemptions += 1
+    LOGGER.debug("Background analysis yielding to interactive work")
+    self._release(slot)
+    self._acquire(slot, front=True)
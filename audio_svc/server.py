@@ -1,17 +1,34 @@
 from __future__ import annotations
 
+import contextlib
+import dataclasses
+import functools
 import io
 import logging
 import math
+import operator
+import threading
+import time
 import urllib.error
 import urllib.request
 from concurrent import futures
-from typing import Iterable, Optional, Protocol, Tuple
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, NoReturn, Optional, Protocol, Sequence, Tuple
 
 import numpy as np
 
+from . import harmony
+from .artifact_cache import ArtifactCache, content_key
+from .cpu_budget import CpuBudget, inherit_native_limits
+from .fingerprint import Fingerprint, FingerprintIndex, compute_fingerprint, decode_preview, preview_signal
+from .jobs import Job, JobQueue
+from .pipeline import Stage, StageGraph
+from .profiling import ProfileCapture, RequestProfiler
 from .proto import audio_analysis_pb2 as messages
 from .proto import audio_analysis_pb2_grpc as bindings
+from .result_store import ResultStore
+from .scheduling import AnalysisScheduler, SchedulerSaturatedError, priority_from_name
+from .tracing import TRACEPARENT_METADATA_KEY, Span, Tracer, child_span
 
 try:
   import grpc
@@ -26,63 +43,604 @@ except ModuleNotFoundError:  # pragma: no cover - exercised via tests
 
 LOGGER = logging.getLogger(__name__)
 
-_NOTE_NAMES: tuple[str, ...] = (
-  "C",
-  "C#",
-  "D",
-  "D#",
-  "E",
-  "F",
-  "F#",
-  "G",
-  "G#",
-  "A",
-  "A#",
-  "B",
-)
-
-_KRUMHANSL_MAJOR = np.array(
-  [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88],
-  dtype=np.float32,
-)
-_KRUMHANSL_MINOR = np.array(
-  [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17],
-  dtype=np.float32,
-)
+PRIORITY_METADATA_KEY = "x-analysis-priority"
+PROFILE_METADATA_KEY = "x-analysis-profile"
+
+# Bump whenever a change to the pipeline alters analysis output so stored
+# results from older deploys are recomputed rather than served. Also bump the
+# version of the stages that changed so the artifact cache reuses the rest.
+ANALYSIS_VERSION = "3"
+
+# Shared by beat tracking, chroma and the frame-level curves so harmony
+# segments and the response timeline line up with beats.
+_HOP_LENGTH = 512
 
 
 class _AudioLoader(Protocol):
   def __call__(self, audio_url: str) -> Tuple[np.ndarray, int]: ...
 
 
+_Checkpoint = Callable[[], None]
+_DeferredAudio = Callable[[], Tuple[np.ndarray, int]]
+_DeferredPreview = Callable[[], np.ndarray]
+
+
+def _no_checkpoint() -> None:
+  return None
+
+
+@dataclass(frozen=True, slots=True)
+class _SectionSpan:
+  label: str
+  start: float
+  end: float
+  average_energy: float
+
+
+class _RequestTelemetry:
+  """Profiling capture and/or trace span attached to one sampled request."""
+
+  __slots__ = ("capture", "span")
+
+  def __init__(self, capture: Optional[ProfileCapture], span: Optional[Span]) -> None:
+    self.capture = capture
+    self.span = span
+
+  def observe(self, name: str, seconds: float) -> None:
+    if self.capture is not None:
+      self.capture.record_stage(name, seconds)
+    if self.span is not None:
+      self.span.record_child(name, seconds)
+
+  @contextlib.contextmanager
+  def stage(self, name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.observe(name, time.perf_counter() - started)
+
+
+def _observed(
+  telemetry: Optional[_RequestTelemetry],
+  name: str,
+) -> contextlib.AbstractContextManager[None]:
+  return contextlib.nullcontext() if telemetry is None else telemetry.stage(name)
+
+
+def _decode(audio: _DeferredAudio) -> Tuple[np.ndarray, int]:
+  return audio()
+
+
+def _for_request(
+  stored: Optional[messages.AnalyzeTrackResponse],
+  include_timeline: bool,
+) -> Optional[messages.AnalyzeTrackResponse]:
+  """``stored`` shaped for a request; ``None`` if it lacks the requested timeline."""
+  if stored is None or (include_timeline and stored.timeline is None):
+    return None
+  if not include_timeline and stored.timeline is not None:
+    return dataclasses.replace(stored, timeline=None)
+  return stored
+
+
+def _shift_response(
+  response: messages.AnalyzeTrackResponse,
+  offset_seconds: float,
+) -> messages.AnalyzeTrackResponse:
+  """Move another copy's analysis onto this audio's time axis.
+
+  Material before the start of this copy is dropped; a longer lead-in than
+  the original had shows up as zero-filled frames in the timeline curves.
+  """
+  if offset_seconds == 0.0:
+    return response
+  kept = [
+    index
+    for index, section in enumerate(response.sections)
+    if section.end_sec + offset_seconds > 0.0
+  ]
+  sections = [
+    dataclasses.replace(
+      response.sections[index],
+      start_sec=round(max(0.0, response.sections[index].start_sec + offset_seconds), 2),
+      end_sec=round(response.sections[index].end_sec + offset_seconds, 2),
+    )
+    for index in kept
+  ]
+  key = response.summary.key
+  progression = key.chord_progression
+  if len(progression) == len(response.sections):
+    progression = [progression[index] for index in kept]
+
+  return messages.AnalyzeTrackResponse(
+    summary=dataclasses.replace(
+      response.summary,
+      key=dataclasses.replace(key, chord_progression=progression),
+    ),
+    sections=sections,
+    timeline=None if response.timeline is None else _shift_timeline(response.timeline, offset_seconds),
+  )
+
+
+def _shift_timeline(timeline: messages.AnalysisTimeline, offset_seconds: float) -> messages.AnalysisTimeline:
+  frames = int(round(offset_seconds * timeline.frame_rate_hz))
+
+  def shifted(curve: np.ndarray) -> np.ndarray:
+    if frames >= 0:
+      return np.concatenate((np.zeros(frames, dtype=curve.dtype), curve))
+    return curve[-frames:]
+
+  beat_times = timeline.beat_times + offset_seconds
+  return messages.AnalysisTimeline(
+    frame_rate_hz=timeline.frame_rate_hz,
+    beat_times=beat_times[beat_times >= 0.0],
+    energy_envelope=shifted(timeline.energy_envelope),
+    spectral_centroid=shifted(timeline.spectral_centroid),
+  )
+
+
+def _finish_capture(capture: ProfileCapture, *, error: Optional[BaseException] = None) -> None:
+  """Write a profile capture; failing to do so must not fail the request."""
+  try:
+    capture.finish(error=error)
+  except OSError:
+    LOGGER.warning("Could not write profile capture", exc_info=True)
+
+
+def _abort(context: Optional[object], code: str, error: Exception) -> NoReturn:
+  """Fail the RPC with ``code`` when served over gRPC, then raise ``error``."""
+  if grpc is not None and hasattr(context, "abort"):
+    context.abort(getattr(grpc.StatusCode, code), str(error))
+  raise error
+
+
+def _invocation_metadata(context: Optional[object]) -> Dict[str, str]:
+  invocation_metadata = getattr(context, "invocation_metadata", None)
+  if invocation_metadata is None:
+    return {}
+  return {str(key).lower(): str(value) for key, value in invocation_metadata() or ()}
+
+
 class AudioAnalysisService(bindings.AudioAnalysisServiceServicer):
   """librosa-backed implementation producing BPM and energy metrics."""
 
-  def __init__(self, audio_loader: Optional[_AudioLoader] = None) -> None:
+  def __init__(
+    self,
+    audio_loader: Optional[_AudioLoader] = None,
+    *,
+    scheduler: Optional[AnalysisScheduler] = None,
+    result_store: Optional[ResultStore] = None,
+    stage_workers: int = 1,
+    profiler: Optional[RequestProfiler] = None,
+    tracer: Optional[Tracer] = None,
+    artifact_cache: Optional[ArtifactCache] = None,
+    job_queue: Optional[JobQueue] = None,
+    watch_interval: float = 15.0,
+    fingerprint_index: Optional[FingerprintIndex] = None,
+  ) -> None:
+    """``stage_workers > 1`` runs independent pipeline stages concurrently.
+
+    With an ``artifact_cache``, stage outputs are memoized per audio content
+    so a re-analysis only recomputes stages whose version or inputs changed.
+    A ``job_queue`` enables the asynchronous Submit/Get/Watch RPCs; jobs are
+    run by :class:`~audio_svc.jobs.AnalysisWorker` and read back from the
+    ``result_store``. ``watch_interval`` bounds how long a watch stream waits
+    between checks that its client is still connected. With a
+    ``fingerprint_index``, audio recognised as another copy of an already
+    analysed track reuses that track's stored result, shifted to this copy's
+    timing, instead of running the pipeline.
+    """
     if librosa is None:
       raise RuntimeError("librosa must be installed to use AudioAnalysisService.")
-    self._audio_loader = audio_loader or self._load_audio
+    if job_queue is not None and result_store is None:
+      raise ValueError("job_queue requires a result_store to hold job results")
+    if fingerprint_index is not None and result_store is None:
+      raise ValueError("fingerprint_index requires a result_store to reuse results from")
+    self._audio_loader = audio_loader
+    self._artifact_cache = artifact_cache
+    self._job_queue = job_queue
+    self._fingerprint_index = fingerprint_index
+    self._watch_interval = watch_interval
+    self._scheduler = scheduler
+    self._result_store = result_store
+    self._profiler = profiler
+    self._tracer = tracer
+    # Root span handed from AnalyzeTrack to serialize_response, which gRPC
+    # calls on the same handler thread once the method returns.
+    self._serialize_span = threading.local()
+    self._stage_workers = stage_workers
+    # Decoding runs inside the graph so fully cached requests skip it; the
+    # decoded signal and ``y`` are never persisted.
+    self._graph = StageGraph(
+      (
+        Stage("decode", ("audio",), _decode, persist=False),
+        Stage("y", ("decode",), operator.itemgetter(0), persist=False),
+        Stage("sr", ("decode",), operator.itemgetter(1)),
+        Stage("onset", ("y", "sr"), self._onset_envelope, version="1"),
+        Stage("beats", ("onset", "sr"), self._track_beats, version="1"),
+        Stage("chroma", ("y", "sr"), self._chroma, version="1"),
+        Stage("rms", ("y",), self._rms_energy, version="1"),
+        Stage("centroid", ("y", "sr"), self._spectral_centroid, version="1"),
+        Stage("section_spans", ("y", "sr"), self._section_spans, version="1"),
+        Stage(
+          "timeline",
+          ("beats", "rms", "centroid", "sr"),
+          self._build_timeline,
+          version="1",
+        ),
+        Stage("harmony", ("chroma", "beats", "sr"), self._track_harmony, version="1"),
+        Stage(
+          "sections",
+          ("section_spans", "harmony"),
+          self._build_sections,
+          version="1",
+        ),
+        Stage(
+          "summary",
+          ("beats", "rms", "centroid", "harmony", "sections"),
+          self._build_summary,
+          version="1",
+        ),
+      ),
+      sources=("audio",),
+    )
+
+  @property
+  def scheduler(self) -> Optional[AnalysisScheduler]:
+    return self._scheduler
+
+  @property
+  def result_store(self) -> Optional[ResultStore]:
+    return self._result_store
+
+  @property
+  def job_queue(self) -> Optional[JobQueue]:
+    return self._job_queue
 
   def AnalyzeTrack(  # noqa: N802
     self,
     request: messages.AnalyzeTrackRequest,
     context: Optional[object] = None,
   ) -> messages.AnalyzeTrackResponse:
-    y, sr = self._audio_loader(request.audio_url)
-    summary = self._build_summary(y, sr)
-    sections = list(self._build_sections(y, sr))
-    return messages.AnalyzeTrackResponse(summary=summary, sections=sections)
+    span = self._start_span(request, context)
+    self._serialize_span.span = span
+    try:
+      if span is None:
+        return self._analyze_cached(request, context, None)
+      with span:
+        return self._analyze_cached(request, context, span)
+    except BaseException:
+      # No response will be serialised for this call.
+      self._serialize_span.span = None
+      raise
+
+  def SubmitAnalysis(  # noqa: N802
+    self,
+    request: messages.AnalyzeTrackRequest,
+    context: Optional[object] = None,
+  ) -> messages.AnalysisJob:
+    queue = self._require_job_queue(context)
+    if not request.audio_url:
+      _abort(context, "INVALID_ARGUMENT", ValueError("audio_url is required for analysis"))
+    request = dataclasses.replace(request, priority=self._resolve_priority(request, context))
+    stored = _for_request(
+      self._result_store.get(request.audio_url, ANALYSIS_VERSION),
+      request.include_timeline,
+    )
+    job = queue.submit(request, ANALYSIS_VERSION, result_stored=stored is not None)
+    if job.status == messages.AnalysisJobStatus.SUCCEEDED:
+      return messages.AnalysisJob(
+        job_id=job.job_id,
+        status=job.status,
+        audio_url=request.audio_url,
+        result=stored,
+      )
+    return self._job_message(job)
+
+  def GetAnalysisStatus(  # noqa: N802
+    self,
+    request: messages.GetAnalysisStatusRequest,
+    context: Optional[object] = None,
+  ) -> messages.AnalysisJob:
+    return self._job_message(self._find_job(request, context))
+
+  def WatchAnalysis(  # noqa: N802
+    self,
+    request: messages.GetAnalysisStatusRequest,
+    context: Optional[object] = None,
+  ) -> Iterator[messages.AnalysisJob]:
+    job = self._find_job(request, context)
+    queue = self._require_job_queue(context)
+    yield self._job_message(job)
+    while not job.finished:
+      is_active = getattr(context, "is_active", None)
+      if is_active is not None and not is_active():
+        return
+      update = queue.wait_for_update(job.job_id, job.revision, timeout=self._watch_interval)
+      if update is None:
+        return
+      if update.revision != job.revision:
+        job = update
+        yield self._job_message(job)
+
+  def _require_job_queue(self, context: Optional[object]) -> JobQueue:
+    if self._job_queue is None:
+      _abort(context, "UNIMPLEMENTED", RuntimeError("asynchronous analysis is not enabled"))
+    return self._job_queue
+
+  def _find_job(
+    self,
+    request: messages.GetAnalysisStatusRequest,
+    context: Optional[object],
+  ) -> Job:
+    job = self._require_job_queue(context).get(request.job_id)
+    if job is None:
+      _abort(context, "NOT_FOUND", LookupError(f"unknown analysis job: {request.job_id}"))
+    return job
+
+  def _job_message(self, job: Job) -> messages.AnalysisJob:
+    result = None
+    if job.status == messages.AnalysisJobStatus.SUCCEEDED and self._result_store is not None:
+      result = _for_request(
+        self._result_store.get(job.request.audio_url, job.version),
+        job.request.include_timeline,
+      )
+    return messages.AnalysisJob(
+      job_id=job.job_id,
+      status=job.status,
+      audio_url=job.request.audio_url,
+      result=result,
+      error=job.error if job.status == messages.AnalysisJobStatus.FAILED else "",
+    )
+
+  def serialize_response(self, response: messages.AnalyzeTrackResponse) -> bytes:
+    """gRPC response serializer; records a ``serialize`` span when traced.
+
+    The request's root span has already ended by now, so the span is recorded
+    next to it in the same trace rather than as its child.
+    """
+    span = getattr(self._serialize_span, "span", None)
+    self._serialize_span.span = None
+    if span is None:
+      return response.SerializeToString()
+    started = time.perf_counter()
+    payload = response.SerializeToString()
+    span.record_sibling(
+      "serialize",
+      time.perf_counter() - started,
+      **{"response.bytes": len(payload)},
+    )
+    return payload
+
+  def _start_span(
+    self,
+    request: messages.AnalyzeTrackRequest,
+    context: Optional[object],
+  ) -> Optional[Span]:
+    if self._tracer is None:
+      return None
+    return self._tracer.start_request(
+      "AnalyzeTrack",
+      traceparent=_invocation_metadata(context).get(TRACEPARENT_METADATA_KEY),
+      session_id=request.session_id,
+      attributes={"audio.url": request.audio_url},
+    )
+
+  def _analyze_cached(
+    self,
+    request: messages.AnalyzeTrackRequest,
+    context: Optional[object],
+    span: Optional[Span],
+  ) -> messages.AnalyzeTrackResponse:
+    if self._result_store is not None:
+      with child_span(span, "result_store.get") as lookup:
+        # A stored result without the timeline cannot answer a request for
+        # one; the re-analysis below stores the fuller result in its place.
+        stored = _for_request(
+          self._result_store.get(request.audio_url, ANALYSIS_VERSION),
+          request.include_timeline,
+        )
+        if lookup is not None:
+          lookup.set_attribute("cache.hit", stored is not None)
+      if stored is not None:
+        return stored
+
+    response = self._analyze_scheduled(request, context, span)
+    if self._result_store is not None:
+      with child_span(span, "result_store.put"):
+        self._result_store.put(request.audio_url, ANALYSIS_VERSION, response)
+    return response
+
+  def _analyze_scheduled(
+    self,
+    request: messages.AnalyzeTrackRequest,
+    context: Optional[object],
+    span: Optional[Span],
+  ) -> messages.AnalyzeTrackResponse:
+    if self._scheduler is None:
+      return self._analyze_instrumented(request, context, span, _no_checkpoint)
 
-  def _load_audio(self, audio_url: str) -> Tuple[np.ndarray, int]:
+    priority = self._resolve_priority(request, context)
+    if span is not None:
+      span.set_attribute("analysis.priority", priority.name.lower())
+    queued_at = time.perf_counter()
+    try:
+      with self._scheduler.admit(priority) as slot:
+        if span is not None:
+          span.record_child("scheduler.wait", time.perf_counter() - queued_at)
+        return self._analyze_instrumented(request, context, span, slot.checkpoint)
+    except SchedulerSaturatedError as exc:
+      _abort(context, "RESOURCE_EXHAUSTED", exc)
+
+  def _resolve_priority(
+    self,
+    request: messages.AnalyzeTrackRequest,
+    context: Optional[object],
+  ) -> messages.AnalysisPriority:
+    if request.priority == messages.AnalysisPriority.ANALYSIS_PRIORITY_UNSPECIFIED:
+      try:
+        return priority_from_name(_invocation_metadata(context).get(PRIORITY_METADATA_KEY))
+      except ValueError as exc:
+        _abort(context, "INVALID_ARGUMENT", exc)
+    try:
+      return messages.AnalysisPriority(request.priority)
+    except ValueError:
+      # proto3 keeps enum values this build does not know as plain ints.
+      _abort(context, "INVALID_ARGUMENT", ValueError(f"unknown analysis priority: {request.priority}"))
+
+  def _begin_capture(
+    self,
+    request: messages.AnalyzeTrackRequest,
+    context: Optional[object],
+  ) -> Optional[ProfileCapture]:
+    if self._profiler is None:
+      return None
+    requested = _invocation_metadata(context).get(PROFILE_METADATA_KEY, "").lower()
+    return self._profiler.begin(
+      request.session_id,
+      requested=requested in ("1", "true", "yes"),
+    )
+
+  def _analyze_instrumented(
+    self,
+    request: messages.AnalyzeTrackRequest,
+    context: Optional[object],
+    span: Optional[Span],
+    checkpoint: _Checkpoint,
+  ) -> messages.AnalyzeTrackResponse:
+    capture = self._begin_capture(request, context)
+    if capture is None and span is None:
+      return self._analyze(request, checkpoint)
+
+    telemetry = _RequestTelemetry(capture, span)
+    try:
+      response = self._analyze(request, checkpoint, telemetry)
+    except BaseException as exc:
+      if capture is not None:
+        _finish_capture(capture, error=exc)
+      raise
+    if capture is not None:
+      _finish_capture(capture)
+    return response
+
+  def _analyze(
+    self,
+    request: messages.AnalyzeTrackRequest,
+    checkpoint: _Checkpoint,
+    telemetry: Optional[_RequestTelemetry] = None,
+  ) -> messages.AnalyzeTrackResponse:
+    audio, audio_key, preview = self._open_audio(request.audio_url, telemetry)
+    checkpoint()
+    fingerprint = None
+    if self._fingerprint_index is not None:
+      with _observed(telemetry, "fingerprint"):
+        fingerprint = compute_fingerprint(preview())
+        duplicate = self._analysis_of_duplicate(request, fingerprint, telemetry)
+      if duplicate is not None:
+        return duplicate
+      checkpoint()
+    # Before Python 3.12 cProfile only sees the thread it was enabled on, so
+    # profiled requests run their stages on the request thread. From 3.12 it
+    # sees every thread, concurrent requests included.
+    profiling = telemetry is not None and telemetry.capture is not None
+    # Each request gets its own stage threads: in a pool shared between
+    # requests, interactive stages would queue behind background ones that
+    # the scheduler has already admitted.
+    executor = (
+      futures.ThreadPoolExecutor(
+        max_workers=self._stage_workers,
+        thread_name_prefix="audio-stage",
+        initializer=inherit_native_limits,
+      )
+      if self._stage_workers > 1 and not profiling
+      else None
+    )
+    with executor if executor is not None else contextlib.nullcontext():
+      artifacts = self._graph.run(
+        {"audio": audio},
+        executor=executor,
+        checkpoint=checkpoint,
+        observer=None if telemetry is None else telemetry.observe,
+        outputs=("summary", "sections", "timeline") if request.include_timeline else ("summary", "sections"),
+        cache=self._artifact_cache,
+        source_keys=None if audio_key is None else {"audio": audio_key},
+      )
+    if fingerprint is not None:
+      # Indexed before _analyze_cached stores the result; a concurrent lookup
+      # that finds no stored result yet falls back to a full analysis.
+      self._fingerprint_index.add(request.audio_url, fingerprint)
+    return messages.AnalyzeTrackResponse(
+      summary=artifacts["summary"],
+      sections=artifacts["sections"],
+      timeline=artifacts.get("timeline"),
+    )
+
+  def _analysis_of_duplicate(
+    self,
+    request: messages.AnalyzeTrackRequest,
+    fingerprint: Fingerprint,
+    telemetry: Optional[_RequestTelemetry],
+  ) -> Optional[messages.AnalyzeTrackResponse]:
+    audio_url = request.audio_url
+    match = self._fingerprint_index.lookup(fingerprint)
+    if match is None or match.source == audio_url:
+      return None
+    stored = _for_request(self._result_store.get(match.source, ANALYSIS_VERSION), request.include_timeline)
+    if stored is None:
+      return None
+    LOGGER.info(
+      "Reusing analysis of a matching recording",
+      extra={
+        "audio_url": audio_url,
+        "matched_url": match.source,
+        "offset_seconds": match.offset_seconds,
+        "score": match.score,
+      },
+    )
+    if telemetry is not None and telemetry.span is not None:
+      telemetry.span.set_attribute("fingerprint.match", match.source)
+      telemetry.span.set_attribute("fingerprint.offset_seconds", match.offset_seconds)
+    return _shift_response(stored, match.offset_seconds)
+
+  def _open_audio(
+    self,
+    audio_url: str,
+    telemetry: Optional[_RequestTelemetry],
+  ) -> Tuple[_DeferredAudio, Optional[str], _DeferredPreview]:
+    """Fetch the source and derive its content key; decoding is deferred.
+
+    The third element decodes just the low-rate fingerprint preview.
+    """
+    if self._audio_loader is not None:
+      with _observed(telemetry, "load"):
+        y, sr = self._audio_loader(audio_url)
+      key = None
+      if self._artifact_cache is not None:
+        samples = np.ascontiguousarray(y)
+        key = content_key(f"{samples.dtype.str}:{sr}", memoryview(samples).cast("B"))
+      return (lambda: (y, sr)), key, functools.partial(preview_signal, y, sr)
+
+    with _observed(telemetry, "fetch"):
+      payload = self._fetch_audio(audio_url)
+    key = None if self._artifact_cache is None else content_key(payload)
+    return (
+      functools.partial(self._decode_audio, audio_url, payload),
+      key,
+      functools.partial(decode_preview, payload),
+    )
+
+  def _fetch_audio(self, audio_url: str) -> bytes:
     if not audio_url:
       raise ValueError("audio_url is required for analysis")
 
     try:
       with urllib.request.urlopen(audio_url) as response:
-        payload = response.read()
+        return response.read()
     except urllib.error.URLError as exc:  # pragma: no cover - network failure guard
       raise RuntimeError(f"failed to fetch audio payload: {exc.reason}") from exc
 
+  def _decode_audio(self, audio_url: str, payload: bytes) -> Tuple[np.ndarray, int]:
     buffer = io.BytesIO(payload)
     y, sr = librosa.load(buffer, sr=None, mono=True)
     LOGGER.debug(
@@ -91,20 +649,57 @@ class AudioAnalysisService(bindings.AudioAnalysisServiceServicer):
     )
     return y, sr
 
-  def _build_summary(self, y: np.ndarray, sr: int) -> messages.AnalysisSummary:
-    tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
-    rms = librosa.feature.rms(y=y)[0]
-    energy = float(np.clip(np.mean(rms), 0.0, 1.0))
-    centroid = float(np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)))
-    beat_position = self._classify_beat_position(beats)
-    key = self._estimate_key(y, sr)
+  def _onset_envelope(self, y: np.ndarray, sr: int) -> np.ndarray:
+    # Same envelope beat_track derives from ``y`` on its own.
+    return librosa.onset.onset_strength(
+      y=y,
+      sr=sr,
+      hop_length=_HOP_LENGTH,
+      aggregate=np.median,
+    )
+
+  def _track_beats(self, onset: np.ndarray, sr: int) -> Tuple[np.ndarray, np.ndarray]:
+    return librosa.beat.beat_track(onset_envelope=onset, sr=sr, hop_length=_HOP_LENGTH)
+
+  def _chroma(self, y: np.ndarray, sr: int) -> np.ndarray:
+    return librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=_HOP_LENGTH)
+
+  def _rms_energy(self, y: np.ndarray) -> np.ndarray:
+    return np.clip(librosa.feature.rms(y=y, hop_length=_HOP_LENGTH)[0], 0.0, 1.0)
+
+  def _spectral_centroid(self, y: np.ndarray, sr: int) -> np.ndarray:
+    return librosa.feature.spectral_centroid(y=y, sr=sr, hop_length=_HOP_LENGTH)[0]
+
+  def _build_timeline(
+    self,
+    beat_track: Tuple[np.ndarray, np.ndarray],
+    energy: np.ndarray,
+    centroid: np.ndarray,
+    sr: int,
+  ) -> messages.AnalysisTimeline:
+    _, beats = beat_track
+    return messages.AnalysisTimeline(
+      frame_rate_hz=sr / _HOP_LENGTH,
+      beat_times=librosa.frames_to_time(beats, sr=sr, hop_length=_HOP_LENGTH),
+      energy_envelope=energy.astype(np.float32),
+      spectral_centroid=centroid.astype(np.float32),
+    )
 
+  def _build_summary(
+    self,
+    beat_track: Tuple[np.ndarray, np.ndarray],
+    energy: np.ndarray,
+    centroid: np.ndarray,
+    timeline: Optional[harmony.HarmonyTimeline],
+    sections: Sequence[messages.SectionBreakdown],
+  ) -> messages.AnalysisSummary:
+    tempo, beats = beat_track
     return messages.AnalysisSummary(
       bpm=round(float(np.atleast_1d(tempo)[0]), 2),
-      energy=round(energy, 3),
-      beat_position=beat_position,
-      spectral_centroid=round(centroid, 2),
-      key=key,
+      energy=round(float(np.mean(energy)), 3),
+      beat_position=self._classify_beat_position(beats),
+      spectral_centroid=round(float(np.mean(centroid)), 2),
+      key=self._estimate_key(timeline, sections),
     )
 
   def _classify_beat_position(self, beats: np.ndarray) -> messages.BeatPosition:
@@ -125,38 +720,50 @@ class AudioAnalysisService(bindings.AudioAnalysisServiceServicer):
       else messages.BeatPosition.OFF_BEAT
     )
 
-  def _estimate_key(self, y: np.ndarray, sr: int) -> messages.KeyEstimate:
-    chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-    profile = np.mean(chroma, axis=1)
-    if np.allclose(profile, 0.0):
-      return messages.KeyEstimate(
-        tonic="C",
-        mode="major",
-        confidence=0.0,
-        chord_progression=["C:I", "C:IV", "C:V", "C:I"],
-      )
-
-    major_scores = self._score_key(profile, _KRUMHANSL_MAJOR)
-    minor_scores = self._score_key(profile, _KRUMHANSL_MINOR)
-    major_best_idx = int(np.argmax(major_scores))
-    minor_best_idx = int(np.argmax(minor_scores))
-    major_best = major_scores[major_best_idx]
-    minor_best = minor_scores[minor_best_idx]
-
+  def _track_harmony(
+    self,
+    chroma: np.ndarray,
+    beat_track: Tuple[np.ndarray, np.ndarray],
+    sr: int,
+  ) -> Optional[harmony.HarmonyTimeline]:
+    _, beats = beat_track
+    if chroma.shape[1] == 0 or np.allclose(np.mean(chroma, axis=1), 0.0):
+      return None
+    return harmony.track_harmony(chroma, beats, frame_seconds=_HOP_LENGTH / sr)
+
+  def _global_key(self, timeline: harmony.HarmonyTimeline) -> Tuple[int, float]:
+    scores = timeline.global_key_scores
+    major_idx = int(np.argmax(scores[:12]))
+    minor_idx = 12 + int(np.argmax(scores[12:]))
+    major_best = float(scores[major_idx])
+    minor_best = float(scores[minor_idx])
     if major_best >= minor_best:
-      tonic = _NOTE_NAMES[major_best_idx]
-      mode = "major"
-      best = major_best
-      alt = minor_best
+      key_idx, best, alt = major_idx, major_best, minor_best
     else:
-      tonic = _NOTE_NAMES[minor_best_idx]
-      mode = "minor"
-      best = minor_best
-      alt = major_best
-
+      key_idx, best, alt = minor_idx, minor_best, major_best
     confidence = float(np.clip(best / (best + alt) if (best + alt) > 0 else 0.0, 0.0, 1.0))
-    progression = self._build_progression(tonic, mode)
+    return key_idx, confidence
 
+  def _estimate_key(
+    self,
+    timeline: Optional[harmony.HarmonyTimeline],
+    sections: Sequence[messages.SectionBreakdown],
+  ) -> messages.KeyEstimate:
+    """Track-level key; the progression holds each section's dominant chord.
+
+    The progression stays aligned with ``sections``: a section without chords
+    gets an empty label.
+    """
+    if timeline is None:
+      return messages.KeyEstimate(tonic="C", mode="major", confidence=0.0)
+
+    key_idx, confidence = self._global_key(timeline)
+    progression = []
+    for section in sections:
+      chords = timeline.chord_path[timeline.span(section.start_sec, section.end_sec)]
+      progression.append(harmony.roman_label(harmony.dominant(chords)[0], key_idx) if chords.size else "")
+
+    tonic, mode = harmony.key_name(key_idx)
     return messages.KeyEstimate(
       tonic=tonic,
       mode=mode,
@@ -164,42 +771,40 @@ class AudioAnalysisService(bindings.AudioAnalysisServiceServicer):
       chord_progression=progression,
     )
 
-  def _score_key(self, chroma: np.ndarray, template: np.ndarray) -> np.ndarray:
-    template_norm = np.linalg.norm(template)
-    chroma_norm = np.linalg.norm(chroma)
-    if template_norm == 0 or chroma_norm == 0:
-      return np.zeros(12, dtype=np.float32)
-
-    normalised_template = template / template_norm
-    chroma_vector = chroma / chroma_norm
-    scores = np.zeros(12, dtype=np.float32)
-    for shift in range(12):
-      rotated_template = np.roll(normalised_template, shift)
-      scores[shift] = float(np.dot(chroma_vector, rotated_template))
-    return scores
-
-  def _build_progression(self, tonic: str, mode: str) -> list[str]:
-    if mode == "major":
-      base = ["I", "IV", "V", "I"]
-    else:
-      base = ["i", "iv", "v", "i"]
-    return [f"{tonic}:{symbol}" for symbol in base]
+  def _section_key(
+    self,
+    timeline: Optional[harmony.HarmonyTimeline],
+    start: float,
+    end: float,
+  ) -> messages.KeyEstimate:
+    if timeline is None:
+      return messages.KeyEstimate()
+    span = timeline.span(start, end)
+    keys = timeline.key_path[span]
+    if keys.size == 0:
+      return messages.KeyEstimate()
+
+    key_idx, share = harmony.dominant(keys)
+    tonic, mode = harmony.key_name(key_idx)
+    return messages.KeyEstimate(
+      tonic=tonic,
+      mode=mode,
+      confidence=round(share, 3),
+      chord_progression=[
+        harmony.roman_label(chord, key_idx) for chord in harmony.collapse(timeline.chord_path[span])
+      ],
+    )
 
-  def _build_sections(self, y: np.ndarray, sr: int) -> Iterable[messages.SectionBreakdown]:
+  def _section_spans(self, y: np.ndarray, sr: int) -> list[_SectionSpan]:
     duration = librosa.get_duration(y=y, sr=sr)
     if math.isclose(duration, 0.0):
-      yield messages.SectionBreakdown(
-        label="full_track",
-        start_sec=0.0,
-        end_sec=0.0,
-        average_energy=0.0,
-      )
-      return
+      return [_SectionSpan(label="full_track", start=0.0, end=0.0, average_energy=0.0)]
 
     segment_count = max(1, min(3, int(duration // 45) + 1))
     edges = np.linspace(0.0, duration, num=segment_count + 1)
     labels = ("intro", "verse", "chorus", "bridge")
 
+    spans = []
     for idx in range(segment_count):
       start = float(edges[idx])
       end = float(edges[idx + 1])
@@ -212,30 +817,81 @@ class AudioAnalysisService(bindings.AudioAnalysisServiceServicer):
         rms_value = 0.0
       else:
         rms_value = float(np.clip(np.mean(librosa.feature.rms(y=segment)[0]), 0.0, 1.0))
+      spans.append(
+        _SectionSpan(label=labels[idx % len(labels)], start=start, end=end, average_energy=rms_value)
+      )
+    return spans
 
-      yield messages.SectionBreakdown(
-        label=labels[idx % len(labels)],
-        start_sec=round(start, 2),
-        end_sec=round(end, 2),
-        average_energy=round(rms_value, 3),
+  def _build_sections(
+    self,
+    spans: Sequence[_SectionSpan],
+    timeline: Optional[harmony.HarmonyTimeline],
+  ) -> list[messages.SectionBreakdown]:
+    return [
+      messages.SectionBreakdown(
+        label=span.label,
+        start_sec=round(span.start, 2),
+        end_sec=round(span.end, 2),
+        average_energy=round(span.average_energy, 3),
+        key=self._section_key(timeline, span.start, span.end),
       )
+      for span in spans
+    ]
 
 
 def build_grpc_server(  # noqa: D401
   servicer: Optional[AudioAnalysisService] = None,
   *,
-  max_workers: int = 4,
+  max_workers: Optional[int] = None,
   port: Optional[int] = None,
+  scheduler: Optional[AnalysisScheduler] = None,
+  max_watchers: int = 32,
+  cpu_budget: Optional[CpuBudget] = None,
+  apply_cpu_budget: bool = False,
 ):
-  """Instantiate a grpc.Server wired with AudioAnalysisService."""
+  """Instantiate a grpc.Server wired with AudioAnalysisService.
+
+  ``max_workers`` is the analysis concurrency; it defaults to what the
+  ``cpu_budget`` allows (:meth:`CpuBudget.detect` in throughput mode when not
+  given). A servicer constructed here runs each analysis's stages on its share
+  of the cores, so in latency mode one request uses all of them. Capping the
+  native thread pools (BLAS, OpenMP) changes process-wide state and only
+  happens with ``apply_cpu_budget``, which ``python -m audio_svc.main serve``
+  passes.
+  When a scheduler is in play the
+  handler pool is widened so queued requests wait in the scheduler (where
+  priority applies) instead of gRPC's FIFO, and calls beyond the scheduler's
+  queue limits are rejected with RESOURCE_EXHAUSTED. ``scheduler`` is only
+  used when the default servicer is constructed here. When the servicer has a
+  job queue, ``max_watchers`` extra handler threads are reserved for
+  long-lived ``WatchAnalysis`` streams.
+  """
   if grpc is None:
     raise RuntimeError("grpcio must be installed to build the audio service server.")
 
-  server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
-  bindings.add_AudioAnalysisServiceServicer_to_server(
-    servicer or AudioAnalysisService(),
-    server,
-  )
+  budget = cpu_budget or CpuBudget.detect()
+  if max_workers is None:
+    max_workers = budget.request_concurrency
+  if apply_cpu_budget:
+    budget.apply(max_workers)
+  if servicer is None:
+    servicer = AudioAnalysisService(
+      scheduler=scheduler or AnalysisScheduler(capacity=max_workers),
+      stage_workers=budget.threads_per_request(max_workers),
+    )
+  active_scheduler = servicer.scheduler
+  watchers = max_watchers if servicer.job_queue is not None else 0
+  if active_scheduler is None:
+    server = grpc.server(
+      futures.ThreadPoolExecutor(max_workers=max_workers + watchers, initializer=inherit_native_limits)
+    )
+  else:
+    handler_threads = active_scheduler.handler_threads + watchers
+    server = grpc.server(
+      futures.ThreadPoolExecutor(max_workers=handler_threads, initializer=inherit_native_limits),
+      maximum_concurrent_rpcs=handler_threads,
+    )
+  bindings.add_AudioAnalysisServiceServicer_to_server(servicer, server)
   if port is not None:
     server.add_insecure_port(f"[::]:{port}")
   return server
@@ -0,0 +1,341 @@
+"""Span-based request tracing for the analysis service.
+
+Incoming calls continue the caller's trace when a W3C ``traceparent`` header
+is present in the gRPC metadata, so a slow play-start in the Fastify/Next.js
+layer can be joined with the analysis it triggered. Every span carries the
+request's ``session_id``. Finished spans are handed to a background thread
+and exported in OTLP/JSON form, either to a JSON-lines file (readable by an
+OpenTelemetry collector's ``otlpjsonfile`` receiver) or to an OTLP/HTTP
+endpoint.
+
+Sampling is decided once per request: calls whose caller already sampled the
+trace are always recorded, others are recorded at ``sample_rate``. Unsampled
+requests get no span objects at all, which keeps overhead negligible at full
+load.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional, Protocol, Sequence, Union
+
+
+LOGGER = logging.getLogger(__name__)
+
+TRACEPARENT_METADATA_KEY = "traceparent"
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_SPAN_KIND_INTERNAL = 1
+_SPAN_KIND_SERVER = 2
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+
+class SpanContext(NamedTuple):
+  trace_id: str
+  span_id: str
+  sampled: bool
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+  """Parse a W3C ``traceparent`` header; malformed values are ignored."""
+  if not value:
+    return None
+  match = _TRACEPARENT.match(value.strip().lower())
+  if match is None:
+    return None
+  trace_id, span_id, flags = match.groups()
+  if trace_id == "0" * 32 or span_id == "0" * 16:
+    return None
+  return SpanContext(trace_id, span_id, bool(int(flags, 16) & 0x01))
+
+
+@dataclass(slots=True)
+class Span:
+  tracer: "Tracer"
+  name: str
+  trace_id: str
+  span_id: str
+  parent_span_id: Optional[str]
+  kind: int = _SPAN_KIND_INTERNAL
+  start_ns: int = field(default_factory=time.time_ns)
+  end_ns: Optional[int] = None
+  attributes: Dict[str, Any] = field(default_factory=dict)
+  error: Optional[str] = None
+
+  @property
+  def traceparent(self) -> str:
+    return f"00-{self.trace_id}-{self.span_id}-01"
+
+  def set_attribute(self, key: str, value: Any) -> None:
+    self.attributes[key] = value
+
+  def child(self, name: str, **attributes: Any) -> "Span":
+    return Span(
+      tracer=self.tracer,
+      name=name,
+      trace_id=self.trace_id,
+      span_id=secrets.token_hex(8),
+      parent_span_id=self.span_id,
+      attributes={**self.tracer.common_attributes(self), **attributes},
+    )
+
+  def record_child(self, name: str, seconds: float, **attributes: Any) -> None:
+    """Record an already finished child span that ended now."""
+    self._record(self.child(name, **attributes), seconds)
+
+  def record_sibling(self, name: str, seconds: float, **attributes: Any) -> None:
+    """Like :meth:`record_child`, but under this span's parent.
+
+    For work done after this span ended, such as encoding its response.
+    """
+    sibling = self.child(name, **attributes)
+    sibling.parent_span_id = self.parent_span_id
+    self._record(sibling, seconds)
+
+  def _record(self, span: "Span", seconds: float) -> None:
+    span.end_ns = time.time_ns()
+    span.start_ns = span.end_ns - int(seconds * 1e9)
+    self.tracer._submit(span)
+
+  def end(self, error: Optional[BaseException] = None) -> None:
+    if self.end_ns is not None:
+      return
+    if error is not None:
+      self.error = f"{type(error).__name__}: {error}"
+    self.end_ns = time.time_ns()
+    self.tracer._submit(self)
+
+  def __enter__(self) -> "Span":
+    return self
+
+  def __exit__(self, exc_type: object, exc: Optional[BaseException], traceback: object) -> None:
+    self.end(exc)
+
+
+@contextmanager
+def child_span(parent: Optional[Span], name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+  """Child of ``parent``, or nothing at all when the request is not sampled."""
+  if parent is None:
+    yield None
+    return
+  with parent.child(name, **attributes) as span:
+    yield span
+
+
+class SpanExporter(Protocol):
+  def export(self, payload: Mapping[str, Any]) -> None: ...
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+  if isinstance(value, bool):
+    return {"boolValue": value}
+  if isinstance(value, int):
+    return {"intValue": str(value)}
+  if isinstance(value, float):
+    return {"doubleValue": value}
+  return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Mapping[str, Any]) -> List[Dict[str, Any]]:
+  return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+  encoded: Dict[str, Any] = {
+    "traceId": span.trace_id,
+    "spanId": span.span_id,
+    "name": span.name,
+    "kind": span.kind,
+    "startTimeUnixNano": str(span.start_ns),
+    "endTimeUnixNano": str(span.end_ns),
+    "attributes": _otlp_attributes(span.attributes),
+    "status": (
+      {"code": _STATUS_ERROR, "message": span.error}
+      if span.error
+      else {"code": _STATUS_OK}
+    ),
+  }
+  if span.parent_span_id:
+    encoded["parentSpanId"] = span.parent_span_id
+  return encoded
+
+
+class JsonLinesSpanExporter:
+  """Append one OTLP/JSON ``ExportTraceServiceRequest`` per line to a file."""
+
+  def __init__(self, path: Union[str, Path]) -> None:
+    self._path = Path(path)
+    self._path.parent.mkdir(parents=True, exist_ok=True)
+
+  def export(self, payload: Mapping[str, Any]) -> None:
+    with self._path.open("a", encoding="utf-8") as handle:
+      handle.write(json.dumps(payload, separators=(",", ":")) + "\n")
+
+
+class OtlpHttpSpanExporter:
+  """POST OTLP/JSON payloads to a collector, e.g. ``http://localhost:4318/v1/traces``."""
+
+  def __init__(self, endpoint: str, *, timeout: float = 5.0) -> None:
+    self._endpoint = endpoint
+    self._timeout = timeout
+
+  def export(self, payload: Mapping[str, Any]) -> None:
+    request = urllib.request.Request(
+      self._endpoint,
+      data=json.dumps(payload).encode("utf-8"),
+      headers={"Content-Type": "application/json"},
+      method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=self._timeout):
+      pass
+
+
+class Tracer:
+  """Creates sampled request spans and exports them off the request path."""
+
+  def __init__(
+    self,
+    exporter: SpanExporter,
+    *,
+    sample_rate: float = 0.01,
+    service_name: str = "audio-svc",
+    max_queue: int = 4096,
+    batch_size: int = 256,
+    flush_interval: float = 2.0,
+  ) -> None:
+    if not 0.0 <= sample_rate <= 1.0:
+      raise ValueError("sample_rate must be between 0.0 and 1.0")
+    self._exporter = exporter
+    self._sample_rate = sample_rate
+    self._resource = {"service.name": service_name}
+    self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+    self._batch_size = batch_size
+    self._flush_interval = flush_interval
+    self._dropped = 0
+    self._dropped_lock = threading.Lock()
+    self._idle = threading.Condition()
+    self._in_flight = 0
+    self._worker = threading.Thread(target=self._export_loop, name="audio-trace-export", daemon=True)
+    self._worker.start()
+
+  @property
+  def dropped_spans(self) -> int:
+    return self._dropped
+
+  def common_attributes(self, span: Span) -> Dict[str, Any]:
+    session_id = span.attributes.get("session.id")
+    return {} if session_id is None else {"session.id": session_id}
+
+  def start_request(
+    self,
+    name: str,
+    *,
+    traceparent: Optional[str] = None,
+    session_id: Optional[str] = None,
+    attributes: Optional[Mapping[str, Any]] = None,
+  ) -> Optional[Span]:
+    """Root span for an incoming request, or ``None`` when not sampled."""
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+      sampled = parent.sampled
+    else:
+      sampled = self._sample_rate > 0.0 and random.random() < self._sample_rate
+    if not sampled:
+      return None
+
+    span_attributes: Dict[str, Any] = {}
+    if session_id:
+      span_attributes["session.id"] = session_id
+    span_attributes.update(attributes or {})
+    return Span(
+      tracer=self,
+      name=name,
+      trace_id=parent.trace_id if parent else secrets.token_hex(16),
+      span_id=secrets.token_hex(8),
+      parent_span_id=parent.span_id if parent else None,
+      kind=_SPAN_KIND_SERVER,
+      attributes=span_attributes,
+    )
+
+  def flush(self, timeout: float = 5.0) -> bool:
+    """Block until every submitted span has been exported."""
+    with self._idle:
+      return self._idle.wait_for(
+        lambda: self._queue.unfinished_tasks == 0 and self._in_flight == 0,
+        timeout=timeout,
+      )
+
+  def shutdown(self, timeout: float = 5.0) -> None:
+    self.flush(timeout)
+    self._queue.put(None)
+    self._worker.join(timeout)
+
+  def _submit(self, span: Span) -> None:
+    try:
+      self._queue.put_nowait(span)
+    except queue.Full:
+      # Request threads submit concurrently.
+      with self._dropped_lock:
+        self._dropped += 1
+
+  def _payload(self, spans: Sequence[Span]) -> Dict[str, Any]:
+    return {
+      "resourceSpans": [
+        {
+          "resource": {"attributes": _otlp_attributes(self._resource)},
+          "scopeSpans": [
+            {
+              "scope": {"name": "audio_svc"},
+              "spans": [_otlp_span(span) for span in spans],
+            }
+          ],
+        }
+      ]
+    }
+
+  def _export_loop(self) -> None:
+    while True:
+      batch: List[Span] = []
+      try:
+        first = self._queue.get(timeout=self._flush_interval)
+      except queue.Empty:
+        continue
+      with self._idle:
+        self._in_flight += 1
+      stop = first is None
+      if first is not None:
+        batch.append(first)
+      self._queue.task_done()
+      while not stop and len(batch) < self._batch_size:
+        try:
+          span = self._queue.get_nowait()
+        except queue.Empty:
+          break
+        self._queue.task_done()
+        if span is None:
+          stop = True
+        else:
+          batch.append(span)
+      try:
+        if batch:
+          self._exporter.export(self._payload(batch))
+      except Exception:  # noqa: BLE001 - tracing must never break the service
+        LOGGER.warning("Span export failed; dropping %d spans", len(batch), exc_info=True)
+      finally:
+        with self._idle:
+          self._in_flight -= 1
+          self._idle.notify_all()
+      if stop:
+        return
@@ -4,8 +4,10 @@
 // @ts-nocheck
 
 import {
+  AnalysisJob,
   AnalyzeTrackRequest,
   AnalyzeTrackResponse,
+  GetAnalysisStatusRequest,
 } from "./audio_analysis_pb.ts";
 import { MethodKind } from "@bufbuild/protobuf";
 
@@ -26,5 +28,40 @@ export const AudioAnalysisService = {
       O: AnalyzeTrackResponse,
       kind: MethodKind.Unary,
     },
+    /**
+     * Queues an analysis and returns immediately. Submitting a source that is
+     * already queued, running or analysed returns the existing job.
+     *
+     * @generated from rpc playasul.audio.v1.AudioAnalysisService.SubmitAnalysis
+     */
+    submitAnalysis: {
+      name: "SubmitAnalysis",
+      I: AnalyzeTrackRequest,
+      O: AnalysisJob,
+      kind: MethodKind.Unary,
+    },
+    /**
+     * Current state of a submitted job.
+     *
+     * @generated from rpc playasul.audio.v1.AudioAnalysisService.GetAnalysisStatus
+     */
+    getAnalysisStatus: {
+      name: "GetAnalysisStatus",
+      I: GetAnalysisStatusRequest,
+      O: AnalysisJob,
+      kind: MethodKind.Unary,
+    },
+    /**
+     * Streams the job's state on every change until it succeeds or fails.
+     * Reconnecting clients simply watch the same job_id again.
+     *
+     * @generated from rpc playasul.audio.v1.AudioAnalysisService.WatchAnalysis
+     */
+    watchAnalysis: {
+      name: "WatchAnalysis",
+      I: GetAnalysisStatusRequest,
+      O: AnalysisJob,
+      kind: MethodKind.ServerStreaming,
+    },
   },
 } as const;
@@ -13,6 +13,40 @@ import type {
 } from "@bufbuild/protobuf";
 import { Message, proto3 } from "@bufbuild/protobuf";
 
+/**
+ * @generated from enum playasul.audio.v1.AnalysisPriority
+ */
+export enum AnalysisPriority {
+  /**
+   * @generated from enum value: ANALYSIS_PRIORITY_UNSPECIFIED = 0;
+   */
+  ANALYSIS_PRIORITY_UNSPECIFIED = 0,
+
+  /**
+   * A player is waiting on the result (play-start path).
+   *
+   * @generated from enum value: INTERACTIVE = 1;
+   */
+  INTERACTIVE = 1,
+
+  /**
+   * Bulk work such as catalog warmup; uses spare capacity only.
+   *
+   * @generated from enum value: BACKGROUND = 2;
+   */
+  BACKGROUND = 2,
+}
+// Retrieve enum metadata with: proto3.getEnumType(AnalysisPriority)
+proto3.util.setEnumType(
+  AnalysisPriority,
+  "playasul.audio.v1.AnalysisPriority",
+  [
+    { no: 0, name: "ANALYSIS_PRIORITY_UNSPECIFIED" },
+    { no: 1, name: "INTERACTIVE" },
+    { no: 2, name: "BACKGROUND" },
+  ],
+);
+
 /**
  * @generated from enum playasul.audio.v1.BeatPosition
  */
@@ -39,6 +73,56 @@ proto3.util.setEnumType(BeatPosition, "playasul.audio.v1.BeatPosition", [
   { no: 2, name: "OFF_BEAT" },
 ]);
 
+/**
+ * @generated from enum playasul.audio.v1.AnalysisJobStatus
+ */
+export enum AnalysisJobStatus {
+  /**
+   * @generated from enum value: ANALYSIS_JOB_STATUS_UNSPECIFIED = 0;
+   */
+  ANALYSIS_JOB_STATUS_UNSPECIFIED = 0,
+
+  /**
+   * Waiting for a worker.
+   *
+   * @generated from enum value: QUEUED = 1;
+   */
+  QUEUED = 1,
+
+  /**
+   * Claimed by a worker and being analysed.
+   *
+   * @generated from enum value: RUNNING = 2;
+   */
+  RUNNING = 2,
+
+  /**
+   * Finished; the result is attached.
+   *
+   * @generated from enum value: SUCCEEDED = 3;
+   */
+  SUCCEEDED = 3,
+
+  /**
+   * Gave up after the retry budget; see error.
+   *
+   * @generated from enum value: FAILED = 4;
+   */
+  FAILED = 4,
+}
+// Retrieve enum metadata with: proto3.getEnumType(AnalysisJobStatus)
+proto3.util.setEnumType(
+  AnalysisJobStatus,
+  "playasul.audio.v1.AnalysisJobStatus",
+  [
+    { no: 0, name: "ANALYSIS_JOB_STATUS_UNSPECIFIED" },
+    { no: 1, name: "QUEUED" },
+    { no: 2, name: "RUNNING" },
+    { no: 3, name: "SUCCEEDED" },
+    { no: 4, name: "FAILED" },
+  ],
+);
+
 /**
  * Audio analysis contract for US-005 Dynamic Visual FX.
  *
@@ -59,6 +143,21 @@ export class AnalyzeTrackRequest extends Message<AnalyzeTrackRequest> {
    */
   sessionId = "";
 
+  /**
+   * Scheduling class; unspecified is treated as INTERACTIVE.
+   *
+   * @generated from field: playasul.audio.v1.AnalysisPriority priority = 3;
+   */
+  priority = AnalysisPriority.ANALYSIS_PRIORITY_UNSPECIFIED;
+
+  /**
+   * Also return the frame-level timeline, which is much larger than the
+   * summary and sections.
+   *
+   * @generated from field: bool include_timeline = 4;
+   */
+  includeTimeline = false;
+
   constructor(data?: PartialMessage<AnalyzeTrackRequest>) {
     super();
     proto3.util.initPartial(data, this);
@@ -69,6 +168,13 @@ export class AnalyzeTrackRequest extends Message<AnalyzeTrackRequest> {
   static readonly fields: FieldList = proto3.util.newFieldList(() => [
     { no: 1, name: "audio_url", kind: "scalar", T: 9 /* ScalarType.STRING */ },
     { no: 2, name: "session_id", kind: "scalar", T: 9 /* ScalarType.STRING */ },
+    {
+      no: 3,
+      name: "priority",
+      kind: "enum",
+      T: proto3.getEnumType(AnalysisPriority),
+    },
+    { no: 4, name: "include_timeline", kind: "scalar", T: 8 /* ScalarType.BOOL */ },
   ]);
 
   static fromBinary(
@@ -118,6 +224,14 @@ export class AnalyzeTrackResponse extends Message<AnalyzeTrackResponse> {
    */
   sections: SectionBreakdown[] = [];
 
+  /**
+   * Frame-level curves for driving visuals between section boundaries.
+   * Only set when the request sets include_timeline.
+   *
+   * @generated from field: playasul.audio.v1.AnalysisTimeline timeline = 3;
+   */
+  timeline?: AnalysisTimeline;
+
   constructor(data?: PartialMessage<AnalyzeTrackResponse>) {
     super();
     proto3.util.initPartial(data, this);
@@ -134,6 +248,7 @@ export class AnalyzeTrackResponse extends Message<AnalyzeTrackResponse> {
       T: SectionBreakdown,
       repeated: true,
     },
+    { no: 3, name: "timeline", kind: "message", T: AnalysisTimeline },
   ]);
 
   static fromBinary(
@@ -165,6 +280,104 @@ export class AnalyzeTrackResponse extends Message<AnalyzeTrackResponse> {
   }
 }
 
+/**
+ * @generated from message playasul.audio.v1.AnalysisTimeline
+ */
+export class AnalysisTimeline extends Message<AnalysisTimeline> {
+  /**
+   * Frames per second of energy_envelope and spectral_centroid.
+   *
+   * @generated from field: double frame_rate_hz = 1;
+   */
+  frameRateHz = 0;
+
+  /**
+   * Detected beat onsets in seconds from the beginning of the track.
+   *
+   * @generated from field: repeated double beat_times = 2;
+   */
+  beatTimes: number[] = [];
+
+  /**
+   * Per-frame RMS energy (0-1 normalized).
+   *
+   * @generated from field: repeated float energy_envelope = 3;
+   */
+  energyEnvelope: number[] = [];
+
+  /**
+   * Per-frame spectral centroid in Hz.
+   *
+   * @generated from field: repeated float spectral_centroid = 4;
+   */
+  spectralCentroid: number[] = [];
+
+  constructor(data?: PartialMessage<AnalysisTimeline>) {
+    super();
+    proto3.util.initPartial(data, this);
+  }
+
+  static readonly runtime: typeof proto3 = proto3;
+  static readonly typeName = "playasul.audio.v1.AnalysisTimeline";
+  static readonly fields: FieldList = proto3.util.newFieldList(() => [
+    {
+      no: 1,
+      name: "frame_rate_hz",
+      kind: "scalar",
+      T: 1 /* ScalarType.DOUBLE */,
+    },
+    {
+      no: 2,
+      name: "beat_times",
+      kind: "scalar",
+      T: 1 /* ScalarType.DOUBLE */,
+      repeated: true,
+    },
+    {
+      no: 3,
+      name: "energy_envelope",
+      kind: "scalar",
+      T: 2 /* ScalarType.FLOAT */,
+      repeated: true,
+    },
+    {
+      no: 4,
+      name: "spectral_centroid",
+      kind: "scalar",
+      T: 2 /* ScalarType.FLOAT */,
+      repeated: true,
+    },
+  ]);
+
+  static fromBinary(
+    bytes: Uint8Array,
+    options?: Partial<BinaryReadOptions>,
+  ): AnalysisTimeline {
+    return new AnalysisTimeline().fromBinary(bytes, options);
+  }
+
+  static fromJson(
+    jsonValue: JsonValue,
+    options?: Partial<JsonReadOptions>,
+  ): AnalysisTimeline {
+    return new AnalysisTimeline().fromJson(jsonValue, options);
+  }
+
+  static fromJsonString(
+    jsonString: string,
+    options?: Partial<JsonReadOptions>,
+  ): AnalysisTimeline {
+    return new AnalysisTimeline().fromJsonString(jsonString, options);
+  }
+
+  static equals(
+    a: AnalysisTimeline | PlainMessage<AnalysisTimeline> | undefined,
+    b: AnalysisTimeline | PlainMessage<AnalysisTimeline> | undefined,
+  ): boolean {
+    return proto3.util.equals(AnalysisTimeline, a, b);
+  }
+}
+
 /**
  * @generated from message playasul.audio.v1.AnalysisSummary
  */
@@ -284,7 +497,10 @@ export class KeyEstimate extends Message<KeyEstimate> {
   confidence = 0;
 
   /**
-   * Optional chord progression labels aligned to detected segments.
+   * Chord labels relative to the tonic ("<tonic>:<numeral>", e.g. "C:IV").
+   * On the track summary: the dominant chord of each section, aligned to
+   * AnalyzeTrackResponse.sections. On a section: the smoothed beat-level
+   * progression within that section.
    *
    * @generated from field: repeated string chord_progression = 4;
    */
@@ -371,6 +587,13 @@ export class SectionBreakdown extends Message<SectionBreakdown> {
    */
   averageEnergy = 0;
 
+  /**
+   * Local key and chord progression tracked within this section.
+   *
+   * @generated from field: playasul.audio.v1.KeyEstimate key = 5;
+   */
+  key?: KeyEstimate;
+
   constructor(data?: PartialMessage<SectionBreakdown>) {
     super();
     proto3.util.initPartial(data, this);
@@ -388,6 +611,7 @@ export class SectionBreakdown extends Message<SectionBreakdown> {
       kind: "scalar",
       T: 1 /* ScalarType.DOUBLE */,
     },
+    { no: 5, name: "key", kind: "message", T: KeyEstimate },
   ]);
 
   static fromBinary(
@@ -418,3 +642,138 @@ export class SectionBreakdown extends Message<SectionBreakdown> {
     return proto3.util.equals(SectionBreakdown, a, b);
   }
 }
+
+/**
+ * @generated from message playasul.audio.v1.AnalysisJob
+ */
+export class AnalysisJob extends Message<AnalysisJob> {
+  /**
+   * Opaque identifier for GetAnalysisStatus and WatchAnalysis.
+   *
+   * @generated from field: string job_id = 1;
+   */
+  jobId = "";
+
+  /**
+   * @generated from field: playasul.audio.v1.AnalysisJobStatus status = 2;
+   */
+  status = AnalysisJobStatus.ANALYSIS_JOB_STATUS_UNSPECIFIED;
+
+  /**
+   * Audio resource the job analyses.
+   *
+   * @generated from field: string audio_url = 3;
+   */
+  audioUrl = "";
+
+  /**
+   * Analysis output, set once status is SUCCEEDED.
+   *
+   * @generated from field: playasul.audio.v1.AnalyzeTrackResponse result = 4;
+   */
+  result?: AnalyzeTrackResponse;
+
+  /**
+   * Failure description, set once status is FAILED.
+   *
+   * @generated from field: string error = 5;
+   */
+  error = "";
+
+  constructor(data?: PartialMessage<AnalysisJob>) {
+    super();
+    proto3.util.initPartial(data, this);
+  }
+
+  static readonly runtime: typeof proto3 = proto3;
+  static readonly typeName = "playasul.audio.v1.AnalysisJob";
+  static readonly fields: FieldList = proto3.util.newFieldList(() => [
+    { no: 1, name: "job_id", kind: "scalar", T: 9 /* ScalarType.STRING */ },
+    {
+      no: 2,
+      name: "status",
+      kind: "enum",
+      T: proto3.getEnumType(AnalysisJobStatus),
+    },
+    { no: 3, name: "audio_url", kind: "scalar", T: 9 /* ScalarType.STRING */ },
+    { no: 4, name: "result", kind: "message", T: AnalyzeTrackResponse },
+    { no: 5, name: "error", kind: "scalar", T: 9 /* ScalarType.STRING */ },
+  ]);
+
+  static fromBinary(
+    bytes: Uint8Array,
+    options?: Partial<BinaryReadOptions>,
+  ): AnalysisJob {
+    return new AnalysisJob().fromBinary(bytes, options);
+  }
+
+  static fromJson(
+    jsonValue: JsonValue,
+    options?: Partial<JsonReadOptions>,
+  ): AnalysisJob {
+    return new AnalysisJob().fromJson(jsonValue, options);
+  }
+
+  static fromJsonString(
+    jsonString: string,
+    options?: Partial<JsonReadOptions>,
+  ): AnalysisJob {
+    return new AnalysisJob().fromJsonString(jsonString, options);
+  }
+
+  static equals(
+    a: AnalysisJob | PlainMessage<AnalysisJob> | undefined,
+    b: AnalysisJob | PlainMessage<AnalysisJob> | undefined,
+  ): boolean {
+    return proto3.util.equals(AnalysisJob, a, b);
+  }
+}
+
+/**
+ * @generated from message playasul.audio.v1.GetAnalysisStatusRequest
+ */
+export class GetAnalysisStatusRequest extends Message<GetAnalysisStatusRequest> {
+  /**
+   * @generated from field: string job_id = 1;
+   */
+  jobId = "";
+
+  constructor(data?: PartialMessage<GetAnalysisStatusRequest>) {
+    super();
+    proto3.util.initPartial(data, this);
+  }
+
+  static readonly runtime: typeof proto3 = proto3;
+  static readonly typeName = "playasul.audio.v1.GetAnalysisStatusRequest";
+  static readonly fields: FieldList = proto3.util.newFieldList(() => [
+    { no: 1, name: "job_id", kind: "scalar", T: 9 /* ScalarType.STRING */ },
+  ]);
+
+  static fromBinary(
+    bytes: Uint8Array,
+    options?: Partial<BinaryReadOptions>,
+  ): GetAnalysisStatusRequest {
+    return new GetAnalysisStatusRequest().fromBinary(bytes, options);
+  }
+
+  static fromJson(
+    jsonValue: JsonValue,
+    options?: Partial<JsonReadOptions>,
+  ): GetAnalysisStatusRequest {
+    return new GetAnalysisStatusRequest().fromJson(jsonValue, options);
+  }
+
+  static fromJsonString(
+    jsonString: string,
+    options?: Partial<JsonReadOptions>,
+  ): GetAnalysisStatusRequest {
+    return new GetAnalysisStatusRequest().fromJsonString(jsonString, options);
+  }
+
+  static equals(
+    a: GetAnalysisStatusRequest | PlainMessage<GetAnalysisStatusRequest> | undefined,
+    b: GetAnalysisStatusRequest | PlainMessage<GetAnalysisStatusRequest> | undefined,
+  ): boolean {
+    return proto3.util.equals(GetAnalysisStatusRequest, a, b);
+  }
+}
@@ -40,10 +40,15 @@ export function createAudioAnalysisClient(
 }
 
 export {
+  AnalysisJob,
+  AnalysisJobStatus,
+  AnalysisPriority,
   AnalyzeTrackRequest,
   AnalyzeTrackResponse,
   AnalysisSummary,
+  AnalysisTimeline,
   BeatPosition,
+  GetAnalysisStatusRequest,
   KeyEstimate,
   SectionBreakdown,
 } from "../gen/audio/audio_analysis_pb.ts";
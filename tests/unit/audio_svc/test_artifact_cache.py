@@ -0,0 +1,78 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from audio_svc.artifact_cache import DirectoryArtifactCache, content_key
+
+
+class DirectoryArtifactCacheTests(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmp.cleanup)
+    self.cache = DirectoryArtifactCache(Path(self._tmp.name) / "artifacts")
+
+  def test_round_trip_preserves_arrays(self) -> None:
+    key = content_key("onset", "1", "abc")
+    envelope = np.linspace(0.0, 1.0, 1000, dtype=np.float32)
+    self.cache.put(key, (120.0, envelope))
+
+    tempo, restored = self.cache.get(key)
+    self.assertEqual(tempo, 120.0)
+    np.testing.assert_array_equal(restored, envelope)
+    # Protocol 5 pickles store the raw buffer plus a small header.
+    (path,) = self.cache.root.rglob("*.pkl")
+    self.assertLess(path.stat().st_size, envelope.nbytes + 512)
+
+  def test_missing_and_corrupt_entries_are_misses(self) -> None:
+    key = content_key("chroma", "1", "abc")
+    with self.assertRaises(KeyError):
+      self.cache.get(key)
+
+    self.cache.put(key, [1, 2, 3])
+    (path,) = self.cache.root.rglob("*.pkl")
+    path.write_bytes(b"\x80\x05truncated")
+    with self.assertRaises(KeyError):
+      self.cache.get(key)
+    self.assertFalse(path.exists())
+
+  def test_failed_write_leaves_no_files_behind(self) -> None:
+    key = content_key("labels", "1", "abc")
+    with self.assertRaises(Exception):
+      self.cache.put(key, lambda: None)  # Lambdas cannot be pickled.
+    self.assertEqual(list(self.cache.root.rglob("*.*")), [])
+    with self.assertRaises(KeyError):
+      self.cache.get(key)
+
+  def test_least_recently_used_entries_are_evicted_over_the_cap(self) -> None:
+    entry = np.zeros(1000, dtype=np.uint8)
+    self.cache.put("size-probe", entry)
+    (probe,) = self.cache.root.rglob("*.pkl")
+    # Room for three entries, even after pruning below the cap.
+    cap = int(probe.stat().st_size * 3.7)
+    cache = DirectoryArtifactCache(Path(self._tmp.name) / "capped", max_bytes=cap)
+    keys = [content_key("onset", "1", str(index)) for index in range(3)]
+    for age, key in zip((30, 20, 10), keys):
+      cache.put(key, entry)
+      path = cache.root / key[:2] / f"{key}.pkl"
+      os.utime(path, (time.time() - age, time.time() - age))
+    cache.get(keys[0])  # Now the most recently used.
+
+    cache.put(content_key("onset", "1", "3"), entry)
+
+    with self.assertRaises(KeyError):
+      cache.get(keys[1])
+    for key in (keys[0], keys[2]):
+      np.testing.assert_array_equal(cache.get(key), entry)
+    self.assertLessEqual(sum(path.stat().st_size for path in cache.root.rglob("*.pkl")), cap)
+
+  def test_content_key_separates_chunk_boundaries(self) -> None:
+    self.assertNotEqual(content_key("ab", "c"), content_key("a", "bc"))
+    self.assertEqual(content_key(b"ab", "c"), content_key("ab", b"c"))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from audio_svc import cpu_budget
+from audio_svc.cpu_budget import BudgetMode, CpuBudget, available_cpus, cgroup_cpu_limit
+
+
+class CgroupDetectionTests(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmp.cleanup)
+    self.root = Path(self._tmp.name) / "cgroup"
+    self.proc = Path(self._tmp.name) / "proc-self-cgroup"
+
+  def _write(self, relative: str, content: str) -> None:
+    path = self.root / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content + "\n", encoding="utf-8")
+
+  def test_v2_takes_tightest_quota_along_the_hierarchy(self) -> None:
+    self.proc.write_text("0::/kubepods/pod1/app\n", encoding="utf-8")
+    self._write("cgroup.controllers", "cpu memory")
+    self._write("kubepods/cpu.max", "800000 100000")
+    self._write("kubepods/pod1/cpu.max", "250000 100000")
+    self._write("kubepods/pod1/app/cpu.max", "max 100000")
+
+    self.assertEqual(cgroup_cpu_limit(self.root, self.proc), 2.5)
+    with mock.patch.object(cpu_budget, "_affinity_cpus", return_value=16):
+      self.assertEqual(available_cpus(self.root, self.proc), 2)
+
+  def test_v1_quota_in_container_mounted_at_hierarchy_root(self) -> None:
+    self.proc.write_text("4:cpu,cpuacct:/docker/abc123\n2:memory:/docker/abc123\n", encoding="utf-8")
+    self._write("cpu,cpuacct/cpu.cfs_quota_us", "150000")
+    self._write("cpu,cpuacct/cpu.cfs_period_us", "100000")
+
+    self.assertEqual(cgroup_cpu_limit(self.root, self.proc), 1.5)
+    with mock.patch.object(cpu_budget, "_affinity_cpus", return_value=8):
+      # A fractional quota never rounds up to a throttled extra thread.
+      self.assertEqual(available_cpus(self.root, self.proc), 1)
+
+  def test_unlimited_quota_falls_back_to_affinity(self) -> None:
+    self.proc.write_text("1:cpu:/\n0::/\n", encoding="utf-8")
+    self._write("cpu/cpu.cfs_quota_us", "-1")
+    self._write("cpu/cpu.cfs_period_us", "100000")
+
+    self.assertIsNone(cgroup_cpu_limit(self.root, self.proc))
+    with mock.patch.object(cpu_budget, "_affinity_cpus", return_value=3):
+      self.assertEqual(available_cpus(self.root, self.proc), 3)
+
+
+class CpuBudgetTests(unittest.TestCase):
+  def test_modes_split_cores_between_requests_and_native_threads(self) -> None:
+    throughput = CpuBudget(8)
+    latency = CpuBudget(8, "latency")
+
+    self.assertEqual((throughput.request_concurrency, throughput.threads_per_request()), (8, 1))
+    self.assertEqual(latency.mode, BudgetMode.LATENCY)
+    self.assertEqual((latency.request_concurrency, latency.threads_per_request()), (1, 8))
+    self.assertEqual(throughput.threads_per_request(3), 2)
+    with self.assertRaises(ValueError):
+      CpuBudget(4, "fastest")
+
+  def test_apply_limits_native_pools_and_child_environment(self) -> None:
+    with (
+      mock.patch.dict(os.environ),
+      mock.patch.object(cpu_budget, "_native_threads", None),
+      mock.patch.object(cpu_budget, "threadpoolctl") as ctl,
+    ):
+      threads = CpuBudget(4, BudgetMode.LATENCY).apply(concurrency=2)
+
+      self.assertEqual(threads, 2)
+      self.assertEqual(os.environ["OPENBLAS_NUM_THREADS"], "2")
+      self.assertEqual(os.environ["NUMBA_NUM_THREADS"], "2")
+      ctl.threadpool_limits.assert_called_once_with(limits=2)
+
+  def test_worker_threads_inherit_the_openmp_limit(self) -> None:
+    with (
+      mock.patch.object(cpu_budget, "_native_threads", None),
+      mock.patch.object(cpu_budget, "threadpoolctl") as ctl,
+    ):
+      cpu_budget.inherit_native_limits()
+      ctl.threadpool_limits.assert_not_called()
+
+      with mock.patch.dict(os.environ):
+        cpu_budget.limit_native_threads(3)
+      ctl.threadpool_limits.reset_mock()
+      cpu_budget.inherit_native_limits()
+      ctl.threadpool_limits.assert_called_once_with(limits=3, user_api="openmp")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,178 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+try:
+  import librosa
+except ModuleNotFoundError:  # pragma: no cover - environment guard
+  librosa = None  # type: ignore[assignment]
+
+from audio_svc.fingerprint import (
+  FRAME_SECONDS,
+  Fingerprint,
+  FingerprintIndex,
+  compute_fingerprint,
+  preview_signal,
+)
+
+
+def _melody(seed: int, seconds: float = 24.0, sr: int = 22050) -> np.ndarray:
+  """Random note sequence; distinct seeds give unrelated recordings."""
+  rng = np.random.default_rng(seed)
+  t = np.arange(int(0.25 * sr)) / sr
+  window = np.hanning(t.size)
+  notes = [
+    (np.sin(2 * np.pi * freq * t) + 0.5 * np.sin(2 * np.pi * 2.01 * freq * t)) * window
+    for freq in rng.uniform(110, 1500, int(seconds * 4))
+  ]
+  return (0.3 * np.concatenate(notes)).astype(np.float32)
+
+
+class FingerprintTests(unittest.TestCase):
+  def setUp(self) -> None:
+    if librosa is None:
+      self.skipTest("librosa is required for fingerprint tests")
+    self.sr = 22050
+    self.index = FingerprintIndex()
+    for seed in range(5):
+      self.index.add(f"https://cdn/{seed}.mp3", self._fingerprint(_melody(seed), self.sr))
+
+  def _fingerprint(self, y: np.ndarray, sr: int) -> Fingerprint:
+    return compute_fingerprint(preview_signal(y, sr))
+
+  def test_re_encoded_copy_matches_original(self) -> None:
+    original = _melody(3)
+    noise = 0.01 * np.random.default_rng(0).standard_normal(original.size * 2)
+    copy = 0.5 * librosa.resample(original, orig_sr=self.sr, target_sr=44100) + noise
+
+    match = self.index.lookup(self._fingerprint(copy.astype(np.float32), 44100))
+
+    self.assertIsNotNone(match)
+    self.assertEqual(match.source, "https://cdn/3.mp3")
+    self.assertAlmostEqual(match.offset_seconds, 0.0, delta=FRAME_SECONDS)
+
+  def test_match_reports_time_offset_of_copy(self) -> None:
+    original = _melody(1)
+    padded = np.concatenate((np.zeros(int(2.5 * self.sr), dtype=np.float32), original))
+    trimmed = original[3 * self.sr :]
+
+    later = self.index.lookup(self._fingerprint(padded, self.sr))
+    earlier = self.index.lookup(self._fingerprint(trimmed, self.sr))
+
+    self.assertEqual(later.source, "https://cdn/1.mp3")
+    self.assertAlmostEqual(later.offset_seconds, 2.5, delta=2 * FRAME_SECONDS)
+    self.assertEqual(earlier.source, "https://cdn/1.mp3")
+    self.assertAlmostEqual(earlier.offset_seconds, -3.0, delta=2 * FRAME_SECONDS)
+
+  def test_unrelated_audio_and_silence_do_not_match(self) -> None:
+    self.assertIsNone(self.index.lookup(self._fingerprint(_melody(99), self.sr)))
+    silence = self._fingerprint(np.zeros(10 * self.sr, dtype=np.float32), self.sr)
+    self.assertEqual(len(silence), 0)
+    self.assertIsNone(self.index.lookup(silence))
+    self.assertFalse(self.index.add("https://cdn/silence.mp3", silence))
+
+  def test_each_source_is_indexed_once(self) -> None:
+    postings = self.index.postings
+    self.assertFalse(self.index.add("https://cdn/0.mp3", self._fingerprint(_melody(7), self.sr)))
+    self.assertEqual(self.index.postings, postings)
+    self.assertEqual(len(self.index), 5)
+
+
+class FingerprintIndexPersistenceTests(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmp.cleanup)
+    self.directory = Path(self._tmp.name) / "fingerprints"
+    rng = np.random.default_rng(0)
+    self.fingerprints = [
+      Fingerprint(
+        rng.integers(0, 1 << 24, 300, dtype=np.uint32),
+        np.sort(rng.integers(0, 600, 300)).astype(np.uint16),
+      )
+      for _ in range(40)
+    ]
+
+  def test_journal_and_snapshot_survive_reopen(self) -> None:
+    index = FingerprintIndex(self.directory)
+    for track, fingerprint in enumerate(self.fingerprints[:30]):
+      index.add(f"track-{track}", fingerprint)
+    index.compact()
+    for track, fingerprint in enumerate(self.fingerprints[30:], start=30):
+      index.add(f"track-{track}", fingerprint)
+
+    reopened = FingerprintIndex(self.directory)
+
+    self.assertEqual(len(reopened), 40)
+    self.assertEqual(reopened.postings, index.postings)
+    for track in (0, 29, 35):
+      self.assertEqual(reopened.lookup(self.fingerprints[track]).source, f"track-{track}")
+
+  def test_compaction_keeps_tracks_added_by_other_instances(self) -> None:
+    first = FingerprintIndex(self.directory)
+    second = FingerprintIndex(self.directory)
+    first.add("from-first", self.fingerprints[0])
+    second.add("from-second", self.fingerprints[1])
+
+    first.compact()
+    second.add("after-compact", self.fingerprints[2])
+    second.compact()
+
+    reopened = FingerprintIndex(self.directory)
+    self.assertEqual(len(reopened), 3)
+    for track, source in enumerate(("from-first", "from-second", "after-compact")):
+      self.assertEqual(reopened.lookup(self.fingerprints[track]).source, source)
+
+  def test_torn_journal_record_is_cut_off_before_new_records(self) -> None:
+    index = FingerprintIndex(self.directory)
+    index.add("kept", self.fingerprints[0])
+    index.add("torn", self.fingerprints[1])
+    journal = self.directory / "journal.bin"
+    journal.write_bytes(journal.read_bytes()[:-10])
+
+    with self.assertLogs("audio_svc.fingerprint", level="WARNING"):
+      reopened = FingerprintIndex(self.directory)
+    self.assertIn("kept", reopened)
+    self.assertNotIn("torn", reopened)
+
+    reopened.add("later", self.fingerprints[2])
+    reopened.add("torn", self.fingerprints[1])
+    again = FingerprintIndex(self.directory)
+    self.assertEqual(len(again), 3)
+    for track, source in enumerate(("kept", "torn", "later")):
+      self.assertEqual(again.lookup(self.fingerprints[track]).source, source)
+
+  def test_lookup_sees_tracks_added_by_other_instances(self) -> None:
+    first = FingerprintIndex(self.directory)
+    second = FingerprintIndex(self.directory)
+    first.add("from-first", self.fingerprints[0])
+    self.assertEqual(second.lookup(self.fingerprints[0]).source, "from-first")
+
+    first.compact()
+    first.add("after-compact", self.fingerprints[1])
+    self.assertEqual(second.lookup(self.fingerprints[1]).source, "after-compact")
+    self.assertFalse(second.add("from-first", self.fingerprints[0]))
+    self.assertEqual(len(second), 2)
+
+  def test_journal_is_compacted_once_it_outgrows_the_limit(self) -> None:
+    index = FingerprintIndex(self.directory, max_journal_bytes=4096)
+    for track, fingerprint in enumerate(self.fingerprints[:10]):
+      index.add(f"track-{track}", fingerprint)
+      self.assertLessEqual((self.directory / "journal.bin").stat().st_size, 4096)
+
+    reopened = FingerprintIndex(self.directory)
+    self.assertEqual(len(reopened), 10)
+    self.assertEqual(reopened.postings, index.postings)
+
+  def test_lookup_spans_merged_and_recent_segments(self) -> None:
+    index = FingerprintIndex()
+    for track, fingerprint in enumerate(self.fingerprints):
+      index.add(f"track-{track}", fingerprint)
+      self.assertEqual(index.lookup(fingerprint).source, f"track-{track}")
+    for track, fingerprint in enumerate(self.fingerprints):
+      self.assertEqual(index.lookup(fingerprint).source, f"track-{track}")
+
+
+if __name__ == "__main__":  # pragma: no cover
+  unittest.main()
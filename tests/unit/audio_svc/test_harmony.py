@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+
+from audio_svc import harmony
+
+
+def _triad_chroma(root: int, minor: bool = False) -> np.ndarray:
+  column = np.full(12, 0.05, dtype=np.float32)
+  column[[root % 12, (root + (3 if minor else 4)) % 12, (root + 7) % 12]] = 1.0
+  return column
+
+
+class HarmonyTests(unittest.TestCase):
+  def test_key_bank_matches_rotated_profiles(self) -> None:
+    profile = np.random.default_rng(7).random(12).astype(np.float32)
+    scores = harmony.template_scores(harmony.KEY_PROFILES, profile[:, None])[:, 0]
+
+    unit_profile = profile / np.linalg.norm(profile)
+    template = harmony.KRUMHANSL_MINOR / np.linalg.norm(harmony.KRUMHANSL_MINOR)
+    for tonic in range(12):
+      expected = float(np.dot(unit_profile, np.roll(template, tonic)))
+      self.assertAlmostEqual(float(scores[12 + tonic]), expected, places=5)
+
+  def test_track_harmony_recovers_progression_and_smooths_blips(self) -> None:
+    # C - F - G - Am, four beats each, with a one-beat glitch inside the F bar.
+    chords = [(0, False)] * 4 + [(5, False)] * 4 + [(7, False)] * 4 + [(9, True)] * 4
+    columns = [_triad_chroma(root, minor) for root, minor in chords]
+    columns[6] = _triad_chroma(1)
+    frames_per_beat = 10
+    chroma = np.repeat(np.stack(columns, axis=1), frames_per_beat, axis=1)
+    beats = np.arange(0, chroma.shape[1], frames_per_beat)
+
+    timeline = harmony.track_harmony(chroma, beats, frame_seconds=0.05)
+
+    labels = [harmony.roman_label(chord, 0) for chord in harmony.collapse(timeline.chord_path)]
+    self.assertEqual(labels, ["C:I", "C:IV", "C:V", "C:vi"])
+    self.assertEqual(harmony.key_name(harmony.dominant(timeline.key_path)[0]), ("C", "major"))
+    self.assertEqual(timeline.boundaries_sec[-1], chroma.shape[1] * 0.05)
+
+    second_bar = timeline.span(2.0, 4.0)
+    self.assertEqual(set(timeline.chord_path[second_bar].tolist()), {5})
+
+  def test_roman_label_handles_minor_and_borrowed_chords(self) -> None:
+    a_minor = 12 + 9
+    self.assertEqual(harmony.roman_label(a_minor, a_minor), "A:i")
+    self.assertEqual(harmony.roman_label(0, a_minor), "A:bIII")
+    self.assertEqual(harmony.roman_label(10, 0), "C:bVII")
+
+  def test_viterbi_handles_empty_and_flat_emissions(self) -> None:
+    emissions = np.zeros((24, 0))
+    self.assertEqual(harmony.viterbi(emissions, 0.9).size, 0)
+    path = harmony.viterbi(np.log(np.full((24, 5), 1 / 24)), 0.9)
+    self.assertEqual(path.shape, (5,))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,199 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+try:
+  import librosa
+except ModuleNotFoundError:  # pragma: no cover - environment guard
+  librosa = None  # type: ignore[assignment]
+
+from audio_svc.jobs import AnalysisWorker, SqliteJobQueue
+from audio_svc.proto import (
+  AnalysisJobStatus,
+  AnalysisPriority,
+  AnalyzeTrackRequest,
+  GetAnalysisStatusRequest,
+)
+from audio_svc.result_store import SqliteResultStore
+
+
+def _request(url: str, priority: AnalysisPriority = AnalysisPriority.INTERACTIVE) -> AnalyzeTrackRequest:
+  return AnalyzeTrackRequest(audio_url=url, priority=priority)
+
+
+class SqliteJobQueueTests(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmp.cleanup)
+    self.path = Path(self._tmp.name) / "jobs.sqlite3"
+    self.queue = SqliteJobQueue(self.path, max_attempts=2, poll_interval=0.05)
+    self.addCleanup(self.queue.close)
+
+  def test_submit_returns_live_job_for_the_same_source(self) -> None:
+    first = self.queue.submit(_request("a"), "3")
+    self.assertEqual(self.queue.submit(_request("a"), "3").job_id, first.job_id)
+    self.assertNotEqual(self.queue.submit(_request("a"), "4").job_id, first.job_id)
+
+    self.queue.claim("w", lease_seconds=60)
+    self.assertTrue(self.queue.complete(first.job_id, "w"))
+    self.assertEqual(self.queue.submit(_request("a"), "3", result_stored=True).job_id, first.job_id)
+
+  def test_finished_job_whose_result_is_missing_is_queued_again(self) -> None:
+    job = self.queue.submit(_request("a"), "3")
+    self.queue.claim("w", lease_seconds=60)
+    self.queue.complete(job.job_id, "w")
+
+    requeued = self.queue.submit(_request("a"), "3", result_stored=False)
+    self.assertEqual((requeued.job_id, requeued.status), (job.job_id, AnalysisJobStatus.QUEUED))
+    self.assertEqual(self.queue.get(job.job_id), requeued)
+    self.assertEqual(self.queue.claim("w", lease_seconds=60).attempts, 1)
+
+  def test_queued_job_with_a_stored_result_finishes_without_running(self) -> None:
+    job = self.queue.submit(_request("a"), "3")
+    finished = self.queue.submit(_request("a"), "3", result_stored=True)
+    self.assertEqual((finished.job_id, finished.status), (job.job_id, AnalysisJobStatus.SUCCEEDED))
+    self.assertIsNone(self.queue.claim("w", lease_seconds=60))
+
+  def test_interactive_jobs_are_claimed_before_background_jobs(self) -> None:
+    background = self.queue.submit(_request("bulk", AnalysisPriority.BACKGROUND), "3")
+    later = self.queue.submit(_request("bulk-2", AnalysisPriority.BACKGROUND), "3")
+    interactive = self.queue.submit(_request("play"), "3")
+
+    self.assertEqual(self.queue.claim("w", lease_seconds=60).job_id, interactive.job_id)
+    # An interactive submit for a queued background source promotes it.
+    self.queue.submit(_request("bulk-2"), "3")
+    self.assertEqual(self.queue.claim("w", lease_seconds=60).job_id, later.job_id)
+    self.assertEqual(self.queue.claim("w", lease_seconds=60).job_id, background.job_id)
+    self.assertIsNone(self.queue.claim("w", lease_seconds=60))
+
+  def test_failed_attempts_are_retried_until_the_budget_is_spent(self) -> None:
+    job = self.queue.submit(_request("a"), "3")
+    self.queue.claim("w", lease_seconds=60)
+    retried = self.queue.fail(job.job_id, "w", "RuntimeError: flaky")
+    self.assertEqual((retried.status, retried.attempts), (AnalysisJobStatus.QUEUED, 1))
+
+    self.queue.claim("w", lease_seconds=60)
+    failed = self.queue.fail(job.job_id, "w", "RuntimeError: still broken")
+    self.assertEqual(failed.status, AnalysisJobStatus.FAILED)
+    self.assertEqual(failed.error, "RuntimeError: still broken")
+    # A failed source can be submitted again as a new job.
+    self.assertNotEqual(self.queue.submit(_request("a"), "3").job_id, job.job_id)
+
+  def test_expired_leases_are_reclaimed_and_jobs_survive_reopening(self) -> None:
+    job = self.queue.submit(_request("a"), "3")
+    self.assertEqual(self.queue.claim("crashed", lease_seconds=-1).job_id, job.job_id)
+
+    reopened = SqliteJobQueue(self.path, max_attempts=2)
+    self.addCleanup(reopened.close)
+    reclaimed = reopened.claim("w", lease_seconds=60)
+    self.assertEqual((reclaimed.job_id, reclaimed.attempts), (job.job_id, 2))
+    self.assertIsNone(reopened.claim("w", lease_seconds=60))
+
+  def test_worker_that_lost_its_lease_cannot_finish_the_job(self) -> None:
+    job = self.queue.submit(_request("a"), "3")
+    self.queue.claim("slow", lease_seconds=-1)
+    self.queue.claim("w", lease_seconds=60)
+
+    self.assertFalse(self.queue.complete(job.job_id, "slow"))
+    self.assertIsNone(self.queue.fail(job.job_id, "slow", "RuntimeError: too late"))
+    current = self.queue.get(job.job_id)
+    self.assertEqual((current.status, current.error), (AnalysisJobStatus.RUNNING, ""))
+
+    self.assertTrue(self.queue.complete(job.job_id, "w"))
+    self.assertEqual(self.queue.get(job.job_id).status, AnalysisJobStatus.SUCCEEDED)
+    self.assertFalse(self.queue.complete(job.job_id, "w"))
+
+  def test_wait_for_update_wakes_on_state_change(self) -> None:
+    job = self.queue.submit(_request("a"), "3")
+    timer = threading.Timer(0.1, lambda: self.queue.claim("w", lease_seconds=60))
+    timer.start()
+    self.addCleanup(timer.cancel)
+
+    started = time.monotonic()
+    updated = self.queue.wait_for_update(job.job_id, job.revision, timeout=5.0)
+    self.assertEqual(updated.status, AnalysisJobStatus.RUNNING)
+    self.assertLess(time.monotonic() - started, 2.0)
+    self.assertEqual(self.queue.wait_for_update(job.job_id, updated.revision, timeout=0.1), updated)
+
+
+class AsyncAnalysisTests(unittest.TestCase):
+  def setUp(self) -> None:
+    if librosa is None:
+      self.skipTest("librosa is required for AudioAnalysisService tests")
+    from audio_svc.server import AudioAnalysisService
+
+    self._tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmp.cleanup)
+    root = Path(self._tmp.name)
+    self.store = SqliteResultStore(root / "results.sqlite3")
+    self.addCleanup(self.store.close)
+    self.queue = SqliteJobQueue(root / "jobs.sqlite3", max_attempts=1, poll_interval=0.05)
+    self.addCleanup(self.queue.close)
+
+    sr = 22050
+    waveform = librosa.clicks(times=np.arange(0, 4.0, 0.5), sr=sr, length=4 * sr)
+
+    def load(url: str):
+      if url.endswith("broken.wav"):
+        raise RuntimeError("failed to fetch audio payload")
+      return waveform, sr
+
+    self.service = AudioAnalysisService(
+      audio_loader=load,
+      result_store=self.store,
+      job_queue=self.queue,
+      watch_interval=0.5,
+    )
+    self.worker = AnalysisWorker(self.service, self.queue, poll_interval=0.05)
+
+  def test_submitted_job_is_analysed_by_a_worker(self) -> None:
+    request = AnalyzeTrackRequest(audio_url="memory://track.wav", session_id="S1")
+    submitted = self.service.SubmitAnalysis(request)  # noqa: N802
+    self.assertEqual(submitted.status, AnalysisJobStatus.QUEUED)
+    self.assertIsNone(submitted.result)
+
+    lookup = GetAnalysisStatusRequest(job_id=submitted.job_id)
+    watch = self.service.WatchAnalysis(lookup)  # noqa: N802
+    self.assertEqual(next(watch).status, AnalysisJobStatus.QUEUED)
+
+    self.worker.start()
+    self.addCleanup(self.worker.stop)
+    statuses = [job.status for job in watch]
+    self.assertEqual(statuses[-1], AnalysisJobStatus.SUCCEEDED)
+
+    done = self.service.GetAnalysisStatus(lookup)  # noqa: N802
+    self.assertEqual(done.result, self.service.AnalyzeTrack(request))  # noqa: N802
+    # Resubmitting an analysed source returns the finished job.
+    resubmitted = self.service.SubmitAnalysis(request)  # noqa: N802
+    self.assertEqual(resubmitted.job_id, submitted.job_id)
+    self.assertEqual(resubmitted.status, AnalysisJobStatus.SUCCEEDED)
+    self.assertEqual(resubmitted.result, done.result)
+
+  def test_failed_job_reports_error(self) -> None:
+    submitted = self.service.SubmitAnalysis(  # noqa: N802
+      AnalyzeTrackRequest(audio_url="memory://broken.wav"),
+    )
+    self.assertTrue(self.worker.run_once())
+    job = self.service.GetAnalysisStatus(GetAnalysisStatusRequest(job_id=submitted.job_id))  # noqa: N802
+    self.assertEqual(job.status, AnalysisJobStatus.FAILED)
+    self.assertIn("failed to fetch audio payload", job.error)
+    self.assertFalse(self.worker.run_once())
+
+  def test_unknown_job_aborts_with_not_found(self) -> None:
+    from audio_svc.server import grpc
+
+    if grpc is None:
+      self.skipTest("grpcio is required for status codes")
+    context = mock.Mock()
+    with self.assertRaises(LookupError):
+      self.service.GetAnalysisStatus(GetAnalysisStatusRequest(job_id="nope"), context)  # noqa: N802
+    self.assertEqual(context.abort.call_args[0][0].name, "NOT_FOUND")
+
+
+if __name__ == "__main__":
+  unittest.main()
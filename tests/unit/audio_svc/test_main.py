@@ -0,0 +1,98 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+try:
+  import librosa
+  import soundfile
+except ModuleNotFoundError:  # pragma: no cover - environment guard
+  librosa = None  # type: ignore[assignment]
+  soundfile = None  # type: ignore[assignment]
+
+from audio_svc.main import CatalogProgress, main, precompute_catalog, read_manifest
+from audio_svc.result_store import SqliteResultStore
+from audio_svc.server import ANALYSIS_VERSION
+
+
+class ReadManifestTests(unittest.TestCase):
+  def test_skips_comments_and_normalises_local_paths(self) -> None:
+    sources = read_manifest(
+      [
+        "# catalog warmup\n",
+        "https://cdn.example/a.mp3\n",
+        "\n",
+        "/srv/audio/b.wav\n",
+        "https://cdn.example/a.mp3\n",
+      ]
+    )
+    self.assertEqual(sources, ["https://cdn.example/a.mp3", "file:///srv/audio/b.wav"])
+
+
+class PrecomputeCatalogTests(unittest.TestCase):
+  def setUp(self) -> None:
+    if librosa is None:
+      self.skipTest("librosa and soundfile are required for catalog precompute tests")
+    self._tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmp.cleanup)
+    root = Path(self._tmp.name)
+
+    sr = 22050
+    times = np.arange(0, 4.0, 0.5)
+    waveform = librosa.clicks(times=times, sr=sr, length=4 * sr)
+    track = root / "track.wav"
+    soundfile.write(track, waveform, sr)
+
+    self.sources = read_manifest([str(track), str(root / "missing.wav")])
+    self.store = SqliteResultStore(root / "results.sqlite3")
+    self.addCleanup(self.store.close)
+    self.checkpoint = root / "progress.jsonl"
+
+  def test_precompute_writes_results_and_resumes_from_checkpoint(self) -> None:
+    progress = CatalogProgress(self.checkpoint)
+    report = precompute_catalog(self.sources, self.store, progress, workers=1)
+    progress.close()
+
+    self.assertEqual((report.analysed, report.failed, report.skipped), (1, 1, 0))
+    self.assertAlmostEqual(report.audio_seconds, 4.0, places=2)
+    self.assertGreater(report.audio_seconds_per_cpu_second, 0.0)
+    self.assertIsNotNone(self.store.get(self.sources[0], ANALYSIS_VERSION))
+
+    resumed = CatalogProgress(self.checkpoint)
+    second = precompute_catalog(self.sources, self.store, resumed, workers=1)
+    resumed.close()
+
+    self.assertEqual((second.analysed, second.failed, second.skipped), (0, 1, 1))
+
+  def test_version_bump_reanalyses_checkpointed_tracks(self) -> None:
+    progress = CatalogProgress(self.checkpoint)
+    precompute_catalog(self.sources[:1], self.store, progress, workers=1)
+    progress.close()
+
+    with mock.patch("audio_svc.main.ANALYSIS_VERSION", "next"):
+      resumed = CatalogProgress(self.checkpoint)
+      report = precompute_catalog(self.sources[:1], self.store, resumed, workers=1)
+      resumed.close()
+
+    self.assertEqual((report.analysed, report.skipped), (1, 0))
+    self.assertIsNotNone(self.store.get(self.sources[0], "next"))
+
+
+class ServeCommandTests(unittest.TestCase):
+  def test_serve_applies_the_cpu_budget(self) -> None:
+    if librosa is None:
+      self.skipTest("librosa is required to construct the service")
+    with mock.patch("audio_svc.main.build_grpc_server") as build:
+      build.return_value.wait_for_termination.side_effect = KeyboardInterrupt
+      self.assertEqual(main(["serve", "--port", "0", "--cpu-mode", "latency"]), 0)
+
+    _, kwargs = build.call_args
+    self.assertTrue(kwargs["apply_cpu_budget"])
+    self.assertEqual(kwargs["max_workers"], 1)
+    build.return_value.stop.assert_called_once()
+
+
+if __name__ == "__main__":
+  unittest.main()
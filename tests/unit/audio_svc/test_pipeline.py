@@ -0,0 +1,157 @@
+import threading
+import time
+import unittest
+from concurrent import futures
+
+from audio_svc.pipeline import Stage, StageGraph
+
+
+class _MemoryCache:
+  def __init__(self) -> None:
+    self.entries = {}
+
+  def get(self, key):
+    return self.entries[key]
+
+  def put(self, key, value) -> None:
+    self.entries[key] = value
+
+
+class StageGraphTests(unittest.TestCase):
+  def test_stages_are_ordered_by_dependencies(self) -> None:
+    graph = StageGraph(
+      (
+        Stage("total", ("double", "square"), lambda a, b: a + b),
+        Stage("double", ("x",), lambda x: 2 * x),
+        Stage("square", ("x",), lambda x: x * x),
+      ),
+      sources=("x",),
+    )
+    self.assertEqual([stage.name for stage in graph.stages], ["double", "square", "total"])
+
+    calls = []
+    artifacts = graph.run({"x": 3}, checkpoint=lambda: calls.append(None))
+    self.assertEqual(artifacts["total"], 15)
+    # Not after the last stage: there is nothing left to pause before.
+    self.assertEqual(len(calls), 2)
+
+  def test_independent_stages_overlap_on_an_executor(self) -> None:
+    barrier = threading.Barrier(2, timeout=2.0)
+
+    def meet(value: int) -> int:
+      # Deadlocks (and times out) unless both branches run at the same time.
+      barrier.wait()
+      return value
+
+    graph = StageGraph(
+      (
+        Stage("left", ("x",), meet),
+        Stage("right", ("x",), meet),
+        Stage("both", ("left", "right"), lambda a, b: (a, b)),
+      ),
+      sources=("x",),
+    )
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+      artifacts = graph.run({"x": 1}, executor=executor)
+    self.assertEqual(artifacts["both"], (1, 1))
+
+  def test_executor_checkpoints_only_with_no_stage_in_flight(self) -> None:
+    lock = threading.Lock()
+    in_flight = [0]
+    right_done = threading.Event()
+
+    def tracked(compute):
+      def run(*args):
+        with lock:
+          in_flight[0] += 1
+        try:
+          return compute(*args)
+        finally:
+          with lock:
+            in_flight[0] -= 1
+
+      return run
+
+    def slow(x: int) -> int:
+      right_done.wait(2.0)
+      time.sleep(0.05)
+      return x
+
+    def fast(x: int) -> int:
+      right_done.set()
+      return x
+
+    graph = StageGraph(
+      (
+        Stage("left", ("x",), tracked(slow)),
+        Stage("right", ("x",), tracked(fast)),
+        Stage("both", ("left", "right"), tracked(lambda a, b: a + b)),
+      ),
+      sources=("x",),
+    )
+    observed = []
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+      artifacts = graph.run({"x": 2}, executor=executor, checkpoint=lambda: observed.append(in_flight[0]))
+    self.assertEqual(artifacts["both"], 4)
+    self.assertEqual(observed, [0])
+
+  def test_cached_stages_are_reused_until_their_version_changes(self) -> None:
+    def graph(label_version: str) -> StageGraph:
+      return StageGraph(
+        (
+          Stage("decoded", ("audio",), lambda audio: audio * 10, persist=False),
+          Stage("features", ("decoded",), lambda y: y + 1),
+          Stage("labels", ("features",), lambda f: f"L{f}", version=label_version),
+          Stage("report", ("features", "labels"), lambda f, label: (f, label)),
+        ),
+        sources=("audio",),
+      )
+
+    cache = _MemoryCache()
+    computed = []
+    observe = lambda name, seconds: computed.append(name)  # noqa: E731
+
+    first = graph("1").run({"audio": 4}, observer=observe, cache=cache, source_keys={"audio": "k4"})
+    self.assertEqual(first["report"], (41, "L41"))
+    self.assertEqual(computed, ["decoded", "features", "labels", "report"])
+    self.assertEqual(len(cache.entries), 3)
+
+    computed.clear()
+    again = graph("1").run({"audio": 4}, observer=observe, cache=cache, source_keys={"audio": "k4"})
+    self.assertEqual(again["report"], (41, "L41"))
+    self.assertEqual(computed, [])
+
+    # A new labelling version recomputes it and its dependents from cached
+    # features, without re-decoding the audio.
+    computed.clear()
+    bumped = graph("2").run({"audio": 4}, observer=observe, cache=cache, source_keys={"audio": "k4"})
+    self.assertEqual(bumped["report"], (41, "L41"))
+    self.assertEqual(computed, ["labels", "report"])
+
+    # Different content gets different keys.
+    computed.clear()
+    graph("2").run({"audio": 5}, observer=observe, cache=cache, source_keys={"audio": "k5"})
+    self.assertEqual(computed, ["decoded", "features", "labels", "report"])
+
+  def test_outputs_limit_the_stages_that_run(self) -> None:
+    graph = StageGraph(
+      (
+        Stage("a", ("x",), lambda x: x + 1),
+        Stage("b", ("x",), lambda x: 1 / 0),
+      ),
+      sources=("x",),
+    )
+    self.assertEqual(graph.run({"x": 1}, outputs=("a",)), {"x": 1, "a": 2})
+    with self.assertRaisesRegex(ValueError, "unknown pipeline outputs"):
+      graph.run({"x": 1}, outputs=("c",))
+
+  def test_unresolvable_inputs_are_rejected(self) -> None:
+    with self.assertRaisesRegex(ValueError, "cannot be resolved"):
+      StageGraph((Stage("a", ("missing",), lambda value: value),), sources=("x",))
+    graph = StageGraph((Stage("a", ("x",), lambda value: value),), sources=("x",))
+    with self.assertRaisesRegex(ValueError, "missing pipeline sources"):
+      graph.run({})
+
+
+if __name__ == "__main__":
+  unittest.main()
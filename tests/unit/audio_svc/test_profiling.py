@@ -0,0 +1,64 @@
+import json
+import pstats
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from audio_svc.profiling import RequestProfiler
+
+
+class RequestProfilerTests(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmp.cleanup)
+    self.directory = Path(self._tmp.name) / "profiles"
+
+  def test_unrequested_and_unsampled_requests_are_not_captured(self) -> None:
+    profiler = RequestProfiler(self.directory, sample_rate=0.0)
+    self.assertIsNone(profiler.begin("S1"))
+    self.assertEqual(list(self.directory.iterdir()), [])
+
+  def test_capture_writes_profile_and_stage_summary(self) -> None:
+    profiler = RequestProfiler(self.directory)
+    capture = profiler.begin("session/42", requested=True)
+    self.assertIsNotNone(capture)
+    # Only one capture may run at a time.
+    self.assertIsNone(profiler.begin("other", requested=True))
+
+    payload = [bytearray(1 << 20) for _ in range(4)]
+    capture.record_stage("chroma", 0.25)
+    capture.record_stage("chroma", 0.5)
+    del payload
+    summary_path = capture.finish()
+
+    self.assertIn("session_42", summary_path.name)
+    summary = json.loads(summary_path.read_text())
+    self.assertEqual(summary["session_id"], "session/42")
+    self.assertEqual(summary["stage_seconds"], {"chroma": 0.75})
+    self.assertGreaterEqual(summary["peak_traced_memory_bytes"], 4 << 20)
+    self.assertEqual(summary["profiled_threads"], "all" if sys.version_info >= (3, 12) else "request")
+    pstats.Stats(str(summary_path.with_suffix(".pstats")))
+    self.assertIsNotNone(profiler.begin("next", requested=True).finish())
+
+  def test_directory_is_bounded(self) -> None:
+    profiler = RequestProfiler(self.directory, max_captures=2)
+    for index in range(4):
+      profiler.begin(f"S{index}", requested=True).finish()
+    self.assertEqual(len(list(self.directory.glob("*.json"))), 2)
+    self.assertEqual(len(list(self.directory.glob("*.pstats"))), 2)
+    self.assertTrue(any("S3" in path.name for path in self.directory.glob("*.json")))
+
+  def test_pruning_leaves_other_files_alone(self) -> None:
+    self.directory.mkdir(parents=True)
+    unrelated = self.directory / "0-settings.json"
+    unrelated.write_text("{}", encoding="utf-8")
+    profiler = RequestProfiler(self.directory, max_captures=1)
+    for index in range(3):
+      profiler.begin(f"S{index}", requested=True).finish()
+    self.assertTrue(unrelated.exists())
+    self.assertEqual(len(list(self.directory.glob("*.pstats"))), 1)
+
+
+if __name__ == "__main__":
+  unittest.main()
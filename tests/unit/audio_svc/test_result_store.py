@@ -0,0 +1,45 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from audio_svc.proto import (
+  AnalysisSummary,
+  AnalyzeTrackResponse,
+  BeatPosition,
+  KeyEstimate,
+  SectionBreakdown,
+)
+from audio_svc.result_store import SqliteResultStore
+
+
+class SqliteResultStoreTests(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmp.cleanup)
+    self.store = SqliteResultStore(Path(self._tmp.name) / "results.sqlite3")
+    self.addCleanup(self.store.close)
+    self.response = AnalyzeTrackResponse(
+      summary=AnalysisSummary(
+        bpm=128.0,
+        energy=0.42,
+        beat_position=BeatPosition.ON_BEAT,
+        spectral_centroid=1800.5,
+        key=KeyEstimate(tonic="A", mode="minor", confidence=0.7, chord_progression=["A:i"]),
+      ),
+      sections=[SectionBreakdown(label="intro", start_sec=0.0, end_sec=12.5, average_energy=0.2)],
+    )
+
+  def test_round_trip_preserves_response(self) -> None:
+    self.store.put("https://cdn.example/a.mp3", "1", self.response)
+    restored = self.store.get("https://cdn.example/a.mp3", "1")
+    self.assertEqual(restored, self.response)
+    self.assertIsInstance(restored.summary.beat_position, BeatPosition)
+
+  def test_entries_are_scoped_by_analysis_version(self) -> None:
+    self.store.put("https://cdn.example/a.mp3", "1", self.response)
+    self.assertIsNone(self.store.get("https://cdn.example/a.mp3", "2"))
+    self.assertIsNone(self.store.get("https://cdn.example/b.mp3", "1"))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,147 @@
+import threading
+import time
+import unittest
+
+from audio_svc.pipeline import Stage, StageGraph
+from audio_svc.proto import AnalysisPriority
+from audio_svc.scheduling import (
+  AnalysisScheduler,
+  ClassQuota,
+  SchedulerSaturatedError,
+  priority_from_name,
+)
+
+
+def _wait_until(predicate, timeout: float = 2.0) -> None:
+  deadline = time.monotonic() + timeout
+  while not predicate():
+    if time.monotonic() > deadline:
+      raise AssertionError("condition not reached before timeout")
+    time.sleep(0.005)
+
+
+class AnalysisSchedulerTests(unittest.TestCase):
+  def test_background_quota_leaves_headroom_for_interactive(self) -> None:
+    scheduler = AnalysisScheduler(capacity=2)
+    release = threading.Event()
+    started: list[str] = []
+
+    def run(priority: AnalysisPriority, name: str) -> None:
+      with scheduler.admit(priority):
+        started.append(name)
+        release.wait(timeout=2.0)
+
+    threads = [
+      threading.Thread(target=run, args=(AnalysisPriority.BACKGROUND, "bg-1")),
+      threading.Thread(target=run, args=(AnalysisPriority.BACKGROUND, "bg-2")),
+    ]
+    for thread in threads:
+      thread.start()
+    _wait_until(lambda: scheduler.queue_depth()["background"] == 1 and len(started) == 1)
+
+    interactive = threading.Thread(target=run, args=(AnalysisPriority.INTERACTIVE, "ui"))
+    interactive.start()
+    _wait_until(lambda: "ui" in started)
+    self.assertEqual(scheduler.snapshot().running, {"interactive": 1, "background": 1})
+
+    release.set()
+    for thread in [*threads, interactive]:
+      thread.join(timeout=2.0)
+    self.assertEqual(len(started), 3)
+
+  def test_background_yields_at_checkpoint_when_interactive_waits(self) -> None:
+    scheduler = AnalysisScheduler(
+      capacity=1,
+      quotas={AnalysisPriority.BACKGROUND: ClassQuota(max_concurrent=1)},
+    )
+    order: list[str] = []
+    background_started = threading.Event()
+    proceed = threading.Event()
+
+    def background() -> None:
+      with scheduler.admit(AnalysisPriority.BACKGROUND) as slot:
+        order.append("bg-stage-1")
+        background_started.set()
+        proceed.wait(timeout=2.0)
+        slot.checkpoint()
+        order.append("bg-stage-2")
+
+    def interactive() -> None:
+      with scheduler.admit(AnalysisPriority.INTERACTIVE):
+        order.append("ui")
+
+    bg_thread = threading.Thread(target=background)
+    bg_thread.start()
+    background_started.wait(timeout=2.0)
+    ui_thread = threading.Thread(target=interactive)
+    ui_thread.start()
+    _wait_until(lambda: scheduler.queue_depth()["interactive"] == 1)
+    proceed.set()
+    bg_thread.join(timeout=2.0)
+    ui_thread.join(timeout=2.0)
+
+    self.assertEqual(order, ["bg-stage-1", "ui", "bg-stage-2"])
+    self.assertEqual(scheduler.snapshot().preemptions, 1)
+
+  def test_background_does_not_yield_after_its_last_stage(self) -> None:
+    scheduler = AnalysisScheduler(
+      capacity=1,
+      quotas={AnalysisPriority.BACKGROUND: ClassQuota(max_concurrent=1)},
+    )
+    order: list[str] = []
+    last_stage_started = threading.Event()
+    proceed = threading.Event()
+
+    def last_stage(value: int) -> int:
+      last_stage_started.set()
+      proceed.wait(timeout=2.0)
+      return value
+
+    graph = StageGraph((Stage("only", ("x",), last_stage),), sources=("x",))
+
+    def background() -> None:
+      with scheduler.admit(AnalysisPriority.BACKGROUND) as slot:
+        graph.run({"x": 1}, checkpoint=slot.checkpoint)
+        order.append("bg-done")
+
+    def interactive() -> None:
+      with scheduler.admit(AnalysisPriority.INTERACTIVE):
+        order.append("ui")
+
+    bg_thread = threading.Thread(target=background)
+    bg_thread.start()
+    last_stage_started.wait(timeout=2.0)
+    ui_thread = threading.Thread(target=interactive)
+    ui_thread.start()
+    _wait_until(lambda: scheduler.queue_depth()["interactive"] == 1)
+    proceed.set()
+    bg_thread.join(timeout=2.0)
+    ui_thread.join(timeout=2.0)
+
+    self.assertEqual(order, ["bg-done", "ui"])
+    self.assertEqual(scheduler.snapshot().preemptions, 0)
+
+  def test_full_queue_is_rejected(self) -> None:
+    scheduler = AnalysisScheduler(
+      capacity=1,
+      quotas={AnalysisPriority.BACKGROUND: ClassQuota(max_concurrent=1, max_queued=0)},
+    )
+    # An idle scheduler admits even with no queue allowance...
+    with scheduler.admit(AnalysisPriority.BACKGROUND):
+      # ...but a request that would have to wait is rejected.
+      with self.assertRaises(SchedulerSaturatedError):
+        with scheduler.admit(AnalysisPriority.BACKGROUND):
+          pass
+      self.assertEqual(scheduler.queue_depth()["background"], 0)
+    with scheduler.admit(AnalysisPriority.BACKGROUND):
+      pass
+
+  def test_priority_from_name(self) -> None:
+    self.assertEqual(priority_from_name(None), AnalysisPriority.INTERACTIVE)
+    self.assertEqual(priority_from_name("Background"), AnalysisPriority.BACKGROUND)
+    with self.assertRaisesRegex(ValueError, "unknown analysis priority"):
+      priority_from_name("urgent")
+
+
+if __name__ == "__main__":
+  unittest.main()
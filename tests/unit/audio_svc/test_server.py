@@ -1,4 +1,8 @@
+import dataclasses
+import json
+import tempfile
 import unittest
+from pathlib import Path
 from unittest import mock
 
 import numpy as np
@@ -8,8 +12,24 @@ try:
 except ModuleNotFoundError:  # pragma: no cover - environment guard
   librosa = None  # type: ignore[assignment]
 
-from audio_svc import AudioAnalysisService, build_grpc_server
-from audio_svc.proto import AnalyzeTrackRequest, BeatPosition
+from audio_svc import AnalysisScheduler, AudioAnalysisService, build_grpc_server
+from audio_svc.artifact_cache import DirectoryArtifactCache
+from audio_svc.cpu_budget import BudgetMode, CpuBudget
+from audio_svc.fingerprint import FingerprintIndex
+from audio_svc.pipeline import StageGraph
+from audio_svc.profiling import RequestProfiler
+from audio_svc.result_store import SqliteResultStore
+from audio_svc.tracing import Tracer
+from audio_svc import harmony
+from audio_svc.proto import (
+  AnalysisPriority,
+  AnalysisSummary,
+  AnalyzeTrackRequest,
+  AnalyzeTrackResponse,
+  BeatPosition,
+  SectionBreakdown,
+)
+from audio_svc.server import ANALYSIS_VERSION, _shift_response, grpc
 
 
 class AudioAnalysisServiceTests(unittest.TestCase):
@@ -49,6 +69,287 @@ class AudioAnalysisServiceTests(unittest.TestCase):
     self.assertGreater(total_duration, 0.0)
     for section in sections:
       self.assertGreaterEqual(section.average_energy, 0.0)
+      self.assertIn(section.key.mode, ("major", "minor"))
+    self.assertEqual(len(response.summary.key.chord_progression), len(sections))
+
+  def test_track_progression_stays_aligned_with_sections_without_chords(self) -> None:
+    timeline = harmony.HarmonyTimeline(
+      boundaries_sec=np.array([0.0, 1.0, 2.0, 3.0]),
+      key_path=np.zeros(3, dtype=np.int64),
+      chord_path=np.array([0, 0, 5]),
+      global_key_scores=np.eye(24)[0],
+    )
+    sections = [
+      SectionBreakdown(label="intro", start_sec=0.0, end_sec=3.0),
+      SectionBreakdown(label="outro", start_sec=3.0, end_sec=9.0),
+    ]
+
+    key = self.service._estimate_key(timeline, sections)
+    self.assertEqual(len(key.chord_progression), 2)
+    self.assertNotEqual(key.chord_progression[0], "")
+    self.assertEqual(key.chord_progression[1], "")
+
+    response = AnalyzeTrackResponse(summary=AnalysisSummary(key=key), sections=sections)
+    shifted = _shift_response(response, -4.0)
+    self.assertEqual([section.label for section in shifted.sections], ["outro"])
+    self.assertEqual(shifted.summary.key.chord_progression, [""])
+
+  def test_timeline_carries_frame_curves_and_beat_times(self) -> None:
+    request = dataclasses.replace(self.request, include_timeline=True)
+    timeline = self.service.AnalyzeTrack(request).timeline  # noqa: N802
+    self.assertAlmostEqual(timeline.frame_rate_hz, self.sr / 512)
+    self.assertEqual(timeline.energy_envelope.dtype, np.float32)
+    self.assertEqual(timeline.energy_envelope.shape, timeline.spectral_centroid.shape)
+    self.assertAlmostEqual(
+      timeline.energy_envelope.size / timeline.frame_rate_hz,
+      self.waveform.size / self.sr,
+      delta=0.1,
+    )
+    self.assertTrue(np.all(np.diff(timeline.beat_times) > 0))
+
+  def test_timeline_is_only_computed_and_stored_on_request(self) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+      store = SqliteResultStore(Path(directory) / "results.sqlite3")
+      self.addCleanup(store.close)
+      service = AudioAnalysisService(audio_loader=self.loader, result_store=store)
+      plain = service.AnalyzeTrack(self.request)  # noqa: N802
+      self.assertIsNone(plain.timeline)
+      self.assertIsNone(store.get(self.sample_url, ANALYSIS_VERSION).timeline)
+
+      # A stored result without the timeline is recomputed for a request that
+      # wants one, and the fuller result replaces it.
+      with_timeline = service.AnalyzeTrack(  # noqa: N802
+        dataclasses.replace(self.request, include_timeline=True)
+      )
+      self.assertGreater(with_timeline.timeline.energy_envelope.size, 0)
+      self.assertEqual(store.get(self.sample_url, ANALYSIS_VERSION), with_timeline)
+      with mock.patch.object(StageGraph, "run", side_effect=AssertionError("pipeline ran")):
+        self.assertEqual(service.AnalyzeTrack(self.request), plain)  # noqa: N802
+
+  def test_parallel_stages_match_sequential_results(self) -> None:
+    parallel = AudioAnalysisService(audio_loader=self.loader, stage_workers=3)
+    self.assertEqual(
+      parallel.AnalyzeTrack(self.request),  # noqa: N802
+      self.service.AnalyzeTrack(self.request),  # noqa: N802
+    )
+
+  def test_artifact_cache_recomputes_only_changed_stages(self) -> None:
+    try:
+      import soundfile
+    except ModuleNotFoundError:  # pragma: no cover - environment guard
+      self.skipTest("soundfile is required to exercise the decode stage")
+    exported = []
+    tracer = Tracer(mock.Mock(export=exported.append), sample_rate=1.0)
+    self.addCleanup(tracer.shutdown)
+
+    def computed_stages(service: AudioAnalysisService) -> set:
+      exported.clear()
+      response = service.AnalyzeTrack(request)  # noqa: N802
+      self.assertEqual(response, first)
+      self.assertTrue(tracer.flush())
+      return {
+        span["name"]
+        for payload in exported
+        for span in payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+      }
+
+    with tempfile.TemporaryDirectory() as directory:
+      track = Path(directory) / "track.wav"
+      soundfile.write(track, self.waveform, self.sr)
+      request = AnalyzeTrackRequest(audio_url=track.as_uri())
+      cache = DirectoryArtifactCache(Path(directory) / "artifacts")
+      first = AudioAnalysisService().AnalyzeTrack(request)  # noqa: N802
+
+      service = AudioAnalysisService(artifact_cache=cache, tracer=tracer)
+      self.assertTrue({"decode", "onset", "beats", "chroma", "summary"} <= computed_stages(service))
+      self.assertEqual(computed_stages(service) & {"decode", "beats", "chroma", "summary"}, set())
+
+      # A later deploy that changes section labelling only.
+      service._graph = StageGraph(
+        [
+          dataclasses.replace(stage, version="2") if stage.name == "section_spans" else stage
+          for stage in service._graph.stages
+        ],
+        sources=("audio",),
+      )
+      # Section spans need the decoded signal; beats and chroma stay cached.
+      recomputed = computed_stages(service)
+      self.assertTrue({"decode", "section_spans", "sections", "summary"} <= recomputed)
+      self.assertEqual(recomputed & {"onset", "beats", "chroma", "harmony", "timeline"}, set())
+
+  def test_fingerprint_match_reuses_stored_analysis_with_offset(self) -> None:
+    rng = np.random.default_rng(0)
+    note = np.arange(int(0.25 * self.sr)) / self.sr
+    melody = np.concatenate(
+      [np.sin(2 * np.pi * freq * note) * np.hanning(note.size) for freq in rng.uniform(110, 1500, 48)]
+    )
+    clicks = librosa.clicks(times=np.arange(0, 12.0, 0.5), sr=self.sr, length=melody.size)
+    original = (0.3 * melody + 0.5 * clicks).astype(np.float32)
+    lead_in = np.zeros(2 * self.sr, dtype=np.float32)
+    signals = {
+      "https://cdn/original.mp3": original,
+      "https://mirror/reupload.mp3": np.concatenate((lead_in, 0.7 * original)),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+      store = SqliteResultStore(Path(directory) / "results.sqlite3")
+      service = AudioAnalysisService(
+        audio_loader=lambda url: (signals[url], self.sr),
+        result_store=store,
+        fingerprint_index=FingerprintIndex(),
+      )
+      first = service.AnalyzeTrack(  # noqa: N802
+        AnalyzeTrackRequest(audio_url="https://cdn/original.mp3", include_timeline=True)
+      )
+      with mock.patch.object(StageGraph, "run", side_effect=AssertionError("pipeline ran")):
+        reused = service.AnalyzeTrack(  # noqa: N802
+          AnalyzeTrackRequest(audio_url="https://mirror/reupload.mp3", include_timeline=True)
+        )
+      self.assertEqual(store.get("https://mirror/reupload.mp3", ANALYSIS_VERSION), reused)
+
+    self.assertEqual(reused.summary, first.summary)
+    self.assertEqual(len(reused.sections), len(first.sections))
+    self.assertAlmostEqual(reused.sections[-1].end_sec, first.sections[-1].end_sec + 2.0, delta=0.1)
+    np.testing.assert_allclose(reused.timeline.beat_times, first.timeline.beat_times + 2.0, atol=0.1)
+    lead_in_frames = len(reused.timeline.energy_envelope) - len(first.timeline.energy_envelope)
+    self.assertAlmostEqual(lead_in_frames / first.timeline.frame_rate_hz, 2.0, delta=0.1)
+    self.assertFalse(reused.timeline.energy_envelope[: lead_in_frames].any())
+
+  def test_profile_metadata_captures_stage_timings(self) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+      profiler = RequestProfiler(directory)
+      service = AudioAnalysisService(audio_loader=self.loader, profiler=profiler)
+      context = mock.Mock()
+      context.invocation_metadata.return_value = (("x-analysis-profile", "1"),)
+
+      service.AnalyzeTrack(self.request, context)  # noqa: N802
+      (summary_path,) = profiler.directory.glob("*-S123.json")
+      summary = json.loads(summary_path.read_text())
+
+    self.assertEqual(summary["session_id"], "S123")
+    self.assertIn("load", summary["stage_seconds"])
+    self.assertIn("chroma", summary["stage_seconds"])
+
+  def test_unwritable_profile_capture_does_not_fail_the_request(self) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+      profiler = RequestProfiler(directory)
+      service = AudioAnalysisService(audio_loader=self.loader, profiler=profiler)
+      context = mock.Mock()
+      context.invocation_metadata.return_value = (("x-analysis-profile", "1"),)
+
+      with (
+        mock.patch.object(RequestProfiler, "_write", side_effect=OSError("disk full")),
+        self.assertLogs("audio_svc.server", level="WARNING"),
+      ):
+        response = service.AnalyzeTrack(self.request, context)  # noqa: N802
+
+      self.assertEqual(response, self.service.AnalyzeTrack(self.request))  # noqa: N802
+      # The capture slot was released despite the failed write.
+      self.assertIsNotNone(profiler.begin("next", requested=True).finish())
+
+  def test_traceparent_metadata_traces_each_stage(self) -> None:
+    exported = []
+    tracer = Tracer(mock.Mock(export=exported.append), sample_rate=0.0)
+    self.addCleanup(tracer.shutdown)
+    service = AudioAnalysisService(audio_loader=self.loader, tracer=tracer)
+    context = mock.Mock()
+    context.invocation_metadata.return_value = (
+      ("traceparent", "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"),
+    )
+
+    service.AnalyzeTrack(self.request, context)  # noqa: N802
+    self.assertTrue(tracer.flush())
+
+    spans = [
+      span
+      for payload in exported
+      for span in payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    ]
+    names = {span["name"] for span in spans}
+    self.assertTrue({"AnalyzeTrack", "load", "beats", "chroma", "summary"} <= names)
+    self.assertNotIn("serialize", names)
+    self.assertEqual({span["traceId"] for span in spans}, {"4bf92f3577b34da6a3ce929d0e0e4736"})
+
+  def test_serialize_response_traces_wire_encoding(self) -> None:
+    exported = []
+    tracer = Tracer(mock.Mock(export=exported.append), sample_rate=1.0)
+    self.addCleanup(tracer.shutdown)
+    service = AudioAnalysisService(audio_loader=self.loader, tracer=tracer)
+    context = mock.Mock()
+    context.invocation_metadata.return_value = (
+      ("traceparent", "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"),
+    )
+
+    response = service.AnalyzeTrack(self.request, context)  # noqa: N802
+    payload = service.serialize_response(response)
+    self.assertEqual(AnalyzeTrackResponse.FromString(payload), response)
+    self.assertTrue(tracer.flush())
+
+    spans = [
+      span
+      for batch in exported
+      for span in batch["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    ]
+    (root,) = [span for span in spans if span["name"] == "AnalyzeTrack"]
+    (serialize,) = [span for span in spans if span["name"] == "serialize"]
+    attributes = {item["key"]: item["value"] for item in serialize["attributes"]}
+    self.assertEqual(attributes["response.bytes"], {"intValue": str(len(payload))})
+    # Serialisation happens after the root span ended, so it is its sibling.
+    self.assertEqual(serialize["traceId"], root["traceId"])
+    self.assertEqual(serialize["parentSpanId"], "00f067aa0ba902b7")
+    self.assertEqual(service.serialize_response(response), payload)
+
+  def test_failed_call_does_not_leak_its_span_to_the_next_serialization(self) -> None:
+    exported = []
+    tracer = Tracer(mock.Mock(export=exported.append), sample_rate=1.0)
+    self.addCleanup(tracer.shutdown)
+    service = AudioAnalysisService(audio_loader=mock.Mock(side_effect=OSError("gone")), tracer=tracer)
+
+    with self.assertRaises(OSError):
+      service.AnalyzeTrack(self.request)  # noqa: N802
+    service.serialize_response(AnalyzeTrackResponse())
+    self.assertTrue(tracer.flush())
+
+    names = [
+      span["name"]
+      for batch in exported
+      for span in batch["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    ]
+    self.assertIn("AnalyzeTrack", names)
+    self.assertNotIn("serialize", names)
+
+  def test_scheduled_analysis_honours_metadata_priority(self) -> None:
+    scheduler = AnalysisScheduler(capacity=1)
+    service = AudioAnalysisService(audio_loader=self.loader, scheduler=scheduler)
+    context = mock.Mock()
+    context.invocation_metadata.return_value = (("x-analysis-priority", "background"),)
+
+    self.assertEqual(
+      service._resolve_priority(self.request, context),
+      AnalysisPriority.BACKGROUND,
+    )
+    explicit = AnalyzeTrackRequest(audio_url=self.sample_url, priority=AnalysisPriority.INTERACTIVE)
+    self.assertEqual(service._resolve_priority(explicit, context), AnalysisPriority.INTERACTIVE)
+
+    response = service.AnalyzeTrack(self.request, context)  # noqa: N802
+    self.assertAlmostEqual(response.summary.bpm, 120.0, delta=3.0)
+    self.assertEqual(scheduler.snapshot().running, {"interactive": 0, "background": 0})
+
+  def test_unknown_priority_aborts_with_invalid_argument(self) -> None:
+    from audio_svc.server import grpc
+
+    if grpc is None:
+      self.skipTest("grpcio is required for status codes")
+    service = AudioAnalysisService(audio_loader=self.loader, scheduler=AnalysisScheduler(capacity=1))
+    named = mock.Mock()
+    named.invocation_metadata.return_value = (("x-analysis-priority", "urgent"),)
+    numbered = mock.Mock()
+    numbered.invocation_metadata.return_value = ()
+    future_enum = AnalyzeTrackRequest(audio_url=self.sample_url, priority=7)
+
+    for request, context in ((self.request, named), (future_enum, numbered)):
+      with self.assertRaisesRegex(ValueError, "unknown analysis priority"):
+        service.AnalyzeTrack(request, context)  # noqa: N802
+      self.assertEqual(context.abort.call_args[0][0], grpc.StatusCode.INVALID_ARGUMENT)
 
   def test_build_grpc_server_requires_grpc_dependency(self) -> None:
     with mock.patch("audio_svc.server.grpc", None):
@@ -62,6 +363,35 @@ class AudioAnalysisServiceTests(unittest.TestCase):
     finally:
       server.stop(grace=None)
 
+  @unittest.skipIf(grpc is None, "grpcio is required to build a server")
+  def test_build_grpc_server_sizes_from_budget_without_applying_it(self) -> None:
+    budget = CpuBudget(4, BudgetMode.LATENCY)
+    with (
+      mock.patch("audio_svc.cpu_budget.limit_native_threads") as limit,
+      mock.patch("audio_svc.server.AudioAnalysisService", wraps=AudioAnalysisService) as service,
+    ):
+      build_grpc_server(cpu_budget=budget).stop(grace=None)
+      limit.assert_not_called()
+      self.assertEqual(service.call_args.kwargs["stage_workers"], 4)
+
+      build_grpc_server(self.service, cpu_budget=budget, apply_cpu_budget=True).stop(grace=None)
+      limit.assert_called_once_with(4)
+
+  @unittest.skipIf(grpc is None, "grpcio is required for an end-to-end call")
+  def test_served_call_round_trips_protobuf_wire_format(self) -> None:
+    server = build_grpc_server(self.service)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    self.addCleanup(server.stop, None)
+    with grpc.insecure_channel(f"localhost:{port}") as channel:
+      analyze = channel.unary_unary(
+        "/playasul.audio.v1.AudioAnalysisService/AnalyzeTrack",
+        request_serializer=AnalyzeTrackRequest.SerializeToString,
+        response_deserializer=AnalyzeTrackResponse.FromString,
+      )
+      response = analyze(self.request, timeout=60)
+    self.assertEqual(response, self.service.AnalyzeTrack(self.request))  # noqa: N802
+
 
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,131 @@
+import http.server
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from audio_svc.tracing import (
+  JsonLinesSpanExporter,
+  OtlpHttpSpanExporter,
+  Tracer,
+  child_span,
+  parse_traceparent,
+)
+
+
+class _CollectingExporter:
+  def __init__(self) -> None:
+    self.payloads = []
+
+  def export(self, payload) -> None:
+    self.payloads.append(payload)
+
+  @property
+  def spans(self):
+    return [
+      span
+      for payload in self.payloads
+      for resource in payload["resourceSpans"]
+      for scope in resource["scopeSpans"]
+      for span in scope["spans"]
+    ]
+
+
+class TracingTests(unittest.TestCase):
+  def test_parse_traceparent(self) -> None:
+    context = parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+    self.assertEqual(context.trace_id, "4bf92f3577b34da6a3ce929d0e0e4736")
+    self.assertEqual(context.span_id, "00f067aa0ba902b7")
+    self.assertTrue(context.sampled)
+    self.assertIsNone(parse_traceparent("00-zz-00f067aa0ba902b7-01"))
+    self.assertIsNone(parse_traceparent(None))
+
+  def test_unsampled_requests_create_no_spans(self) -> None:
+    exporter = _CollectingExporter()
+    tracer = Tracer(exporter, sample_rate=0.0)
+    self.addCleanup(tracer.shutdown)
+    self.assertIsNone(tracer.start_request("AnalyzeTrack"))
+    self.assertIsNone(
+      tracer.start_request(
+        "AnalyzeTrack",
+        traceparent="00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00",
+      )
+    )
+    with child_span(None, "fetch") as span:
+      self.assertIsNone(span)
+
+  def test_spans_continue_incoming_trace_and_carry_session_id(self) -> None:
+    exporter = _CollectingExporter()
+    tracer = Tracer(exporter, sample_rate=0.0)
+    self.addCleanup(tracer.shutdown)
+
+    with tracer.start_request(
+      "AnalyzeTrack",
+      traceparent="00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01",
+      session_id="S123",
+    ) as root:
+      with child_span(root, "fetch"):
+        pass
+      root.record_child("chroma", 0.25)
+    self.assertTrue(tracer.flush())
+
+    spans = {span["name"]: span for span in exporter.spans}
+    self.assertEqual(set(spans), {"AnalyzeTrack", "fetch", "chroma"})
+    self.assertEqual(spans["AnalyzeTrack"]["parentSpanId"], "00f067aa0ba902b7")
+    for span in spans.values():
+      self.assertEqual(span["traceId"], "4bf92f3577b34da6a3ce929d0e0e4736")
+      self.assertIn({"key": "session.id", "value": {"stringValue": "S123"}}, span["attributes"])
+    self.assertEqual(spans["fetch"]["parentSpanId"], spans["AnalyzeTrack"]["spanId"])
+    chroma = spans["chroma"]
+    self.assertEqual(int(chroma["endTimeUnixNano"]) - int(chroma["startTimeUnixNano"]), 250_000_000)
+
+  def test_json_lines_exporter_writes_otlp_requests(self) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+      path = Path(directory) / "spans.jsonl"
+      tracer = Tracer(JsonLinesSpanExporter(path), sample_rate=1.0)
+      with tracer.start_request("AnalyzeTrack", session_id="S1"):
+        pass
+      tracer.shutdown()
+
+      (line,) = path.read_text().splitlines()
+    payload = json.loads(line)
+    resource = payload["resourceSpans"][0]
+    self.assertEqual(
+      resource["resource"]["attributes"],
+      [{"key": "service.name", "value": {"stringValue": "audio-svc"}}],
+    )
+    self.assertEqual(resource["scopeSpans"][0]["spans"][0]["kind"], 2)
+
+  def test_otlp_http_exporter_posts_to_collector(self) -> None:
+    received = []
+
+    class _Collector(http.server.BaseHTTPRequestHandler):
+      def do_POST(self) -> None:  # noqa: N802
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        received.append((self.path, json.loads(body)))
+        self.send_response(200)
+        self.end_headers()
+
+      def log_message(self, *args) -> None:
+        pass
+
+    collector = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Collector)
+    threading.Thread(target=collector.serve_forever, daemon=True).start()
+    self.addCleanup(collector.server_close)
+    self.addCleanup(collector.shutdown)
+
+    endpoint = f"http://127.0.0.1:{collector.server_address[1]}/v1/traces"
+    tracer = Tracer(OtlpHttpSpanExporter(endpoint), sample_rate=1.0)
+    with tracer.start_request("AnalyzeTrack"):
+      pass
+    tracer.shutdown()
+
+    self.assertEqual(len(received), 1)
+    path, payload = received[0]
+    self.assertEqual(path, "/v1/traces")
+    self.assertEqual(payload["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["name"], "AnalyzeTrack")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,201 @@
+import importlib.util
+import math
+import shutil
+import struct
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from audio_svc.proto import (
+  AnalysisJob,
+  AnalysisJobStatus,
+  AnalysisPriority,
+  AnalysisSummary,
+  AnalysisTimeline,
+  AnalyzeTrackRequest,
+  AnalyzeTrackResponse,
+  BeatPosition,
+  KeyEstimate,
+  SectionBreakdown,
+)
+from audio_svc.proto import audio_analysis_pb2 as mirrors
+from audio_svc.proto.wire import Kind, WireError, WireMessage
+
+try:
+  from google.protobuf import descriptor as protobuf_descriptor
+except ModuleNotFoundError:  # pragma: no cover - environment guard
+  protobuf_descriptor = None  # type: ignore[assignment]
+
+_PROTO_DIR = Path(__file__).resolve().parents[3] / "proto"
+
+
+def _sample_response() -> AnalyzeTrackResponse:
+  return AnalyzeTrackResponse(
+    summary=AnalysisSummary(
+      bpm=128.0,
+      energy=0.42,
+      beat_position=BeatPosition.OFF_BEAT,
+      spectral_centroid=1800.5,
+      key=KeyEstimate(tonic="F#", mode="minor", confidence=0.7, chord_progression=["F#:i", "F#:bVI"]),
+    ),
+    sections=[
+      SectionBreakdown(label="intro", end_sec=12.5, average_energy=0.2, key=KeyEstimate(tonic="A")),
+      SectionBreakdown(label="verse", start_sec=12.5, end_sec=40.0),
+    ],
+    timeline=AnalysisTimeline(
+      frame_rate_hz=43.06640625,
+      beat_times=np.linspace(0.0, 10.0, 21),
+      energy_envelope=np.random.default_rng(0).random(1000, dtype=np.float32),
+      spectral_centroid=np.full(1000, 1234.5, dtype=np.float32),
+    ),
+  )
+
+
+class WireCodecTests(unittest.TestCase):
+  def test_request_matches_reference_encoding(self) -> None:
+    request = AnalyzeTrackRequest(audio_url="u", session_id="s", priority=AnalysisPriority.BACKGROUND)
+    self.assertEqual(request.SerializeToString(), b"\n\x01u\x12\x01s\x18\x02")
+    self.assertEqual(AnalyzeTrackRequest.FromString(b"\n\x01u\x12\x01s\x18\x02"), request)
+    self.assertEqual(AnalyzeTrackRequest(include_timeline=True).SerializeToString(), b"\x20\x01")
+    self.assertTrue(AnalyzeTrackRequest.FromString(b"\x20\x01").include_timeline)
+
+  def test_default_values_are_omitted(self) -> None:
+    self.assertEqual(AnalyzeTrackRequest().SerializeToString(), b"")
+    self.assertEqual(KeyEstimate().SerializeToString(), b"")
+    self.assertIsNone(AnalyzeTrackRequest.FromString(b"").session_id)
+
+  def test_repeated_numerics_are_packed_little_endian(self) -> None:
+    timeline = AnalysisTimeline(
+      beat_times=np.array([0.5, 1.0]),
+      energy_envelope=np.array([0.25], dtype=np.float32),
+    )
+    self.assertEqual(
+      timeline.SerializeToString(),
+      b"\x12\x10" + struct.pack("<2d", 0.5, 1.0) + b"\x1a\x04" + struct.pack("<f", 0.25),
+    )
+
+  def test_unpacked_numerics_and_unknown_fields_are_accepted(self) -> None:
+    payload = (
+      b"\x11" + struct.pack("<d", 0.5)  # beat_times, unpacked
+      + b"\x11" + struct.pack("<d", 1.5)
+      + b"\xa8\x06\x07"  # unknown varint field 101
+      + b"\x22\x04" + struct.pack("<f", 900.0)
+    )
+    timeline = AnalysisTimeline.FromString(payload)
+    np.testing.assert_array_equal(timeline.beat_times, [0.5, 1.5])
+    np.testing.assert_array_equal(timeline.spectral_centroid, np.array([900.0], dtype=np.float32))
+
+  def test_response_round_trip(self) -> None:
+    response = _sample_response()
+    restored = AnalyzeTrackResponse.FromString(response.SerializeToString())
+    self.assertEqual(restored, response)
+    self.assertIsInstance(restored.summary.beat_position, BeatPosition)
+    self.assertTrue(restored.timeline.energy_envelope.flags.writeable)
+
+  def test_negative_zero_is_not_treated_as_default(self) -> None:
+    payload = KeyEstimate(confidence=-0.0).SerializeToString()
+    self.assertEqual(payload, b"\x19" + struct.pack("<d", -0.0))
+    self.assertEqual(math.copysign(1.0, KeyEstimate.FromString(payload).confidence), -1.0)
+    self.assertEqual(KeyEstimate(confidence=0.0).SerializeToString(), b"")
+
+  def test_unknown_enum_values_are_preserved(self) -> None:
+    self.assertEqual(AnalyzeTrackRequest.FromString(b"\x18\x07").priority, 7)
+
+  def test_malformed_payloads_raise_wire_error(self) -> None:
+    cases = (
+      (AnalyzeTrackRequest, b"\x0a\x05ab"),  # string shorter than its length
+      (AnalyzeTrackRequest, b"\x80"),  # truncated tag varint
+      (AnalysisTimeline, b"\x12\x03abc"),  # packed doubles with a partial element
+      (AnalysisTimeline, b"\x09\x00\x00\x00"),  # double cut short
+      (AnalysisTimeline, b"\x1d\x00"),  # unpacked float cut short
+      (AnalysisTimeline, b"\x0a\x08" + struct.pack("<d", 1.0)),  # singular double sent packed
+      (AnalyzeTrackRequest, b"\x1a\x01\x02"),  # singular enum sent packed
+      (AnalyzeTrackRequest, b"\x0a\x02\xc3\x28"),  # invalid UTF-8
+    )
+    for message_type, payload in cases:
+      with self.subTest(payload=payload), self.assertRaises(WireError):
+        message_type.FromString(payload)
+
+
+class GeneratedCodeCrossCheckTests(unittest.TestCase):
+  """Compares the mirrors with classes protoc generates from the contract."""
+
+  @classmethod
+  def setUpClass(cls) -> None:
+    if protobuf_descriptor is None or shutil.which("protoc") is None:
+      raise unittest.SkipTest("protoc and the protobuf runtime are required for the cross-check")
+    with tempfile.TemporaryDirectory() as out:
+      subprocess.run(
+        ["protoc", f"-I{_PROTO_DIR}", f"--python_out={out}", "audio_analysis.proto"],
+        check=True,
+      )
+      spec = importlib.util.spec_from_file_location(
+        "_protoc_audio_analysis_pb2",
+        Path(out) / "audio_analysis_pb2.py",
+      )
+      cls.generated = importlib.util.module_from_spec(spec)
+      spec.loader.exec_module(cls.generated)
+
+  def test_field_tables_match_the_contract(self) -> None:
+    descriptor_types = {
+      Kind.DOUBLE: protobuf_descriptor.FieldDescriptor.TYPE_DOUBLE,
+      Kind.FLOAT: protobuf_descriptor.FieldDescriptor.TYPE_FLOAT,
+      Kind.STRING: protobuf_descriptor.FieldDescriptor.TYPE_STRING,
+      Kind.ENUM: protobuf_descriptor.FieldDescriptor.TYPE_ENUM,
+      Kind.BOOL: protobuf_descriptor.FieldDescriptor.TYPE_BOOL,
+      Kind.MESSAGE: protobuf_descriptor.FieldDescriptor.TYPE_MESSAGE,
+    }
+    file_descriptor = self.generated.DESCRIPTOR
+    mirrored = {
+      name: value
+      for name, value in vars(mirrors).items()
+      if isinstance(value, type) and issubclass(value, WireMessage) and value is not WireMessage
+    }
+    self.assertEqual(set(mirrored), set(file_descriptor.message_types_by_name))
+    for name, mirror in mirrored.items():
+      fields = file_descriptor.message_types_by_name[name].fields_by_number
+      with self.subTest(message=name):
+        self.assertEqual({spec.number for spec in mirror._wire_fields}, set(fields))
+        for spec in mirror._wire_fields:
+          field = fields[spec.number]
+          repeated = getattr(field, "is_repeated", None)
+          if repeated is None:  # protobuf < 5
+            repeated = field.label == field.LABEL_REPEATED
+          self.assertEqual(
+            (spec.name, descriptor_types[spec.kind], spec.repeated),
+            (field.name, field.type, repeated),
+          )
+    for name, enum in file_descriptor.enum_types_by_name.items():
+      with self.subTest(enum=name):
+        self.assertEqual(
+          {member.name: member.value for member in getattr(mirrors, name)},
+          {value.name: value.number for value in enum.values},
+        )
+
+  def test_messages_round_trip_through_generated_classes(self) -> None:
+    messages = (
+      _sample_response(),
+      AnalyzeTrackRequest(
+        audio_url="https://cdn/a.mp3",
+        session_id="S1",
+        priority=AnalysisPriority.BACKGROUND,
+        include_timeline=True,
+      ),
+      AnalysisJob(
+        job_id="j1",
+        status=AnalysisJobStatus.SUCCEEDED,
+        audio_url="https://cdn/a.mp3",
+        result=_sample_response(),
+      ),
+    )
+    for message in messages:
+      with self.subTest(message=type(message).__name__):
+        generated = getattr(self.generated, type(message).__name__).FromString(message.SerializeToString())
+        self.assertEqual(type(message).FromString(generated.SerializeToString()), message)
+
+
+if __name__ == "__main__":
+  unittest.main()